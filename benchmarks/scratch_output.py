@@ -0,0 +1,71 @@
+"""Compares writing engine outputs through the bind mount with writing them to a
+container-local scratch directory which is copied back at the end.
+
+The workload mimics a high-frequency logger: the file is opened, appended to and
+closed for every line. Run it from a directory on the file system you want to test
+(e.g. a Docker Desktop bind mount or a network file system):
+
+    uv run python benchmarks/scratch_output.py --lines 20000
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+from phylorun.utils.docker_utils import (
+    SCRATCH_MODES,
+    create_image_if_needed,
+    get_docker_client,
+    run_analysis_in_container,
+)
+
+IMAGE_NAME = "ubuntu:latest"
+
+
+@click.command()
+@click.option("--lines", type=int, default=20000, help="Number of lines to log.")
+@click.option("--repetitions", type=int, default=3, help="Runs per mode.")
+def benchmark(lines: int, repetitions: int):
+    docker_client = get_docker_client()
+    create_image_if_needed(docker_client, IMAGE_NAME, f"FROM {IMAGE_NAME}")
+
+    command = (
+        "sh -c 'i=0; while [ $i -lt "
+        + str(lines)
+        + ' ]; do echo "$i\t-1234.5678\t0.001" >> benchmark.log; i=$((i+1)); done\''
+    )
+
+    for mode in [None, *SCRATCH_MODES]:
+        durations = []
+
+        for _ in range(repetitions):
+            with tempfile.TemporaryDirectory(dir=Path()) as directory:
+                analysis_file = Path(directory) / "analysis.txt"
+                analysis_file.write_text("")
+
+                start = time.perf_counter()
+                run_analysis_in_container(
+                    docker_client,
+                    IMAGE_NAME,
+                    analysis_file,
+                    command,
+                    working_dir="/data",
+                    scratch=mode,
+                )
+                durations.append(time.perf_counter() - start)
+
+                written_lines = len(
+                    (Path(directory) / "benchmark.log").read_text().splitlines()
+                )
+                assert written_lines == lines, f"{written_lines} != {lines} lines"
+
+        print(
+            f"{mode or 'bind mount':>10}: "
+            f"best {min(durations):.2f}s, mean {sum(durations) / len(durations):.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -8,15 +8,29 @@ from loguru import logger
 import subprocess
 
 import os
+import re
 
 from phylorun.utils.docker_utils import (
-    create_image_if_needed,
+    BASE_IMAGE_NAME,
+    create_images_if_needed,
     get_docker_client,
-    run_and_print_command,
-    start_container,
+    run_analysis_in_container,
+)
+from phylorun.utils.checkpoint_utils import (
+    checkpointed_copy_path,
+    latest_checkpoint,
+    relative_path,
+)
+from phylorun.utils.log_utils import read_log_column
+from phylorun.utils.resource_utils import (
+    Resources,
+    estimate_resources,
+    java_library_path,
+    with_threads_arg,
 )
 
 BINARY_URL = "https://github.com/CompEvol/beast2/releases/download/v2.7.7/BEAST.v2.7.7.Linux.x86.tgz"
+POWER_POSTERIOR_LOG = "likelihood.log"
 
 
 class BEAST2(Engine):
@@ -61,8 +75,9 @@ class BEAST2(Engine):
         analysis_file: Path,
         engine_path: Optional[str] = None,
         additional_cli_args: Optional[list[str]] = None,
-    ):
-        """Runs the analysis in the given file using the locally installed engine."""
+    ) -> int:
+        """Runs the analysis in the given file using the locally installed engine and
+        returns the exit code of the engine."""
         engine_path = engine_path or self._find_binary_path()
         if not engine_path:
             raise Exception("""No BEAST 2 binary found.
@@ -72,8 +87,172 @@ Use `phylorun --bin <path-to-binary> your_analysis.xml` to manually specify the
             ...
 
         additional_cli_args = additional_cli_args or []
+        command = [engine_path]
+
+        if resources := estimate_resources(analysis_file):
+            additional_cli_args = with_threads_arg(additional_cli_args, resources)
+            command = self._launcher_command(engine_path, resources) or command
+
+        return subprocess.run(
+            [*command, *additional_cli_args, analysis_file]
+        ).returncode
+
+    def _launcher_command(
+        self, engine_path: str, resources: Resources
+    ) -> Optional[list[str]]:
+        """Returns the command starting the BEAST 2 launcher with the given heap size.
+        The `beast` script hard-codes the heap size, which is why the launcher is
+        started directly with the library path the script would use. Returns None if the BEAST 2 installation is not recognized."""
+        beast_dir = Path(engine_path).resolve().parent.parent
+        launcher_jar = beast_dir / "lib" / "launcher.jar"
+        if not launcher_jar.exists():
+            logger.debug("BEAST 2 launcher not found, using the default heap size.")
+            return None
+
+        java = next(
+            (
+                str(path)
+                for path in [
+                    beast_dir / "jre" / "bin" / "java",
+                    beast_dir / "jre" / "Contents" / "Home" / "bin" / "java",
+                ]
+                if path.exists()
+            ),
+            "java",
+        )
+
+        return [
+            java,
+            *resources.jvm_args(),
+            java_library_path([]),
+            "-Dlauncher.wait.for.exit=true",
+            "-Duser.language=en",
+            "-cp",
+            str(launcher_jar),
+            "beast.pkgmgmt.launcher.BeastLauncher",
+        ]
+
+    def output_files(
+        self, analysis_file: Path, additional_cli_args: Optional[list[str]] = None
+    ) -> list[Path]:
+        """Returns the files written by the loggers of the analysis. `$(filebase)` is
+        replaced by the name of the analysis file and `$(tree)` by the id of the logged
+        tree, loggers using other variables are skipped."""
+        # outputs are relative to the working directory unless '-working' is given
+        output_dir = (
+            analysis_file.parent
+            if "-working" in (additional_cli_args or [])
+            else Path()
+        )
+
+        files = []
+        for element in ElementTree.parse(analysis_file).getroot().iter():
+            file_name = element.get("fileName")
+            if element.tag != "logger" or not file_name:
+                continue
+
+            file_name = file_name.replace("$(filebase)", analysis_file.stem)
+            if "$(tree)" in file_name and (tree_id := _logged_tree_id(element)):
+                file_name = file_name.replace("$(tree)", tree_id)
+            if "$(" in file_name:
+                logger.warning(f"Cannot predict the name of the log '{file_name}'.")
+                continue
+
+            files.append(output_dir / file_name)
+
+        return files
+
+    def overwrite_outputs_args(self) -> list[str]:
+        """Returns the BEAST 2 flag which allows writing into existing output files."""
+        return ["-overwrite"]
+
+    def checkpointed_analysis(
+        self,
+        analysis_file: Path,
+        resume: bool = False,
+        checkpoint_every: Optional[int] = None,
+    ) -> tuple[Path, list[str]]:
+        """Resumes from the latest complete state file using `-resume`. BEAST 2 stores
+        its state at every log interval by default, `checkpoint_every` sets the
+        `storeEvery` attribute of the run in a copy of the analysis."""
+        state_file = latest_state_file(analysis_file) if resume else None
+        if resume and not state_file:
+            logger.info("No complete state file found, starting from the beginning.")
+
+        args = [
+            "-statefile",
+            relative_path(state_file or default_state_file(analysis_file)),
+        ]
+        if state_file:
+            args.append("-resume")
+
+        if checkpoint_every:
+            xml = ElementTree.parse(analysis_file)
+            run = next(
+                (child for child in xml.getroot() if child.tag.lower() == "run"), None
+            )
+            if run is None:
+                raise Exception("No <run> found in the analysis.")
+            run.set("storeEvery", str(checkpoint_every))
+
+            analysis_file = checkpointed_copy_path(analysis_file)
+            analysis_file.parent.mkdir(exist_ok=True)
+            xml.write(analysis_file, encoding="UTF-8", xml_declaration=True)
+
+        return analysis_file, args
+
+    def power_posterior_step(
+        self,
+        analysis_file: Path,
+        beta: float,
+        step_dir: Path,
+        chain_length: Optional[int] = None,
+    ) -> tuple[Path, list[str]]:
+        """Writes a copy of the analysis which runs a path sampling step of the
+        MODEL_SELECTION package with the given power. Like the `chainLength` of its
+        PathSampler, `chain_length` sets the states of the step, which otherwise runs
+        the full chain length of the analysis. The log likelihood is logged to
+        `likelihood.log` in the step directory."""
+        xml = ElementTree.parse(analysis_file)
+        root = xml.getroot()
+
+        run = next((child for child in root if child.tag.lower() == "run"), None)
+        if run is None or not run.get("spec", "").endswith("MCMC"):
+            raise Exception("Marginal likelihood estimation requires an MCMC <run>.")
 
-        subprocess.run([engine_path, *additional_cli_args, analysis_file])
+        if not any(element.get("id") == "likelihood" for element in root.iter()):
+            raise Exception(
+                "Marginal likelihood estimation requires a distribution with id "
+                "'likelihood'."
+            )
+
+        run.set("spec", "modelselection.inference.PathSamplingStep")
+        run.set("beta", f"{beta:.10f}")
+
+        if chain_length:
+            run.set("chainLength", str(chain_length))
+        chain_length = int(float(run.get("chainLength", "1000000")))
+        likelihood_logger = ElementTree.SubElement(
+            run,
+            "logger",
+            {
+                "id": "phylorunLikelihoodLogger",
+                "spec": "Logger",
+                "fileName": POWER_POSTERIOR_LOG,
+                "logEvery": str(max(1, chain_length // 10000)),
+            },
+        )
+        ElementTree.SubElement(likelihood_logger, "log", {"idref": "likelihood"})
+
+        step_file = step_dir / analysis_file.name
+        xml.write(step_file, encoding="UTF-8", xml_declaration=True)
+
+        # the outputs are written next to the step file
+        return step_file, ["-working", "-overwrite"]
+
+    def read_power_posterior_log_likelihoods(self, step_dir: Path) -> list[float]:
+        """Returns the log likelihoods logged by a path sampling step."""
+        return read_log_column(step_dir / POWER_POSTERIOR_LOG, "likelihood")
 
     def _find_binary_path(self) -> Optional[str]:
         if path := os.environ.get("BEAST"):
@@ -89,51 +268,115 @@ Use `phylorun --bin <path-to-binary> your_analysis.xml` to manually specify the
 
         return str(possible_paths[-1])
 
+    def outputs_next_to_analysis_args(self) -> list[str]:
+        """Returns the BEAST 2 flag which writes the outputs next to the analysis file."""
+        return ["-working"]
+
+    def container_images(self) -> list[tuple[str, str]]:
+        """Returns the name and Dockerfile of the BEAST 2 image."""
+        return [
+            (
+                "beast2:2.7.7",
+                f"""FROM {BASE_IMAGE_NAME}
+            RUN wget {BINARY_URL} -O /BEAST.tgz \\
+                && tar -xzf /BEAST.tgz -C /opt   \\
+                && rm /BEAST.tgz
+            """,
+            )
+        ]
+
     def run_containerized_analysis(
-        self, analysis_file: Path, additional_cli_args: Optional[list[str]] = None
-    ):
-        """Runs the analysis in the given file in a container. This does not require the
-        engine to be installed on the system."""
+        self,
+        analysis_file: Path,
+        additional_cli_args: Optional[list[str]] = None,
+        scratch: Optional[str] = None,
+    ) -> int:
+        """Runs the analysis in the given file in a container and returns the exit code
+        of the engine. This does not require the engine to be installed on the system."""
         docker_client = get_docker_client()
 
-        IMAGE_NAME = "beast2:2.7.7"
+        images = self.container_images()
+        create_images_if_needed(docker_client, images)
 
-        create_image_if_needed(
+        additional_cli_args = additional_cli_args or []
+        command = "/opt/beast/bin/beast"
+        container_kwargs = {}
+
+        if resources := estimate_resources(analysis_file):
+            additional_cli_args = with_threads_arg(additional_cli_args, resources)
+            command = " ".join(
+                [
+                    "/opt/beast/jre/bin/java",
+                    *resources.jvm_args(),
+                    "-Dlauncher.wait.for.exit=true -Duser.language=en",
+                    "-cp /opt/beast/lib/launcher.jar",
+                    "beast.pkgmgmt.launcher.BeastLauncher",
+                ]
+            )
+            container_kwargs = resources.container_kwargs(scratch)
+
+        return run_analysis_in_container(
             docker_client,
-            IMAGE_NAME,
-            f"""FROM ubuntu:latest
-            RUN apt-get update \\
-                && apt-get install -y wget tar \\
-                && wget {BINARY_URL} -O /BEAST.tgz \\
-                && tar -xzf /BEAST.tgz -C /opt   \\
-                && rm /BEAST.tgz \\
-            """,
+            images[-1][0],
+            analysis_file,
+            f"{command} {' '.join(additional_cli_args)} '/data/{analysis_file.name}'",
+            scratch=scratch,
+            outputs=[
+                *self.output_files(analysis_file, additional_cli_args),
+                *(
+                    Path(value)
+                    for option, value in zip(
+                        additional_cli_args, additional_cli_args[1:]
+                    )
+                    if option == "-statefile"
+                ),
+            ],
+            **container_kwargs,
         )
 
-        working_dir_is_data_dir = Path() == analysis_file.parent
 
-        volumes = {str(analysis_file.parent.resolve()): {"bind": "/data", "mode": "rw"}}
-        if not working_dir_is_data_dir:
-            volumes[str(Path().resolve())] = {"bind": "/working", "mode": "rw"}
+def _logged_tree_id(logger_element: ElementTree.Element) -> Optional[str]:
+    """Returns the id of the tree logged by a logger, looking through the
+    `TreeWithMetaDataLogger` BEAUti wraps trees in."""
+    logged = logger_element.find("log")
+    if logged is None:
+        return None
 
-        print(f"{working_dir_is_data_dir=}")
-        print(f"{volumes=}")
+    if logged.get("spec", "").endswith("TreeWithMetaDataLogger"):
+        if tree := logged.get("tree"):
+            return tree.removeprefix("@")
 
-        container = start_container(docker_client, IMAGE_NAME, volumes=volumes)
+        logged = logged.find("tree")
+        if logged is None:
+            return None
 
-        try:
-            if working_dir_is_data_dir:
-                run_and_print_command(
-                    container,
-                    f"/opt/beast/bin/beast {' '.join(additional_cli_args or [])} '/data/{analysis_file.name}'",
-                    working_dir="/data",
-                )
-            else:
-                run_and_print_command(
-                    container,
-                    f"/opt/beast/bin/beast {' '.join(additional_cli_args or [])} '/data/{analysis_file.name}'",
-                    working_dir="/working",
-                )
-        finally:
-            container.stop()
-            container.remove()
+    return logged.get("idref") or logged.get("id")
+
+
+def default_state_file(analysis_file: Path) -> Path:
+    """Returns the state file phylorun lets BEAST 2 write for an analysis."""
+    return analysis_file.parent / (analysis_file.name + ".state")
+
+
+def latest_state_file(analysis_file: Path) -> Optional[Path]:
+    """Returns the most advanced complete state file of an analysis, looking next to
+    the analysis and in the working directory."""
+    return latest_checkpoint(
+        [default_state_file(analysis_file), Path(analysis_file.name + ".state")],
+        _state_file_sample,
+    )
+
+
+def _state_file_sample(state_file: Path) -> Optional[int]:
+    """Returns the sample a state file was written at, or None if the file is
+    incomplete."""
+    try:
+        state = state_file.read_text()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+    sample = re.search(r"<itsabeastystatewerein[^>]*sample=['\"](\d+)", state)
+    if not sample or "</itsabeastystatewerein>" not in state:
+        return None
+
+    return int(sample.group(1))
@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+import re
 import subprocess
 from typing import Optional
 from phylorun.engines.engine import Engine
@@ -7,11 +8,18 @@ from xml.etree import ElementTree
 
 from loguru import logger
 
+from phylorun.utils.checkpoint_utils import latest_checkpoint, relative_path
 from phylorun.utils.docker_utils import (
-    create_image_if_needed,
+    BASE_IMAGE_NAME,
+    create_images_if_needed,
     get_docker_client,
-    run_and_print_command,
-    start_container,
+    run_analysis_in_container,
+)
+from phylorun.utils.resource_utils import (
+    Resources,
+    estimate_resources,
+    java_library_path,
+    with_threads_arg,
 )
 
 
@@ -57,8 +65,9 @@ class BEASTX(Engine):
         analysis_file: Path,
         engine_path: Optional[str] = None,
         additional_cli_args: Optional[list[str]] = None,
-    ):
-        """Runs the analysis in the given file using the locally installed engine."""
+    ) -> int:
+        """Runs the analysis in the given file using the locally installed engine and
+        returns the exit code of the engine."""
         engine_path = engine_path or self._find_binary_path()
         if not engine_path:
             raise Exception("""No BEAST X binary found.
@@ -67,8 +76,41 @@ Use `phylorun --bin <path-to-binary> your_analysis.xml` to manually specify the
             """)
 
         additional_cli_args = additional_cli_args or []
+        command = [engine_path]
+
+        if resources := estimate_resources(analysis_file):
+            additional_cli_args = with_threads_arg(additional_cli_args, resources)
+            command = self._launcher_command(engine_path, resources) or command
+
+        return subprocess.run(
+            [*command, *additional_cli_args, analysis_file]
+        ).returncode
+
+    def _launcher_command(
+        self, engine_path: str, resources: Resources
+    ) -> Optional[list[str]]:
+        """Returns the command starting BEAST X with the given heap size. The `beast`
+        script hard-codes the heap size, which is why BEAST X is started directly with
+        the library path the script would use.
+        Returns None if the BEAST X installation is not recognized."""
+        lib_dir = Path(engine_path).resolve().parent.parent / "lib"
+        beast_jar = lib_dir / "beast.jar"
+        if not beast_jar.exists():
+            logger.debug("BEAST X jar not found, using the default heap size.")
+            return None
 
-        subprocess.run([engine_path, *additional_cli_args, analysis_file])
+        java = "java"
+        if java_home := os.environ.get("JAVA_HOME"):
+            java = str(Path(java_home) / "bin" / "java")
+
+        return [
+            java,
+            *resources.jvm_args(),
+            java_library_path([lib_dir]),
+            "-cp",
+            str(beast_jar),
+            "dr.app.beast.BeastMain",
+        ]
 
     def _find_binary_path(self) -> Optional[str]:
         if path := os.environ.get("BEAST"):
@@ -86,52 +128,145 @@ Use `phylorun --bin <path-to-binary> your_analysis.xml` to manually specify the
 
         return str(possible_paths[-1])
 
-    def run_containerized_analysis(
+    def output_files(
         self, analysis_file: Path, additional_cli_args: Optional[list[str]] = None
-    ):
-        """Runs the analysis in the given file in a container. This does not require the
-        engine to be installed on the system."""
-        docker_client = get_docker_client()
+    ) -> list[Path]:
+        """Returns the files written by the `<log>` and `<logTree>` elements of the
+        analysis."""
+        # outputs are relative to the working directory unless '-working' is given
+        output_dir = (
+            analysis_file.parent
+            if "-working" in (additional_cli_args or [])
+            else Path()
+        )
 
-        IMAGE_NAME = "beastx:10.5.0"
+        files = []
+        for element in ElementTree.parse(analysis_file).getroot().iter():
+            file_name = element.get("fileName")
+            if element.tag not in ("log", "logTree") or not file_name:
+                continue
 
-        create_image_if_needed(
-            docker_client,
-            IMAGE_NAME,
-            f"""FROM ubuntu:latest
+            files.append(output_dir / file_name)
+
+        return files
+
+    def overwrite_outputs_args(self) -> list[str]:
+        """Returns the BEAST X flag which allows writing into existing output files."""
+        return ["-overwrite"]
+
+    def checkpointed_analysis(
+        self,
+        analysis_file: Path,
+        resume: bool = False,
+        checkpoint_every: Optional[int] = None,
+    ) -> tuple[Path, list[str]]:
+        """Uses the `-save_every`/`-save_state` checkpoints of BEAST X, which are
+        written next to the analysis file. Resuming loads the most advanced complete
+        checkpoint using `-load_state`."""
+        checkpoint = analysis_file.parent / (analysis_file.stem + ".checkpoint")
+        args = []
+
+        if checkpoint_every:
+            args += [
+                "-save_every",
+                str(checkpoint_every),
+                "-save_state",
+                relative_path(checkpoint),
+            ]
+
+        if resume:
+            # periodic checkpoints get the state number appended to the file name
+            if latest := latest_checkpoint(
+                [checkpoint, *checkpoint.parent.glob(checkpoint.name + "_*")],
+                _checkpoint_state,
+            ):
+                args += ["-load_state", relative_path(latest)]
+            else:
+                logger.info(
+                    "No complete checkpoint found, starting from the beginning."
+                )
+
+        return analysis_file, args
+
+    def outputs_next_to_analysis_args(self) -> list[str]:
+        """Returns the BEAST X flag which writes the outputs next to the analysis file."""
+        return ["-working"]
+
+    def container_images(self) -> list[tuple[str, str]]:
+        """Returns the name and Dockerfile of the BEAST X image."""
+        return [
+            (
+                "beastx:10.5.0",
+                f"""FROM {BASE_IMAGE_NAME}
             RUN apt-get update \\
-                && apt-get install -y wget tar openjdk-17-jdk python3-venv python3-pip \\
+                && apt-get install -y openjdk-17-jdk python3-venv python3-pip \\
                 && wget {BINARY_URL} -O /BEAST.tgz \\
                 && tar -xzf /BEAST.tgz -C /opt   \\
                 && rm /BEAST.tgz
             """,
-        )
+            )
+        ]
 
-        working_dir_is_data_dir = Path() == analysis_file.parent
+    def run_containerized_analysis(
+        self,
+        analysis_file: Path,
+        additional_cli_args: Optional[list[str]] = None,
+        scratch: Optional[str] = None,
+    ) -> int:
+        """Runs the analysis in the given file in a container and returns the exit code
+        of the engine. This does not require the engine to be installed on the system."""
+        docker_client = get_docker_client()
 
-        volumes = {str(analysis_file.parent.resolve()): {"bind": "/data", "mode": "rw"}}
-        if not working_dir_is_data_dir:
-            volumes[str(Path().resolve())] = {"bind": "/working", "mode": "rw"}
+        images = self.container_images()
+        create_images_if_needed(docker_client, images)
 
-        container = start_container(
+        additional_cli_args = additional_cli_args or []
+        command = "/opt/BEASTv10.5.0/bin/beast"
+        container_kwargs = {}
+
+        if resources := estimate_resources(analysis_file):
+            additional_cli_args = with_threads_arg(additional_cli_args, resources)
+            command = " ".join(
+                [
+                    "java",
+                    *resources.jvm_args(),
+                    "-Djava.library.path=/opt/BEASTv10.5.0/lib",
+                    "-cp /opt/BEASTv10.5.0/lib/beast.jar",
+                    "dr.app.beast.BeastMain",
+                ]
+            )
+            container_kwargs = resources.container_kwargs(scratch)
+
+        return run_analysis_in_container(
             docker_client,
-            IMAGE_NAME,
-            volumes=volumes,
+            images[-1][0],
+            analysis_file,
+            f"{command} -java {' '.join(additional_cli_args)} '/data/{analysis_file.name}'",
+            scratch=scratch,
+            outputs=[
+                *self.output_files(analysis_file, additional_cli_args),
+                *(
+                    Path(value)
+                    for option, value in zip(
+                        additional_cli_args, additional_cli_args[1:]
+                    )
+                    if option == "-save_state"
+                ),
+            ],
+            **container_kwargs,
         )
 
-        try:
-            if working_dir_is_data_dir:
-                run_and_print_command(
-                    container,
-                    f"/opt/BEASTv10.5.0/bin/beast -java {' '.join(additional_cli_args or [])} '/data/{analysis_file.name}'",
-                    working_dir="/data",
-                )
-            else:
-                run_and_print_command(
-                    container,
-                    f"/opt/BEASTv10.5.0/bin/beast -java {' '.join(additional_cli_args or [])} '/data/{analysis_file.name}'",
-                    working_dir="/working",
-                )
-        finally:
-            container.stop()
-            container.remove()
+
+def _checkpoint_state(checkpoint: Path) -> Optional[int]:
+    """Returns the state a checkpoint was written at, or None if the file is
+    incomplete."""
+    try:
+        content = checkpoint.read_text()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+    state = re.match(r"state\s+(\d+)", content)
+    if not state or not content.endswith("\n"):
+        return None
+
+    return int(state.group(1))
@@ -2,6 +2,8 @@ from abc import ABC, abstractmethod
 from pathlib import Path
 from typing import Optional
 
+from phylorun.utils.pipeline_utils import Stage
+
 
 class Engine(ABC):
     """This is an abstract class which is inherited for every engine. It acts as
@@ -18,20 +20,97 @@ class Engine(ABC):
         """Checks if this engine can run the analysis in the given file."""
         raise NotImplementedError
 
+    def preparation_stages(
+        self,
+        analysis_file: Path,
+        engine_path: Optional[str] = None,
+        additional_cli_args: Optional[list[str]] = None,
+    ) -> list[Stage]:
+        """Returns the stages turning the analysis file into a script the engine can run,
+        like converting a PhyloSpec file. The output of the last stage is the script. By
+        default, the engine runs the analysis file directly and no stages are needed."""
+        return []
+
     @abstractmethod
     def run_local_analysis(
         self,
         analysis_file: Path,
         engine_path: Optional[str] = None,
         additional_cli_args: Optional[list[str]] = None,
-    ):
-        """Runs the analysis in the given file using the locally installed engine."""
+    ) -> int:
+        """Runs the analysis in the given file using the locally installed engine and
+        returns the exit code of the engine."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def container_images(self) -> list[tuple[str, str]]:
+        """Returns the names and Dockerfiles of the images needed for containerized
+        runs, in build order. The last image is the one the analysis runs in."""
         raise NotImplementedError
 
     @abstractmethod
     def run_containerized_analysis(
-        self, analysis_file: Path, additional_cli_args: Optional[list[str]] = None
-    ):
-        """Runs the analysis in the given file in a container. This does not require the
-        engine to be installed on the system."""
+        self,
+        analysis_file: Path,
+        additional_cli_args: Optional[list[str]] = None,
+        scratch: Optional[str] = None,
+    ) -> int:
+        """Runs the analysis in the given file in a container and returns the exit code
+        of the engine. This does not require the engine to be installed on the system.
+        If `scratch` is 'tmpfs' or 'disk', the engine writes its outputs to a
+        container-local scratch directory which is copied back to the working
+        directory."""
         raise NotImplementedError
+
+    def outputs_next_to_analysis_args(self) -> list[str]:
+        """Returns the CLI arguments which make the engine write its outputs into the
+        directory of the analysis file instead of the working directory. This keeps the
+        outputs of analyses run side by side apart. By default, no arguments are
+        needed."""
+        return []
+
+    def output_files(
+        self, analysis_file: Path, additional_cli_args: Optional[list[str]] = None
+    ) -> list[Path]:
+        """Returns the trace logs and tree files the analysis writes when it runs
+        locally with the given CLI arguments. By default, the outputs are unknown."""
+        return []
+
+    def overwrite_outputs_args(self) -> list[str]:
+        """Returns the CLI arguments which let the engine write into output files
+        which already exist. By default, no arguments are needed."""
+        return []
+
+    def checkpointed_analysis(
+        self,
+        analysis_file: Path,
+        resume: bool = False,
+        checkpoint_every: Optional[int] = None,
+    ) -> tuple[Path, list[str]]:
+        """Returns the analysis file and the CLI arguments which make the engine write
+        a checkpoint every `checkpoint_every` iterations and, if `resume` is set,
+        continue from the latest complete checkpoint. Without a checkpoint, the
+        analysis starts from the beginning."""
+        raise Exception(f"Resuming analyses is not supported for {self.name()}.")
+
+    def power_posterior_step(
+        self,
+        analysis_file: Path,
+        beta: float,
+        step_dir: Path,
+        chain_length: Optional[int] = None,
+    ) -> tuple[Path, list[str]]:
+        """Writes an analysis into `step_dir` which samples from the power posterior
+        with the likelihood raised to `beta` and logs the log likelihood. Returns the
+        written analysis file and the CLI arguments needed to run it. This is used for
+        marginal likelihood estimation. If `chain_length` is given, the step runs this
+        many iterations instead of the chain length of the analysis."""
+        raise Exception(
+            f"Marginal likelihood estimation is not supported for {self.name()}."
+        )
+
+    def read_power_posterior_log_likelihoods(self, step_dir: Path) -> list[float]:
+        """Returns the log likelihoods logged by a power posterior step."""
+        raise Exception(
+            f"Marginal likelihood estimation is not supported for {self.name()}."
+        )
@@ -1,16 +1,26 @@
 from pathlib import Path
-from typing import Optional
+from typing import Optional, cast
 
-from phylorun.engines.beast2 import BEAST2
+from phylorun.engines.beast2 import BEAST2, latest_state_file
 from phylorun.engines.engine import Engine
 
 from loguru import logger
+import re
+import shlex
 import subprocess
 
 import os
 
 import phylorun
+from phylorun.utils.docker_utils import (
+    create_images_if_needed,
+    get_docker_client,
+    run_analysis_in_container,
+)
 from phylorun.utils.phylospec_utils import is_phylospec_file
+from phylorun.utils.pipeline_utils import Pipeline, Stage
+
+CONVERT_TO_LPHY_JAR = Path(phylorun.__path__[0]) / "jars" / "convertToLPhy.jar"
 
 
 class LPhy(Engine):
@@ -35,41 +45,117 @@ class LPhy(Engine):
         analysis_file: Path,
         engine_path: Optional[str] = None,
         additional_cli_args: Optional[list[str]] = None,
-    ):
-        """Runs the analysis in the given file using the locally installed engine."""
+    ) -> int:
+        """Runs the analysis in the given file using the locally installed engine and
+        returns the exit code of the engine."""
         engine_path = engine_path or self._find_binary_path()
         if not engine_path:
             raise Exception("""No lphybeast binary found.
 Use `phylorun --bin <path-to-binary> your_analysis.xml` to manually specify the lphybeast binary.
             """)
 
-        if is_phylospec_file(analysis_file):
-            analysis_file = self._convert_to_lphy(analysis_file)
-
-        additional_lphy_cli_args = [
-            arg for arg in additional_cli_args or [] if not arg.startswith("--beast2")
-        ]
         additional_beast_cli_args = [
             arg.removeprefix("--beast2")
             for arg in additional_cli_args or []
             if arg.startswith("--beast2")
         ] or ["-working"]
 
+        stages = self.preparation_stages(
+            analysis_file, engine_path, additional_cli_args
+        )
+        beast2_file = stages[-1].output
+        assert beast2_file
+
+        run_stage = Stage(
+            "run BEAST 2",
+            inputs=[beast2_file],
+            output=None,
+            action=lambda: BEAST2().run_local_analysis(
+                beast2_file, additional_cli_args=additional_beast_cli_args
+            ),
+        )
+
+        return cast(int, Pipeline([*stages, run_stage]).run()[run_stage])
+
+    def preparation_stages(
+        self,
+        analysis_file: Path,
+        engine_path: Optional[str] = None,
+        additional_cli_args: Optional[list[str]] = None,
+    ) -> list[Stage]:
+        """Returns the stages converting a PhyloSpec file into an LPhy file (if needed)
+        and generating the BEAST 2 XML file using lphybeast."""
+        # resolved here such that `prepare` and `run` record the same fingerprint
+        engine_path = engine_path or self._find_binary_path()
+        stages = []
+
+        if is_phylospec_file(analysis_file):
+            lphy_file = self._converted_lphy_path(analysis_file)
+            stages.append(
+                Stage(
+                    "convert PhyloSpec to LPhy",
+                    inputs=[analysis_file, CONVERT_TO_LPHY_JAR],
+                    output=lphy_file,
+                    action=lambda: self._convert_to_lphy(analysis_file),
+                )
+            )
+        else:
+            lphy_file = analysis_file
+
+        additional_lphy_cli_args = [
+            arg for arg in additional_cli_args or [] if not arg.startswith("--beast2")
+        ]
+        beast2_file = lphy_file.parent / (lphy_file.stem + ".xml")
+
+        stages.append(
+            Stage(
+                "generate BEAST 2 XML using lphybeast",
+                inputs=[lphy_file, *self._referenced_files(analysis_file)],
+                output=beast2_file,
+                action=lambda: self._run_lphybeast(
+                    lphy_file, engine_path, additional_lphy_cli_args
+                ),
+                parameters=[engine_path or "", *additional_lphy_cli_args],
+            )
+        )
+
+        return stages
+
+    def _run_lphybeast(
+        self,
+        lphy_file: Path,
+        engine_path: Optional[str],
+        additional_lphy_cli_args: list[str],
+    ):
+        engine_path = engine_path or self._find_binary_path()
+        if not engine_path:
+            raise Exception("No lphybeast binary found.")
+
         env = os.environ.copy()
         if beast_path := self._find_beast_path():
             env["BEAST"] = beast_path
 
-        # run lphybeast
-        subprocess.run(
-            ["sh", engine_path, *additional_lphy_cli_args, analysis_file], env=env
+        result = subprocess.run(
+            ["sh", engine_path, *additional_lphy_cli_args, lphy_file], env=env
         )
+        if result.returncode != 0:
+            raise Exception(f"lphybeast failed for '{lphy_file}'.")
 
-        # run BEAST 2
-        beast2_file = analysis_file.parent / (analysis_file.stem + ".xml")
-        beast2 = BEAST2()
-        beast2.run_local_analysis(
-            beast2_file, additional_cli_args=additional_beast_cli_args
-        )
+    def _referenced_files(self, analysis_file: Path) -> list[Path]:
+        """Returns the existing files referenced by string literals in the analysis
+        file, like alignments loaded using readNexus."""
+        try:
+            content = analysis_file.read_text()
+        except (OSError, UnicodeDecodeError):
+            return []
+
+        referenced_files = []
+        for literal in re.findall(r'"([^"\n]+)"', content):
+            path = analysis_file.parent / literal
+            if path.is_file():
+                referenced_files.append(path)
+
+        return referenced_files
 
     def _find_binary_path(self) -> Optional[str]:
         if path := os.environ.get("BEAST"):
@@ -102,13 +188,11 @@ Use `phylorun --bin <path-to-binary> your_analysis.xml` to manually specify the
     def _convert_to_lphy(self, phylospec_file: Path) -> Path:
         """Converts the PhyloSpec file into an LPhy file and returns the created LPhy
         file path."""
-        convert_to_lphy_jar = Path(phylorun.__path__[0]) / "jars" / "convertToLPhy.jar"
-
         lphy_result = subprocess.run(
             [
                 "java",
                 "-cp",
-                convert_to_lphy_jar,
+                CONVERT_TO_LPHY_JAR,
                 "org.phylospec.converters.ConvertToLPhy",
                 phylospec_file,
             ],
@@ -124,14 +208,157 @@ Use `phylorun --bin <path-to-binary> your_analysis.xml` to manually specify the
                 "Unknonw error when converting the .phylospec script to an .lphy script."
             )
 
-        lphy_file = phylospec_file.parent / (phylospec_file.stem + "_converted.lphy")
+        lphy_file = self._converted_lphy_path(phylospec_file)
         lphy_file.write_bytes(lphy_result.stdout)
 
         return lphy_file
 
+    def _converted_lphy_path(self, phylospec_file: Path) -> Path:
+        return phylospec_file.parent / (phylospec_file.stem + "_converted.lphy")
+
+    def checkpointed_analysis(
+        self,
+        analysis_file: Path,
+        resume: bool = False,
+        checkpoint_every: Optional[int] = None,
+    ) -> tuple[Path, list[str]]:
+        """Resumes BEAST 2 from the state file of the generated XML using
+        `--beast2-resume`. BEAST 2 stores its state at every log interval of the
+        generated XML, as the checkpoint interval cannot be set through lphybeast."""
+        if checkpoint_every:
+            logger.warning(
+                "The checkpoint interval cannot be set for LPhy analyses, BEAST 2 "
+                "stores its state at every log interval."
+            )
+
+        args = ["--beast2-working"]
+
+        beast2_file = self.preparation_stages(analysis_file)[-1].output
+        assert beast2_file
+
+        if resume and latest_state_file(beast2_file):
+            args.append("--beast2-resume")
+        elif resume:
+            logger.info("No complete state file found, starting from the beginning.")
+
+        return analysis_file, args
+
+    def outputs_next_to_analysis_args(self) -> list[str]:
+        """Returns the BEAST 2 flag which writes the outputs next to the analysis file."""
+        return ["--beast2-working"]
+
+    def container_images(self) -> list[tuple[str, str]]:
+        """Returns the name and Dockerfile of the BEAST 2 image and of the lphybeast
+        image built on top of it."""
+        beast2_images = BEAST2().container_images()
+        beast2_image_name = beast2_images[-1][0]
+
+        return [
+            *beast2_images,
+            (
+                "lphybeast:2.7.7",
+                f"""FROM {beast2_image_name}
+            RUN /opt/beast/bin/packagemanager -add lphybeast
+            """,
+            ),
+        ]
+
     def run_containerized_analysis(
-        self, analysis_file: Path, additional_cli_args: Optional[list[str]] = None
-    ):
-        """Runs the analysis in the given file in a container. This does not require the
-        engine to be installed on the system."""
-        raise NotImplementedError
+        self,
+        analysis_file: Path,
+        additional_cli_args: Optional[list[str]] = None,
+        scratch: Optional[str] = None,
+    ) -> int:
+        """Runs the analysis in the given file in a container and returns the exit code
+        of the engine. This does not require the engine to be installed on the system.
+
+        The PhyloSpec conversion, lphybeast and BEAST 2 all run in the same container.
+        The intermediate .lphy and .xml files are kept on container-local storage and
+        never written back to the analysis directory."""
+        docker_client = get_docker_client()
+
+        images = self.container_images()
+        create_images_if_needed(docker_client, images)
+
+        additional_lphy_cli_args = [
+            arg for arg in additional_cli_args or [] if not arg.startswith("--beast2")
+        ]
+        additional_beast_cli_args = [
+            arg.removeprefix("--beast2")
+            for arg in additional_cli_args or []
+            if arg.startswith("--beast2")
+        ]
+
+        # without explicit BEAST 2 arguments, the outputs are written next to the
+        # analysis file (this mirrors the default '-working' flag of local runs). The
+        # generated XML stays in the container, which is why '-working' is replaced
+        # by running BEAST 2 in the analysis directory.
+        working_dir = None
+        if not additional_beast_cli_args or "-working" in additional_beast_cli_args:
+            working_dir = "/data"
+            additional_beast_cli_args = [
+                arg for arg in additional_beast_cli_args if arg != "-working"
+            ]
+
+        return run_analysis_in_container(
+            docker_client,
+            images[-1][0],
+            analysis_file,
+            "sh -c "
+            + shlex.quote(
+                self._containerized_pipeline(
+                    analysis_file, additional_lphy_cli_args, additional_beast_cli_args
+                )
+            ),
+            working_dir=working_dir,
+            scratch=scratch,
+            volumes={
+                str(CONVERT_TO_LPHY_JAR.parent.resolve()): {
+                    "bind": "/phylorun/jars",
+                    "mode": "ro",
+                }
+            },
+            environment={"BEAST": "/opt/beast"},
+        )
+
+    def _containerized_pipeline(
+        self,
+        analysis_file: Path,
+        additional_lphy_cli_args: list[str],
+        additional_beast_cli_args: list[str],
+    ) -> str:
+        """Returns the shell script which runs the PhyloSpec conversion (if needed),
+        lphybeast and BEAST 2 inside the container."""
+        scratch_dir = "/tmp/phylorun"
+        input_file = f"/data/{analysis_file.name}"
+
+        commands = ["set -e", f"mkdir -p {scratch_dir}"]
+
+        if is_phylospec_file(analysis_file):
+            lphy_file = f"{scratch_dir}/{analysis_file.stem}_converted.lphy"
+            commands += [
+                "/opt/beast/jre/bin/java -cp /phylorun/jars/convertToLPhy.jar "
+                "org.phylospec.converters.ConvertToLPhy "
+                f"{shlex.quote(input_file)} > {shlex.quote(lphy_file)}",
+                f"test -s {shlex.quote(lphy_file)}",
+            ]
+        else:
+            lphy_file = input_file
+
+        xml_file = f"{scratch_dir}/{Path(lphy_file).stem}.xml"
+        commands += [
+            shlex.join(
+                [
+                    "/root/.beast/2.7/lphybeast/bin/lphybeast",
+                    *additional_lphy_cli_args,
+                    "-wd",
+                    "/data",
+                    "-o",
+                    xml_file,
+                    lphy_file,
+                ]
+            ),
+            shlex.join(["/opt/beast/bin/beast", *additional_beast_cli_args, xml_file]),
+        ]
+
+        return "\n".join(commands)
@@ -1,20 +1,26 @@
 from pathlib import Path
+import re
 import subprocess
-from typing import Optional
+from typing import Optional, cast
 
 from loguru import logger
 import phylorun
 from phylorun.engines.engine import Engine
+from phylorun.utils.checkpoint_utils import checkpointed_copy_path, relative_path
 from phylorun.utils.docker_utils import (
-    create_image_if_needed,
+    BASE_IMAGE_NAME,
+    create_images_if_needed,
     get_docker_client,
-    run_and_print_command,
-    start_container,
+    run_analysis_in_container,
 )
+from phylorun.utils.log_utils import read_log_column
 from phylorun.utils.phylospec_utils import is_phylospec_file
+from phylorun.utils.pipeline_utils import Pipeline, Stage
 
 
 BINARY_URL = "https://github.com/revbayes/revbayes/releases/download/v1.3.1/revbayes-v1.3.1-linux64.tar.gz"
+CONVERT_TO_REV_JAR = Path(phylorun.__path__[0]) / "jars" / "convertToRev.jar"
+POWER_POSTERIOR_OUTPUT = "power_posterior.out"
 
 
 class RevBayes(Engine):
@@ -39,8 +45,9 @@ class RevBayes(Engine):
         analysis_file: Path,
         engine_path: Optional[str] = None,
         additional_cli_args: Optional[list[str]] = None,
-    ):
-        """Runs the analysis in the given file using the locally installed engine."""
+    ) -> int:
+        """Runs the analysis in the given file using the locally installed engine and
+        returns the exit code of the engine."""
         engine_path = engine_path or "rb"
         if not engine_path:
             raise Exception("""No RevBayes binary found.
@@ -50,74 +57,276 @@ Use `phylorun --bin <path-to-binary> your_analysis.rev` to manually specify the
 
         additional_cli_args = additional_cli_args or []
 
-        if is_phylospec_file(analysis_file):
-            analysis_file = self._convert_to_rev(analysis_file)
+        stages = self.preparation_stages(analysis_file)
+        rev_file = stages[-1].output if stages else analysis_file
+        assert rev_file
 
-        subprocess.run([engine_path, *additional_cli_args, analysis_file])
+        run_stage = Stage(
+            "run RevBayes",
+            inputs=[rev_file],
+            output=None,
+            action=lambda: (
+                subprocess.run([engine_path, *additional_cli_args, rev_file]).returncode
+            ),
+        )
 
-    def run_containerized_analysis(
-        self, analysis_file: Path, additional_cli_args: Optional[list[str]] = None
-    ):
-        """Runs the analysis in the given file in a container. This does not require the
-        engine to be installed on the system."""
-        if is_phylospec_file(analysis_file):
-            analysis_file = self._convert_to_rev(analysis_file)
+        return cast(int, Pipeline([*stages, run_stage]).run()[run_stage])
 
-        docker_client = get_docker_client()
+    def preparation_stages(
+        self,
+        analysis_file: Path,
+        engine_path: Optional[str] = None,
+        additional_cli_args: Optional[list[str]] = None,
+    ) -> list[Stage]:
+        """Returns the stage converting a PhyloSpec file into a Rev script (if needed)."""
+        if not is_phylospec_file(analysis_file):
+            return []
 
-        IMAGE_NAME = "revbayes:1.3.1"
+        return [
+            Stage(
+                "convert PhyloSpec to Rev",
+                inputs=[analysis_file, CONVERT_TO_REV_JAR],
+                output=self._converted_rev_path(analysis_file),
+                action=lambda: self._convert_to_rev(analysis_file),
+            )
+        ]
 
-        create_image_if_needed(
-            docker_client,
-            IMAGE_NAME,
-            f"""FROM ubuntu:latest
-            RUN apt-get update \\
-                && apt-get install -y wget tar \\
-                && wget {BINARY_URL} -O /revBayes.tgz \\
+    def container_images(self) -> list[tuple[str, str]]:
+        """Returns the name and Dockerfile of the RevBayes image."""
+        return [
+            (
+                "revbayes:1.3.1",
+                f"""FROM {BASE_IMAGE_NAME}
+            RUN wget {BINARY_URL} -O /revBayes.tgz \\
                 && tar -xzf /revBayes.tgz -C /opt   \\
                 && rm /revBayes.tgz
             """,
-        )
+            )
+        ]
+
+    def run_containerized_analysis(
+        self,
+        analysis_file: Path,
+        additional_cli_args: Optional[list[str]] = None,
+        scratch: Optional[str] = None,
+    ) -> int:
+        """Runs the analysis in the given file in a container and returns the exit code
+        of the engine. This does not require the engine to be installed on the system."""
+        if stages := self.preparation_stages(analysis_file):
+            Pipeline(stages).run()
+            analysis_file = self._converted_rev_path(analysis_file)
+
+        # the MCMC and its moves are checkpointed next to the checkpoint file, with
+        # '_mcmc' and '_moves' (and the run number) appended to its name
+        checkpoint_files = [
+            path
+            for checkpoint in re.findall(
+                r"\bcheckpointFile\s*=\s*[\"']([^\"']+)[\"']", analysis_file.read_text()
+            )
+            for path in (
+                Path(checkpoint),
+                Path(checkpoint).parent / (Path(checkpoint).stem + "_"),
+            )
+        ]
 
-        working_dir_is_data_dir = Path() == analysis_file.parent
+        docker_client = get_docker_client()
 
-        volumes = {str(analysis_file.parent.resolve()): {"bind": "/data", "mode": "rw"}}
-        if not working_dir_is_data_dir:
-            volumes[str(Path().resolve())] = {"bind": "/working", "mode": "rw"}
+        images = self.container_images()
+        create_images_if_needed(docker_client, images)
 
-        container = start_container(
+        return run_analysis_in_container(
             docker_client,
-            IMAGE_NAME,
-            volumes=volumes,
+            images[-1][0],
+            analysis_file,
+            f"/opt/revbayes-v1.3.1/bin/rb {' '.join(additional_cli_args or [])} '/data/{analysis_file.name}'",
+            scratch=scratch,
+            outputs=[*self.output_files(analysis_file), *checkpoint_files],
         )
 
-        try:
-            if working_dir_is_data_dir:
-                run_and_print_command(
-                    container,
-                    f"/opt/revbayes-v1.3.1/bin/rb {' '.join(additional_cli_args or [])} '/data/{analysis_file.name}'",
-                    working_dir="/data",
+    def output_files(
+        self, analysis_file: Path, additional_cli_args: Optional[list[str]] = None
+    ) -> list[Path]:
+        """Returns the files written by the monitors (like `mnModel` or `mnFile`) of the
+        Rev script. Only file names given as string literals are found."""
+        if stages := self.preparation_stages(analysis_file):
+            Pipeline(stages).run()
+            analysis_file = self._converted_rev_path(analysis_file)
+
+        script = analysis_file.read_text()
+
+        files = []
+        for monitor in re.finditer(r"\bmn\w+\s*\(", script):
+            end = _closing_parenthesis(script, monitor.end())
+            for argument in _split_arguments(script[monitor.end() : end]):
+                if file_name := re.fullmatch(
+                    r"\s*filename\s*=\s*[\"']([^\"']+)[\"']\s*", argument
+                ):
+                    files.append(Path(file_name.group(1)))
+
+        return files
+
+    def checkpointed_analysis(
+        self,
+        analysis_file: Path,
+        resume: bool = False,
+        checkpoint_every: Optional[int] = None,
+    ) -> tuple[Path, list[str]]:
+        """Writes a copy of the Rev script in which the MCMC runs write checkpoints
+        every `checkpoint_every` generations and, when resuming, are initialized from
+        the checkpoint before running. Checkpoint files given in the script are kept,
+        otherwise they are written next to the analysis file."""
+        if stages := self.preparation_stages(analysis_file):
+            Pipeline(stages).run()
+            analysis_file = self._converted_rev_path(analysis_file)
+
+        script = analysis_file.read_text()
+
+        mcmc_names = set(
+            re.findall(r"^\s*(\w+)\s*(?:=|<-|:=)\s*mcmc(?:mc)?\s*\(", script, re.M)
+        )
+        runs = list(
+            re.finditer(
+                rf"\b({'|'.join(map(re.escape, mcmc_names))})\.run\s*\(", script
+            )
+        )
+        if not mcmc_names or not runs:
+            raise Exception(
+                "Resuming requires an mcmc(...) analysis in the Rev script."
+            )
+
+        default_checkpoint = relative_path(
+            analysis_file.parent / (analysis_file.stem + ".state")
+        )
+
+        # the runs are rewritten from the last to the first to keep the positions of
+        # the earlier ones valid
+        for run in reversed(runs):
+            start = run.end()
+            end = _closing_parenthesis(script, start)
+
+            arguments = []
+            checkpoint = None
+            for argument in _split_arguments(script[start:end]):
+                named = re.match(r"\s*(\w+)\s*=(?!=)\s*(.*)", argument, re.S)
+                if named and named.group(1) == "checkpointFile":
+                    checkpoint = named.group(2).strip().strip("\"'")
+                if (
+                    named
+                    and checkpoint_every
+                    and named.group(1) == "checkpointInterval"
+                ):
+                    continue
+                arguments.append(argument.strip())
+
+            if checkpoint is None:
+                checkpoint = default_checkpoint
+                if checkpoint_every:
+                    arguments.append(f'checkpointFile="{checkpoint}"')
+            if checkpoint_every:
+                arguments.append(f"checkpointInterval={checkpoint_every}")
+
+            line_start = script.rfind("\n", 0, run.start()) + 1
+            line = script[line_start : run.start()]
+            indentation = line[: len(line) - len(line.lstrip())]
+
+            initialization = ""
+            if resume and _is_complete_checkpoint(Path(checkpoint)):
+                logger.info(f"Resuming {run.group(1)} from '{checkpoint}'.")
+                initialization = f'{indentation}{run.group(1)}.initializeFromCheckpoint("{checkpoint}")\n'
+            elif resume:
+                logger.info(
+                    f"No complete checkpoint '{checkpoint}' found, starting "
+                    f"{run.group(1)} from the beginning."
                 )
+
+            script = (
+                script[:line_start]
+                + initialization
+                + script[line_start:start]
+                + ", ".join(arguments)
+                + script[end:]
+            )
+
+        checkpointed_file = checkpointed_copy_path(analysis_file)
+        checkpointed_file.parent.mkdir(exist_ok=True)
+        checkpointed_file.write_text(script)
+
+        return checkpointed_file, []
+
+    def power_posterior_step(
+        self,
+        analysis_file: Path,
+        beta: float,
+        step_dir: Path,
+        chain_length: Optional[int] = None,
+    ) -> tuple[Path, list[str]]:
+        """Writes a copy of the Rev script in which the powerPosterior analysis only
+        runs the stone with the given power and writes its samples into the step
+        directory. `chain_length` replaces the generations of the stone. The stepping
+        stone and path samplers are removed, as they would summarize the stones of
+        the original output in every step."""
+        script = _without_marginal_likelihood_samplers(analysis_file.read_text())
+
+        match = re.search(r"\bpowerPosterior\s*\(", script)
+        if not match:
+            raise Exception(
+                "Marginal likelihood estimation requires a powerPosterior(...) call in "
+                "the Rev script."
+            )
+
+        start = match.end()
+        end = _closing_parenthesis(script, start)
+
+        # the output path is relative to the working directory, such that it is valid
+        # both for local and containerized runs
+        output = relative_path(step_dir / POWER_POSTERIOR_OUTPUT)
+
+        arguments = []
+        positional_index = 0
+        for argument in _split_arguments(script[start:end]):
+            if named := re.match(r"\s*(\w+)\s*=(?!=)", argument):
+                if named.group(1) in ("cats", "alpha", "powers"):
+                    continue
+                if named.group(1) == "filename":
+                    argument = f'filename="{output}"'
             else:
-                run_and_print_command(
-                    container,
-                    f"/opt/revbayes-v1.3.1/bin/rb {' '.join(additional_cli_args or [])} '/data/{analysis_file.name}'",
-                    working_dir="/working",
-                )
-        finally:
-            container.stop()
-            container.remove()
+                # model, moves, monitors, filename
+                if positional_index == 3:
+                    argument = f'"{output}"'
+                positional_index += 1
+
+            arguments.append(argument.strip())
+
+        arguments.append(f"powers=[{beta:.10f}]")
+        script = script[:start] + ", ".join(arguments) + script[end:]
+
+        if chain_length:
+            script = _with_generations(script, match.start(), chain_length)
+
+        step_file = step_dir / analysis_file.name
+        step_file.write_text(script)
+
+        return step_file, []
+
+    def read_power_posterior_log_likelihoods(self, step_dir: Path) -> list[float]:
+        """Returns the log likelihoods sampled by a powerPosterior stone."""
+        output = step_dir / POWER_POSTERIOR_OUTPUT
+        if not output.exists():
+            # the stone file is written before the stones are summarized
+            output = next(
+                step_dir.glob(f"{output.stem}_stone_*{output.suffix}"), output
+            )
+
+        return read_log_column(output, "likelihood")
 
     def _convert_to_rev(self, phylospec_file: Path) -> Path:
         """Converts the PhyloSpec file into an RevBayes file and returns the created RevBayes
         file path."""
-        convert_to_rev_jar = Path(phylorun.__path__[0]) / "jars" / "convertToRev.jar"
-
         rev_result = subprocess.run(
             [
                 "java",
                 "-cp",
-                convert_to_rev_jar,
+                CONVERT_TO_REV_JAR,
                 "org.phylospec.converters.ConvertToRev",
                 phylospec_file,
             ],
@@ -133,7 +342,133 @@ Use `phylorun --bin <path-to-binary> your_analysis.rev` to manually specify the
                 "Unknonw error when converting the .phylospec script to an .rev script."
             )
 
-        rev_file = phylospec_file.parent / (phylospec_file.stem + "_converted.rev")
+        rev_file = self._converted_rev_path(phylospec_file)
         rev_file.write_bytes(rev_result.stdout)
 
         return rev_file
+
+    def _converted_rev_path(self, phylospec_file: Path) -> Path:
+        return phylospec_file.parent / (phylospec_file.stem + "_converted.rev")
+
+
+def _closing_parenthesis(script: str, start: int) -> int:
+    """Returns the index of the parenthesis closing the one opened before `start`."""
+    depth = 1
+    quote = None
+
+    for index in range(start, len(script)):
+        character = script[index]
+
+        if quote:
+            if character == quote:
+                quote = None
+        elif character in "\"'":
+            quote = character
+        elif character in "([{":
+            depth += 1
+        elif character in ")]}":
+            depth -= 1
+            if depth == 0:
+                return index
+
+    raise Exception("Unbalanced parentheses in the Rev script.")
+
+
+def _split_arguments(arguments: str) -> list[str]:
+    """Splits a list of function arguments at the top-level commas."""
+    parts = []
+    depth = 0
+    quote = None
+    current = ""
+
+    for character in arguments:
+        if quote:
+            if character == quote:
+                quote = None
+        elif character in "\"'":
+            quote = character
+        elif character in "([{":
+            depth += 1
+        elif character in ")]}":
+            depth -= 1
+        elif character == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+
+        current += character
+
+    if current.strip():
+        parts.append(current)
+
+    return parts
+
+
+def _without_marginal_likelihood_samplers(script: str) -> str:
+    """Removes the statements creating stepping stone or path samplers, and the
+    lines using the variables they are assigned to."""
+    names = []
+
+    while match := re.search(r"\b(?:steppingStoneSampler|pathSampler)\s*\(", script):
+        line_start = script.rfind("\n", 0, match.start()) + 1
+        line_end = script.find("\n", _closing_parenthesis(script, match.end()))
+        line_end = len(script) if line_end == -1 else line_end + 1
+
+        if name := re.match(
+            r"\s*(\w+)\s*(?:=|<-|:=)\s*$", script[line_start : match.start()]
+        ):
+            names.append(name.group(1))
+
+        script = script[:line_start] + script[line_end:]
+
+    if not names:
+        return script
+
+    return "".join(
+        line
+        for line in script.splitlines(keepends=True)
+        if not re.search(rf"\b(?:{'|'.join(map(re.escape, names))})\b", line)
+    )
+
+
+def _with_generations(script: str, power_posterior_start: int, generations: int) -> str:
+    """Sets the generations of the run of the powerPosterior analysis created at
+    `power_posterior_start`."""
+    line_start = script.rfind("\n", 0, power_posterior_start) + 1
+    name = re.match(
+        r"\s*(\w+)\s*(?:=|<-|:=)\s*$", script[line_start:power_posterior_start]
+    )
+    run = name and re.search(
+        rf"\b{re.escape(name.group(1))}\.run\s*\(", script[power_posterior_start:]
+    )
+    if not name or not run:
+        raise Exception(
+            "Setting the chain length requires the powerPosterior analysis to be "
+            "assigned to a variable whose run(...) method is called."
+        )
+
+    start = power_posterior_start + run.end()
+    end = _closing_parenthesis(script, start)
+
+    arguments = [
+        argument.strip()
+        for index, argument in enumerate(_split_arguments(script[start:end]))
+        if not re.match(r"\s*generations\s*=(?!=)", argument)
+        and (index > 0 or re.match(r"\s*\w+\s*=(?!=)", argument))
+    ]
+    arguments.insert(0, f"generations={generations}")
+
+    return script[:start] + ", ".join(arguments) + script[end:]
+
+
+def _is_complete_checkpoint(checkpoint: Path) -> bool:
+    """Checks if RevBayes wrote all files of a checkpoint. Next to the checkpoint
+    file, the states of the sampler and the moves are stored in separate files."""
+    return all(
+        path.exists() and path.stat().st_size > 0
+        for path in [
+            checkpoint,
+            checkpoint.with_name(f"{checkpoint.stem}_mcmc{checkpoint.suffix}"),
+            checkpoint.with_name(f"{checkpoint.stem}_moves{checkpoint.suffix}"),
+        ]
+    )
@@ -1,19 +1,139 @@
+import shlex
+import time
+from contextlib import nullcontext
+from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
 import click
+from loguru import logger
 
 from phylorun.engines import ENGINES
 from phylorun.engines.engine import Engine
+from phylorun.schedulers import SCHEDULERS
+from phylorun.schedulers.scheduler import FAILED
+from phylorun.utils.batch_utils import BatchJob, get_scheduler, submit_batch
+from phylorun.utils.compression_utils import COMPRESSION_METHODS, compressed_outputs
+from phylorun.utils.dashboard_utils import (
+    DEFAULT_PARAMETERS,
+    RunMonitor,
+    render_dashboard,
+)
+from phylorun.utils.docker_utils import (
+    BASE_IMAGE_NAME,
+    SCRATCH_MODES,
+    build_images,
+    export_images,
+    get_docker_client,
+    image_exists,
+    load_images,
+    pull_images,
+)
+from phylorun.utils.marginal_likelihood_utils import estimate_marginal_likelihood
+from phylorun.utils.pipeline_utils import Pipeline
+from phylorun.utils.placement_utils import reserved_cpus
+from phylorun.utils.preflight_utils import (
+    PREFLIGHT_ENGINES,
+    RunPrediction,
+    check_limits,
+    format_duration,
+    parse_duration,
+    parse_memory_mb,
+    peak_child_memory_mb,
+    predict_run,
+    record_run,
+    records_runs,
+)
+from phylorun.utils.resource_utils import available_cpus, physical_memory_mb
+from phylorun.utils.sweep_utils import parse_parameter, read_grid_file, run_sweep
 
 
 CONTEXT_SETTINGS = dict(ignore_unknown_options=True, allow_extra_args=True)
+ENGINE_NAMES = ["beastx", "beast2", "revbayes", "lphy"]
+
+
+class DefaultCommandGroup(click.Group):
+    """A command group which falls back to the `run` command if the first argument is
+    not a known command. This keeps `phylorun someModel.xml` working."""
+
+    def parse_args(self, ctx: click.Context, args: list[str]) -> list[str]:
+        if (
+            args
+            and args[0] not in self.commands
+            and args[0] not in ctx.help_option_names
+        ):
+            args = ["run", *args]
 
+        return super().parse_args(ctx, args)
 
-@click.command(context_settings=CONTEXT_SETTINGS)
+
+@click.group(cls=DefaultCommandGroup)
+def cli() -> None:
+    """Run BEAST X, BEAST 2, RevBayes, or LPhy analyses from a single CLI.
+
+    \b
+    Examples:
+      phylorun someModel.xml
+      phylorun --engine beast2 someModel.xml
+      phylorun --bin /path/to/beast someModel.xml
+      phylorun --container someModel.rev
+      phylorun --resume --checkpoint-every 100000 someModel.xml
+      phylorun prepare someModel.phylospec
+      phylorun preflight --max-memory 16G --max-time 48h someModel.xml
+      phylorun sweep --param clock=strict,relaxed someModel.xml
+      phylorun batch submit analyses/*.xml
+      phylorun dashboard run1/model.log run2/model.log
+      phylorun images build
+    """
+
+
+def select_engine(engine: Optional[str], analysis_file: Path) -> Engine:
+    """Returns the engine with the given name or, if no name is given, the first engine
+    which can run the analysis file."""
+    if engine:
+        for e in ENGINES:
+            if e.name() != engine:
+                continue
+
+            if not e.can_run_analysis(analysis_file):
+                raise click.ClickException(
+                    f"Engine '{engine}' cannot run file '{analysis_file}'."
+                )
+
+            return e
+
+        raise click.ClickException(f"Engine '{engine}' is not available.")
+
+    for potentialEngine in ENGINES:
+        if potentialEngine.can_run_analysis(analysis_file):
+            return potentialEngine
+
+    raise click.ClickException(
+        f"Could not detect a supported engine for file '{analysis_file}'."
+    )
+
+
+def parse_limits(
+    max_memory: Optional[str], max_time: Optional[str]
+) -> tuple[Optional[int], Optional[float]]:
+    """Parses the --max-memory and --max-time options."""
+    try:
+        return (
+            parse_memory_mb(max_memory) if max_memory else None,
+            parse_duration(max_time) if max_time else None,
+        )
+    except Exception as exception:
+        raise click.BadParameter(str(exception))
+
+
+MAX_MEMORY_HELP = "Memory available to the run, e.g. 16G."
+MAX_TIME_HELP = "Time limit of the run, e.g. 48h or 2-00:00:00."
+
+
+@cli.command(context_settings=CONTEXT_SETTINGS)
 @click.option(
     "--engine",
-    type=click.Choice(["beastx", "beast2", "revbayes", "lphy"], case_sensitive=False),
+    type=click.Choice(ENGINE_NAMES, case_sensitive=False),
     required=False,
     help="Select engine explicitly: beastx | beast2 | revbayes | lphy.",
 )
@@ -29,62 +149,791 @@ CONTEXT_SETTINGS = dict(ignore_unknown_options=True, allow_extra_args=True)
     is_flag=True,
     help="Run inside a containerized environment (no local engine install required).",
 )
+@click.option(
+    "--scratch",
+    type=click.Choice(SCRATCH_MODES, case_sensitive=False),
+    required=False,
+    help="With --container: write outputs to a container-local scratch directory "
+    "(tmpfs | disk) and copy them back in bulk.",
+)
+@click.option(
+    "--cpus",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Pin the run to this many CPUs on one NUMA node, not shared with other "
+    "phylorun runs on this machine.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Continue from the latest complete checkpoint of the analysis, if any.",
+)
+@click.option(
+    "--checkpoint-every",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Write a checkpoint every this many iterations.",
+)
+@click.option(
+    "--compress",
+    type=click.Choice(COMPRESSION_METHODS, case_sensitive=False),
+    required=False,
+    help="Compress the trace logs and tree files while they are written "
+    "(gzip | zstd). Only for local runs.",
+)
+@click.option(
+    "--max-memory",
+    required=False,
+    help=MAX_MEMORY_HELP + " BEAST analyses predicted to need more do not start.",
+)
+@click.option(
+    "--max-time",
+    required=False,
+    help=MAX_TIME_HELP + " BEAST analyses predicted to take longer do not start.",
+)
 @click.argument(
     "analysis_file",
     type=click.Path(exists=True, dir_okay=False, path_type=Path),
 )
 @click.pass_context
-def cli(
+def run(
     ctx: click.Context,
     engine: Optional[str],
     engine_path: Optional[str],
     container: bool,
+    scratch: Optional[str],
+    cpus: Optional[int],
+    resume: bool,
+    checkpoint_every: Optional[int],
+    compress: Optional[str],
+    max_memory: Optional[str],
+    max_time: Optional[str],
     analysis_file: Path,
 ) -> None:
-    """Run BEAST X, BEAST 2, or RevBayes analyses from a single CLI.
+    """Run an analysis. This is the default command."""
+
+    # Choose engine: flag forces selection; otherwise auto-detect
+    selected_engine = select_engine(engine, analysis_file)
+
+    additional_args = list(ctx.args) if ctx.args else None
+
+    if scratch and not container:
+        raise click.ClickException("--scratch can only be used with --container.")
+
+    max_memory_mb, max_seconds = parse_limits(max_memory, max_time)
+
+    # the summary of the analysis is cached and reused by the resource estimate of
+    # the engine
+    prediction = None
+    if selected_engine.name() in PREFLIGHT_ENGINES and (
+        max_memory_mb or max_seconds or records_runs()
+    ):
+        prediction = predict_run(selected_engine.name(), analysis_file)
+
+    if max_memory_mb or max_seconds:
+        if prediction is None:
+            logger.warning("Cannot predict the resources of this analysis.")
+        elif problems := check_limits(prediction, max_memory_mb, max_seconds):
+            raise click.ClickException(
+                " ".join(problems) + " Use `phylorun preflight` for details."
+            )
+
+    if resume or checkpoint_every:
+        analysis_file, checkpoint_args = selected_engine.checkpointed_analysis(
+            analysis_file, resume, checkpoint_every
+        )
+        additional_args = [*checkpoint_args, *(additional_args or [])]
+
+    output_files = []
+    if compress:
+        if container:
+            raise click.ClickException("--compress can only be used for local runs.")
+        if resume:
+            raise click.ClickException(
+                "--compress cannot be combined with --resume, as the engines read "
+                "their logs when resuming."
+            )
+
+        output_files = selected_engine.output_files(analysis_file, additional_args)
+        if not output_files:
+            logger.warning("No output files found to compress.")
+        additional_args = [
+            *selected_engine.overwrite_outputs_args(),
+            *(additional_args or []),
+        ]
+
+    with (
+        reserved_cpus(cpus) if cpus else nullcontext(),
+        compressed_outputs(output_files, compress)
+        if compress and output_files
+        else nullcontext(),
+    ):
+        # waiting for free CPUs does not count as run time
+        start = time.monotonic()
+        if container:
+            exit_code = selected_engine.run_containerized_analysis(
+                analysis_file, additional_args, scratch=scratch
+            )
+        else:
+            exit_code = selected_engine.run_local_analysis(
+                analysis_file, engine_path, additional_args
+            )
+        seconds = time.monotonic() - start
+
+    # complete local runs calibrate the predictions of later runs
+    if prediction and records_runs() and not exit_code and not container and not resume:
+        record_run(prediction, seconds, peak_child_memory_mb())
+
+    ctx.exit(exit_code or 0)
+
+
+@cli.command()
+@click.option(
+    "--engine",
+    "engines",
+    type=click.Choice(ENGINE_NAMES, case_sensitive=False),
+    multiple=True,
+    help="Only prepare the given engines (can be repeated). Defaults to all engines.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=int,
+    required=False,
+    help="Maximum number of stages run in parallel.",
+)
+@click.argument(
+    "analysis_file",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+)
+def prepare(engines: tuple[str, ...], jobs: Optional[int], analysis_file: Path) -> None:
+    """Generate the engine scripts for an analysis without running them.
+
+    Scripts which are up to date are not generated again, and the scripts for
+    different engines are generated in parallel."""
+    selected_engines = [
+        e
+        for e in ENGINES
+        if (not engines or e.name() in engines) and e.can_run_analysis(analysis_file)
+    ]
+    if not selected_engines:
+        raise click.ClickException(
+            f"Could not detect a supported engine for file '{analysis_file}'."
+        )
+
+    stages = [
+        stage for e in selected_engines for stage in e.preparation_stages(analysis_file)
+    ]
+    Pipeline(stages).run(max_workers=jobs)
+
+
+@cli.command()
+@click.option(
+    "--engine",
+    type=click.Choice(PREFLIGHT_ENGINES, case_sensitive=False),
+    required=False,
+    help="Select engine explicitly: beastx | beast2.",
+)
+@click.option(
+    "--max-memory",
+    required=False,
+    help=MAX_MEMORY_HELP + " Defaults to the memory of this machine.",
+)
+@click.option("--max-time", required=False, help=MAX_TIME_HELP)
+@click.argument(
+    "analysis_files",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+)
+@click.pass_context
+def preflight(
+    ctx: click.Context,
+    engine: Optional[str],
+    max_memory: Optional[str],
+    max_time: Optional[str],
+    analysis_files: tuple[Path, ...],
+) -> None:
+    """Check BEAST analyses before running them.
+
+    Summarizes the alignments of every analysis and predicts the memory and run time
+    it needs. The predictions are calibrated on the past local runs on this machine.
+    Exits with an error if an analysis exceeds the limits."""
+    max_memory_mb, max_seconds = parse_limits(max_memory, max_time)
+    max_memory_mb = max_memory_mb or physical_memory_mb()
+
+    exceeded = False
+    for analysis_file in analysis_files:
+        selected_engine = select_engine(engine, analysis_file)
+        if selected_engine.name() not in PREFLIGHT_ENGINES:
+            raise click.ClickException(
+                f"'{analysis_file}' is no BEAST 2 or BEAST X analysis."
+            )
+
+        prediction = predict_run(selected_engine.name(), analysis_file)
+        if prediction is None:
+            raise click.ClickException(f"'{analysis_file}' contains no alignments.")
+
+        click.echo(format_prediction(analysis_file, prediction))
+
+        for problem in check_limits(prediction, max_memory_mb, max_seconds):
+            click.echo(click.style(f"  {problem}", fg="red"))
+            exceeded = True
+
+    if exceeded:
+        ctx.exit(1)
+
+
+def format_prediction(analysis_file: Path, prediction: RunPrediction) -> str:
+    """Formats the alignments and the predicted resources of an analysis."""
+    summary = prediction.summary
+    lines = [
+        f"{analysis_file} ({prediction.engine})",
+        "  partition\ttaxa\tsites\tpatterns\tstates",
+        *(
+            f"  {p.name}\t{p.taxa}\t{p.sites}\t{p.patterns}\t{p.states}"
+            for p in summary.partitions
+        ),
+        f"  rate categories: {summary.categories}",
+        f"  likelihood operations per state: {prediction.operations_per_state:.3g}",
+        f"  chain length: {summary.chain_length or 'unknown'}",
+        f"  memory: {prediction.memory_mb} MB",
+        "  time: "
+        + (format_duration(prediction.seconds) if prediction.seconds else "unknown"),
+        f"  calibrated on {prediction.calibration_runs} past run(s)",
+    ]
+    return "\n".join(lines)
+
+
+@cli.command("marginal-likelihood", context_settings=CONTEXT_SETTINGS)
+@click.option(
+    "--engine",
+    type=click.Choice(ENGINE_NAMES, case_sensitive=False),
+    required=False,
+    help="Select engine explicitly: beast2 | revbayes.",
+)
+@click.option(
+    "--bin",
+    "engine_path",
+    type=click.Path(exists=True, dir_okay=False, path_type=str),
+    required=False,
+    help="Path to the engine binary to use for local runs.",
+)
+@click.option(
+    "--container",
+    is_flag=True,
+    help="Run every step in its own container.",
+)
+@click.option(
+    "--steps", type=click.IntRange(min=1), default=32, help="Number of stepping stones."
+)
+@click.option(
+    "--alpha",
+    type=click.FloatRange(min=0, min_open=True),
+    default=0.3,
+    help="Shape of the Beta(alpha, 1) power schedule.",
+)
+@click.option(
+    "--burnin",
+    type=click.FloatRange(min=0, max=1, max_open=True),
+    default=0.1,
+    help="Fraction of the samples of each step to discard.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Maximum number of steps run in parallel. Defaults to the number of CPUs.",
+)
+@click.option(
+    "--cpus-per-step",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Pin every step to this many CPUs not shared with other runs.",
+)
+@click.option(
+    "--chain-length",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Number of states (BEAST 2) or generations (RevBayes) of every step. "
+    "Defaults to the chain length of the analysis.",
+)
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    required=False,
+    help="Directory for the steps. Defaults to <analysis>_marginal_likelihood.",
+)
+@click.argument(
+    "analysis_file",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+)
+@click.pass_context
+def marginal_likelihood(
+    ctx: click.Context,
+    engine: Optional[str],
+    engine_path: Optional[str],
+    container: bool,
+    steps: int,
+    alpha: float,
+    burnin: float,
+    jobs: Optional[int],
+    cpus_per_step: Optional[int],
+    chain_length: Optional[int],
+    output_dir: Optional[Path],
+    analysis_file: Path,
+) -> None:
+    """Estimate the marginal likelihood using stepping-stone sampling.
+
+    The power posterior steps run as independent jobs in parallel. BEAST 2 analyses
+    require the MODEL_SELECTION package, Rev scripts need a powerPosterior(...) call.
+    """
+    selected_engine = select_engine(engine, analysis_file)
+    additional_args = list(ctx.args)
 
+    def run_step(step_file: Path, step_args: list[str]):
+        if container:
+            exit_code = selected_engine.run_containerized_analysis(
+                step_file, [*step_args, *additional_args]
+            )
+        else:
+            exit_code = selected_engine.run_local_analysis(
+                step_file, engine_path, [*step_args, *additional_args]
+            )
+
+        if exit_code:
+            raise click.ClickException(
+                f"Step '{step_file}' failed with exit code {exit_code}."
+            )
+
+    if jobs is None:
+        jobs = max(1, available_cpus() // (cpus_per_step or 1))
+
+    log_marginal_likelihood, contributions = estimate_marginal_likelihood(
+        selected_engine,
+        analysis_file,
+        output_dir or Path(f"{analysis_file.stem}_marginal_likelihood"),
+        run_step,
+        steps=steps,
+        alpha=alpha,
+        burnin=burnin,
+        max_workers=jobs,
+        cpus_per_step=cpus_per_step,
+        chain_length=chain_length,
+    )
+
+    for k, contribution in enumerate(contributions):
+        click.echo(f"Step {k}: {contribution:.4f}")
+    click.echo(
+        f"Log marginal likelihood (stepping stone): {log_marginal_likelihood:.4f}"
+    )
+
+
+@cli.command(context_settings=CONTEXT_SETTINGS)
+@click.option(
+    "--param",
+    "-p",
+    "parameters",
+    multiple=True,
+    help="Values of a template parameter, e.g. clock=strict,relaxed (can be repeated).",
+)
+@click.option(
+    "--grid",
+    "grid_file",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    required=False,
+    help="JSON file mapping every template parameter to a list of values.",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(ENGINE_NAMES, case_sensitive=False),
+    required=False,
+    help="Select engine explicitly: beastx | beast2 | revbayes | lphy.",
+)
+@click.option(
+    "--bin",
+    "engine_path",
+    type=click.Path(exists=True, dir_okay=False, path_type=str),
+    required=False,
+    help="Path to the engine binary to use for local runs.",
+)
+@click.option(
+    "--container",
+    is_flag=True,
+    help="Run every variant in its own container.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Maximum number of variants run in parallel. Defaults to the number of CPUs.",
+)
+@click.option(
+    "--cpus-per-run",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Pin every variant to this many CPUs not shared with other runs.",
+)
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    required=False,
+    help="Directory for the variants. Defaults to <template>_sweep.",
+)
+@click.argument(
+    "template_file",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+)
+@click.pass_context
+def sweep(
+    ctx: click.Context,
+    parameters: tuple[str, ...],
+    grid_file: Optional[Path],
+    engine: Optional[str],
+    engine_path: Optional[str],
+    container: bool,
+    jobs: Optional[int],
+    cpus_per_run: Optional[int],
+    output_dir: Optional[Path],
+    template_file: Path,
+) -> None:
+    """Run a templated analysis for every combination of parameter values.
+
+    The template contains {{name}} placeholders. Every variant is written into its
+    own directory and runs with its outputs next to it. Running the same command
+    again skips the variants which already completed.
+
+    \b
     Examples:
-      phylorun someModel.xml
-      phylorun --beast2 someModel.xml
-      phylorun --bin /path/to/beast someModel.xml
-      phylorun --container someModel.rev
+      phylorun sweep -p clock=strict,relaxed -p seed=1,2,3 someModel.xml
+      phylorun sweep --grid grid.json --jobs 4 someModel.rev
     """
+    try:
+        grid = read_grid_file(grid_file) if grid_file else {}
+        grid.update(parse_parameter(parameter) for parameter in parameters)
+    except Exception as exception:
+        raise click.BadParameter(str(exception))
 
-    # Choose engine: flag forces selection; otherwise auto-detect
-    selected_engine: Engine | None = None
+    if not grid:
+        raise click.UsageError("Give the parameter values using --param or --grid.")
 
-    if engine:
-        for e in ENGINES:
-            if e.name() != engine:
-                continue
+    additional_args = list(ctx.args)
 
-            if not e.can_run_analysis(analysis_file):
-                raise click.ClickException(
-                    f"Engine '{engine}' cannot run file '{analysis_file}'."
-                )
+    def run_variant(selected_engine: Engine, analysis_file: Path) -> int:
+        args = [*selected_engine.outputs_next_to_analysis_args(), *additional_args]
 
-            selected_engine = e
-            break
+        if container:
+            return selected_engine.run_containerized_analysis(analysis_file, args)
 
-        if selected_engine is None:
-            raise click.ClickException(f"Engine '{engine}' is not available.")
-    else:
-        for potentialEngine in ENGINES:
-            if potentialEngine.can_run_analysis(analysis_file):
-                selected_engine = potentialEngine
-                break
+        return selected_engine.run_local_analysis(analysis_file, engine_path, args)
 
-        if selected_engine is None:
-            raise click.ClickException(
-                f"Could not detect a supported engine for file '{analysis_file}'."
+    if jobs is None:
+        jobs = max(1, available_cpus() // (cpus_per_run or 1))
+
+    statuses = run_sweep(
+        template_file,
+        grid,
+        output_dir or Path(f"{template_file.stem}_sweep"),
+        lambda analysis_file: select_engine(engine, analysis_file),
+        run_variant,
+        max_workers=jobs,
+        cpus_per_variant=cpus_per_run,
+    )
+
+    failed = sorted(name for name, status in statuses.items() if status != "completed")
+    click.echo(
+        f"{len(statuses) - len(failed)} variant(s) completed, {len(failed)} failed"
+        + (f": {', '.join(failed)}" if failed else ".")
+    )
+    if failed:
+        ctx.exit(1)
+
+
+@cli.group()
+def batch() -> None:
+    """Run many analyses as a job array on a cluster.
+
+    \b
+    Examples:
+      phylorun batch submit --job-dir my-batch analyses/*.xml
+      phylorun batch status --wait my-batch
+    """
+
+
+@batch.command("submit")
+@click.option(
+    "--scheduler",
+    type=click.Choice([s.name() for s in SCHEDULERS], case_sensitive=False),
+    default="slurm",
+    help="The batch scheduler the job array is submitted to.",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(ENGINE_NAMES, case_sensitive=False),
+    required=False,
+    help="Select engine explicitly: beastx | beast2 | revbayes | lphy.",
+)
+@click.option(
+    "--bin",
+    "engine_path",
+    type=click.Path(dir_okay=False, path_type=str),
+    required=False,
+    help="Path to the engine binary on the compute nodes.",
+)
+@click.option(
+    "--container",
+    is_flag=True,
+    help="Run every analysis in a container on its compute node.",
+)
+@click.option(
+    "--job-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    required=False,
+    help="Directory for the job script and task outputs. Defaults to "
+    "phylorun_batch_<date>_<time>.",
+)
+@click.option(
+    "--max-parallel",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Maximum number of tasks running at the same time.",
+)
+@click.option(
+    "--scheduler-arg",
+    "scheduler_args",
+    multiple=True,
+    help="Argument passed to the scheduler, e.g. --scheduler-arg=--time=24:00:00 "
+    "(can be repeated).",
+)
+@click.option(
+    "--engine-args",
+    default="",
+    help="Arguments passed to every engine run, e.g. --engine-args='-seed 42'.",
+)
+@click.argument(
+    "analysis_files",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+)
+def submit_batch_command(
+    scheduler: str,
+    engine: Optional[str],
+    engine_path: Optional[str],
+    container: bool,
+    job_dir: Optional[Path],
+    max_parallel: Optional[int],
+    scheduler_args: tuple[str, ...],
+    engine_args: str,
+    analysis_files: tuple[Path, ...],
+) -> None:
+    """Submit one task per analysis file as a job array.
+
+    The engine of every analysis is detected before submitting. Every task runs
+    phylorun on a compute node and writes its outputs next to its analysis file."""
+    analyses = [
+        (select_engine(engine, analysis_file), analysis_file)
+        for analysis_file in analysis_files
+    ]
+
+    job = submit_batch(
+        get_scheduler(scheduler),
+        analyses,
+        job_dir or Path(datetime.now().strftime("phylorun_batch_%Y%m%d_%H%M%S")),
+        engine_path=engine_path,
+        container=container,
+        additional_cli_args=shlex.split(engine_args),
+        max_parallel=max_parallel,
+        scheduler_args=list(scheduler_args),
+    )
+
+    click.echo(
+        f"Submitted job {job.job_id} with {len(analyses)} task(s). "
+        f"Check its state using `phylorun batch status {job.job_dir}`."
+    )
+
+
+@batch.command("status")
+@click.option("--wait", is_flag=True, help="Wait until all tasks finished.")
+@click.option(
+    "--poll-interval",
+    type=click.FloatRange(min=0),
+    default=30,
+    help="Seconds between two state queries when waiting.",
+)
+@click.argument(
+    "job_dir", type=click.Path(exists=True, file_okay=False, path_type=Path)
+)
+@click.pass_context
+def batch_status_command(
+    ctx: click.Context, wait: bool, poll_interval: float, job_dir: Path
+) -> None:
+    """Show the state of every task of a batch and where its output is."""
+    try:
+        job = BatchJob.load(job_dir)
+    except Exception as exception:
+        raise click.ClickException(str(exception))
+
+    states = job.wait(poll_interval) if wait else job.states()
+
+    for index, (state, analysis_file) in enumerate(zip(states, job.analysis_files)):
+        click.echo(f"{index}\t{state}\t{analysis_file}\t{job.task_output(index)}")
+
+    counts = {state: states.count(state) for state in dict.fromkeys(states)}
+    click.echo(", ".join(f"{count} {state}" for state, count in counts.items()))
+
+    if FAILED in states:
+        ctx.exit(1)
+
+
+@cli.command()
+@click.option(
+    "--param",
+    "-p",
+    "parameters",
+    multiple=True,
+    help="Log column to show the ESS and R-hat of (can be repeated). Defaults to "
+    "posterior, likelihood, and prior.",
+)
+@click.option(
+    "--burnin",
+    type=click.FloatRange(min=0, max=1, max_open=True),
+    default=0.1,
+    help="Fraction of the samples discarded as burn-in.",
+)
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=0.1),
+    default=5,
+    help="Seconds between two refreshes.",
+)
+@click.option("--once", is_flag=True, help="Print the dashboard once and exit.")
+@click.argument(
+    "log_files",
+    nargs=-1,
+    required=True,
+    type=click.Path(dir_okay=False, path_type=Path),
+)
+def dashboard(
+    parameters: tuple[str, ...],
+    burnin: float,
+    interval: float,
+    once: bool,
+    log_files: tuple[Path, ...],
+) -> None:
+    """Follow the trace logs of running analyses.
+
+    Shows the state and sampling speed of every run, the effective sample size of
+    key parameters, and their R-hat across all runs. Logs which do not exist yet are
+    picked up once the engine creates them, and compressed logs are followed too.
+    Only newly written lines are read on every refresh. Stop with Ctrl+C."""
+    monitors = [RunMonitor(log_file) for log_file in log_files]
+
+    try:
+        while True:
+            for monitor in monitors:
+                monitor.refresh()
+
+            table = render_dashboard(
+                monitors, list(parameters or DEFAULT_PARAMETERS), burnin
             )
 
-    additional_args = list(ctx.args) if ctx.args else None
+            if once:
+                click.echo(table)
+                return
+
+            # moves the cursor home and clears the screen
+            click.echo("\x1b[H\x1b[2J" + table)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+@cli.group()
+def images() -> None:
+    """Set up the container images ahead of time.
+
+    \b
+    Examples:
+      phylorun images build
+      phylorun images export phylorun-images.tar
+      phylorun images load phylorun-images.tar
+    """
+
+
+def engine_images() -> list[tuple[str, str]]:
+    """Returns the names and Dockerfiles of the images of all engines, without
+    duplicates."""
+    return list(dict(image for e in ENGINES for image in e.container_images()).items())
+
+
+@images.command("build")
+@click.option("--force", is_flag=True, help="Rebuild images which already exist.")
+@click.option(
+    "--jobs",
+    "-j",
+    type=int,
+    required=False,
+    help="Maximum number of images built in parallel.",
+)
+def build_images_command(force: bool, jobs: Optional[int]) -> None:
+    """Build the images of all engines in parallel."""
+    built = build_images(engine_images(), force=force, max_workers=jobs)
+    click.echo(f"Built {len(built)} image(s): {', '.join(built) or '-'}")
+
+
+@images.command("pull")
+@click.option(
+    "--registry",
+    required=True,
+    help="Registry prefix the images are pulled from, e.g. ghcr.io/my-lab.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=int,
+    required=False,
+    help="Maximum number of images pulled in parallel.",
+)
+def pull_images_command(registry: str, jobs: Optional[int]) -> None:
+    """Pull prebuilt images of all engines from a registry."""
+    pull_images(
+        [name for name, _ in engine_images()],
+        registry.rstrip("/"),
+        max_workers=jobs,
+    )
+
+
+@images.command("export")
+@click.argument("tarball", type=click.Path(dir_okay=False, path_type=Path))
+def export_images_command(tarball: Path) -> None:
+    """Export the images of all engines which exist locally into a single tarball."""
+    client = get_docker_client()
+
+    # pulled images come without the base image, which is only needed for building
+    image_names = [
+        name
+        for name in [BASE_IMAGE_NAME, *(name for name, _ in engine_images())]
+        if image_exists(client, name)
+    ]
+    if not image_names:
+        raise click.ClickException(
+            "No images found. Use `phylorun images build` or `phylorun images pull` "
+            "first."
+        )
+
+    export_images(client, image_names, tarball)
+    click.echo(f"Exported {len(image_names)} image(s) to {tarball}.")
+
 
-    if container:
-        selected_engine.run_containerized_analysis(analysis_file, additional_args)
-    else:
-        selected_engine.run_local_analysis(analysis_file, engine_path, additional_args)
+@images.command("load")
+@click.argument("tarball", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+def load_images_command(tarball: Path) -> None:
+    """Load images from a tarball created by `phylorun images export`."""
+    loaded = load_images(get_docker_client(), tarball)
+    click.echo(f"Loaded {len(loaded)} image(s): {', '.join(loaded) or '-'}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,4 @@
+from phylorun.schedulers.scheduler import Scheduler
+from phylorun.schedulers.slurm import Slurm
+
+SCHEDULERS: list[Scheduler] = [Slurm()]
@@ -0,0 +1,48 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+
+# the states of a task, independent of the scheduler
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+FINISHED_STATES = (COMPLETED, FAILED)
+
+
+class Scheduler(ABC):
+    """This is an abstract class which is inherited for every batch scheduler. It
+    submits shell commands as a job array and reports the state of the tasks."""
+
+    @abstractmethod
+    def name(self) -> str:
+        """Returns the name of the scheduler as used in the CLI."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def submit_array(
+        self,
+        commands: list[str],
+        job_dir: Path,
+        job_name: str = "phylorun",
+        max_parallel: Optional[int] = None,
+        scheduler_args: Optional[list[str]] = None,
+    ) -> str:
+        """Submits a job array in which task `i` runs `commands[i]` in the current
+        working directory. The output of task `i` is written to `task_output(job_dir,
+        i)`. At most `max_parallel` tasks run at the same time, and `scheduler_args`
+        are passed on to the scheduler. Returns the id of the job."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def task_states(self, job_id: str, task_count: int) -> list[str]:
+        """Returns the state of every task of a job array: pending, running,
+        completed or failed."""
+        raise NotImplementedError
+
+
+def task_output(job_dir: Path, index: int) -> Path:
+    """Returns the file the output of a task is written to."""
+    return job_dir / f"task_{index}.out"
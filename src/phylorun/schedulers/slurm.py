@@ -0,0 +1,151 @@
+import os
+import shlex
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+from phylorun.schedulers.scheduler import (
+    COMPLETED,
+    FAILED,
+    PENDING,
+    RUNNING,
+    Scheduler,
+)
+from phylorun.utils.placement_utils import parse_cpu_list
+
+
+SLURM_STATES = {
+    "PENDING": PENDING,
+    "REQUEUED": PENDING,
+    "RESIZING": PENDING,
+    "SUSPENDED": PENDING,
+    "CONFIGURING": RUNNING,
+    "RUNNING": RUNNING,
+    "COMPLETING": RUNNING,
+    "COMPLETED": COMPLETED,
+}
+
+
+class Slurm(Scheduler):
+    def __init__(self, sbatch: Optional[str] = None, sacct: Optional[str] = None):
+        self._sbatch = sbatch
+        self._sacct = sacct
+
+    @property
+    def sbatch(self) -> str:
+        """The sbatch binary, which can be set using the SBATCH environment variable."""
+        return self._sbatch or os.environ.get("SBATCH", "sbatch")
+
+    @property
+    def sacct(self) -> str:
+        """The sacct binary, which can be set using the SACCT environment variable."""
+        return self._sacct or os.environ.get("SACCT", "sacct")
+
+    def name(self) -> str:
+        """Returns the name of the scheduler as used in the CLI."""
+        return "slurm"
+
+    def submit_array(
+        self,
+        commands: list[str],
+        job_dir: Path,
+        job_name: str = "phylorun",
+        max_parallel: Optional[int] = None,
+        scheduler_args: Optional[list[str]] = None,
+    ) -> str:
+        """Writes an sbatch script which selects the command of a task using
+        SLURM_ARRAY_TASK_ID and submits it."""
+        job_script = job_dir / "job.sh"
+        job_script.write_text(
+            self._job_script(commands, job_dir, job_name, max_parallel)
+        )
+
+        result = subprocess.run(
+            [self.sbatch, "--parsable", *(scheduler_args or []), str(job_script)],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise Exception(f"sbatch failed: {result.stderr.strip()}")
+
+        # --parsable prints "<job id>" or "<job id>;<cluster>"
+        job_id = result.stdout.strip().split(";")[0]
+        logger.info(f"Submitted job array {job_id} with {len(commands)} task(s).")
+
+        return job_id
+
+    def _job_script(
+        self,
+        commands: list[str],
+        job_dir: Path,
+        job_name: str,
+        max_parallel: Optional[int],
+    ) -> str:
+        array = f"0-{len(commands) - 1}"
+        if max_parallel:
+            array += f"%{max_parallel}"
+
+        lines = [
+            "#!/bin/bash",
+            f"#SBATCH --job-name={job_name}",
+            f"#SBATCH --array={array}",
+            f"#SBATCH --output={job_dir.resolve()}/task_%a.out",
+            f"#SBATCH --chdir={Path().resolve()}",
+            "",
+            "COMMANDS=(",
+            *(f"  {shlex.quote(command)}" for command in commands),
+            ")",
+            "",
+            'eval "${COMMANDS[$SLURM_ARRAY_TASK_ID]}"',
+        ]
+        return "\n".join(lines) + "\n"
+
+    def task_states(self, job_id: str, task_count: int) -> list[str]:
+        """Returns the state of every task as reported by sacct. Tasks sacct does not
+        know about yet are pending."""
+        result = subprocess.run(
+            [
+                self.sacct,
+                "--jobs",
+                job_id,
+                "--array",
+                "--allocations",
+                "--noheader",
+                "--parsable2",
+                "--format=JobID,State",
+            ],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise Exception(f"sacct failed: {result.stderr.strip()}")
+
+        states = [PENDING] * task_count
+
+        for line in result.stdout.splitlines():
+            if not line.strip():
+                continue
+
+            task_id, state = line.strip().split("|")[:2]
+            _, _, tasks = task_id.partition("_")
+            # e.g. 'CANCELLED by 1000'
+            state = SLURM_STATES.get(state.split()[0] if state else "", FAILED)
+
+            for index in _parse_task_ids(tasks):
+                if 0 <= index < task_count:
+                    states[index] = state
+
+        return states
+
+
+def _parse_task_ids(tasks: str) -> list[int]:
+    """Parses the task part of an array job id, like `3` or `[4-7,9%2]` for tasks
+    which are still pending."""
+    tasks = tasks.strip("[]").split("%")[0]
+    if not tasks:
+        return []
+
+    # task ranges use the same syntax as CPU lists
+    return parse_cpu_list(tasks)
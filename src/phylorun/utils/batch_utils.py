@@ -0,0 +1,204 @@
+import json
+import shlex
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+from phylorun.engines.engine import Engine
+from phylorun.schedulers import SCHEDULERS
+from phylorun.schedulers.scheduler import FINISHED_STATES, Scheduler, task_output
+
+
+BATCH_FILE = "batch.json"
+
+# the tasks run phylorun from the same Python environment, which is expected to be
+# available on the compute nodes through a shared file system
+PHYLORUN_COMMAND = [sys.executable, "-m", "phylorun.main"]
+
+
+def get_scheduler(name: str) -> Scheduler:
+    """Returns the scheduler with the given name."""
+    for scheduler in SCHEDULERS:
+        if scheduler.name() == name:
+            return scheduler
+
+    raise Exception(f"Scheduler '{name}' is not available.")
+
+
+def phylorun_command(
+    engine: Engine,
+    analysis_file: Path,
+    engine_path: Optional[str] = None,
+    container: bool = False,
+    additional_cli_args: Optional[list[str]] = None,
+) -> str:
+    """Returns the shell command running an analysis with phylorun. The engine is
+    given explicitly, such that it is detected only once, when submitting."""
+    command = [*PHYLORUN_COMMAND, "--engine", engine.name()]
+
+    if engine_path:
+        command += ["--bin", str(Path(engine_path).resolve())]
+    if container:
+        command.append("--container")
+
+    command += [
+        str(analysis_file.resolve()),
+        *engine.outputs_next_to_analysis_args(),
+        *(additional_cli_args or []),
+    ]
+
+    return shlex.join(command)
+
+
+def shared_outputs(analyses: list[tuple[Engine, Path]]) -> list[Path]:
+    """Returns the outputs written by several analyses. Only engines which cannot
+    write next to the analysis file are checked, as all tasks run in the same
+    directory."""
+    writers: dict[Path, int] = {}
+    for engine, analysis_file in analyses:
+        if engine.outputs_next_to_analysis_args():
+            continue
+
+        for output in set(engine.output_files(analysis_file)):
+            writers[output.resolve()] = writers.get(output.resolve(), 0) + 1
+
+    return sorted(output for output, count in writers.items() if count > 1)
+
+
+class BatchJob:
+    """A job array running one analysis per task. The job is recorded in `batch.json`
+    in the job directory, such that its state can be queried by later invocations."""
+
+    def __init__(
+        self,
+        job_dir: Path,
+        scheduler: Scheduler,
+        job_id: str,
+        analysis_files: list[str],
+        commands: list[str],
+    ):
+        self.job_dir = job_dir
+        self.scheduler = scheduler
+        self.job_id = job_id
+        self.analysis_files = analysis_files
+        self.commands = commands
+
+    def save(self):
+        """Writes the job into the job directory."""
+        (self.job_dir / BATCH_FILE).write_text(
+            json.dumps(
+                {
+                    "scheduler": self.scheduler.name(),
+                    "job_id": self.job_id,
+                    "analysis_files": self.analysis_files,
+                    "commands": self.commands,
+                },
+                indent=2,
+            )
+        )
+
+    @staticmethod
+    def load(job_dir: Path) -> "BatchJob":
+        """Reads a job from its job directory."""
+        try:
+            batch = json.loads((job_dir / BATCH_FILE).read_text())
+        except FileNotFoundError:
+            raise Exception(f"'{job_dir}' is not a phylorun batch directory.")
+
+        return BatchJob(
+            job_dir,
+            get_scheduler(batch["scheduler"]),
+            batch["job_id"],
+            batch["analysis_files"],
+            batch["commands"],
+        )
+
+    def states(self) -> list[str]:
+        """Returns the state of every task."""
+        return self.scheduler.task_states(self.job_id, len(self.commands))
+
+    def wait(self, poll_interval: float = 30) -> list[str]:
+        """Waits until all tasks finished and returns their states."""
+        while True:
+            states = self.states()
+            if all(state in FINISHED_STATES for state in states):
+                return states
+
+            logger.debug(
+                f"{sum(s in FINISHED_STATES for s in states)}/{len(states)} task(s) "
+                "finished."
+            )
+            time.sleep(poll_interval)
+
+    def task_output(self, index: int) -> Path:
+        """Returns the file containing the output of a task."""
+        return task_output(self.job_dir, index)
+
+
+def submit_batch(
+    scheduler: Scheduler,
+    analyses: list[tuple[Engine, Path]],
+    job_dir: Path,
+    engine_path: Optional[str] = None,
+    container: bool = False,
+    additional_cli_args: Optional[list[str]] = None,
+    max_parallel: Optional[int] = None,
+    scheduler_args: Optional[list[str]] = None,
+) -> BatchJob:
+    """Submits a job array with one task per analysis. Every task runs phylorun on
+    a compute node. BEAST and LPhy analyses write their outputs next to their analysis
+    file, while Rev scripts write relative to the directory the job runs in, which is
+    the same for all tasks. Submitting fails if several analyses write the same file.
+
+    Args:
+        scheduler (Scheduler): The scheduler the job array is submitted to.
+        analyses (list[tuple[Engine, Path]]): The analysis files and their engines.
+        job_dir (Path): The directory for the job script and the task outputs.
+        engine_path (Optional[str]): Path to the engine binary on the compute nodes.
+        container (bool): Run every analysis in a container.
+        additional_cli_args (Optional[list[str]]): Arguments passed to every engine.
+        max_parallel (Optional[int]): Maximum number of tasks running at once.
+        scheduler_args (Optional[list[str]]): Arguments passed to the scheduler.
+
+    Returns:
+        BatchJob: The submitted job.
+    """
+    if not analyses:
+        raise Exception("No analyses to submit.")
+
+    if shared := shared_outputs(analyses):
+        raise Exception(
+            f"Several analyses write to {', '.join(map(str, shared))}. Rev scripts "
+            "write relative to the directory the job runs in, so give their monitors "
+            "distinct file names."
+        )
+
+    commands = [
+        phylorun_command(
+            engine, analysis_file, engine_path, container, additional_cli_args
+        )
+        for engine, analysis_file in analyses
+    ]
+
+    job_dir.mkdir(parents=True, exist_ok=True)
+    job_id = scheduler.submit_array(
+        commands,
+        job_dir,
+        job_name=job_dir.name,
+        max_parallel=max_parallel,
+        scheduler_args=scheduler_args,
+    )
+
+    job = BatchJob(
+        job_dir,
+        scheduler,
+        job_id,
+        [str(analysis_file.resolve()) for _, analysis_file in analyses],
+        commands,
+    )
+    job.save()
+
+    return job
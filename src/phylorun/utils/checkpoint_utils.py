@@ -0,0 +1,47 @@
+import os
+from pathlib import Path
+from typing import Callable, Optional
+
+from loguru import logger
+
+from phylorun.utils.pipeline_utils import FINGERPRINT_DIR
+
+
+def checkpointed_copy_path(analysis_file: Path) -> Path:
+    """Returns the path of the copy of an analysis which is modified to write or read
+    checkpoints. The copy has the same name as the analysis, such that the engine
+    names its outputs in the same way."""
+    return analysis_file.parent / FINGERPRINT_DIR / analysis_file.name
+
+
+def relative_path(path: Path) -> str:
+    """Returns the path relative to the working directory, such that it is valid both
+    for local and containerized runs."""
+    return Path(os.path.relpath(path)).as_posix()
+
+
+def latest_checkpoint(
+    candidates: list[Path], progress: Callable[[Path], Optional[int]]
+) -> Optional[Path]:
+    """Returns the checkpoint with the most progress among the existing candidates.
+    `progress` returns the iteration a checkpoint was written at, or None if the
+    checkpoint is incomplete (e.g. because the run was killed while writing it)."""
+    latest = None
+    latest_progress = -1
+
+    for checkpoint in dict.fromkeys(path.resolve() for path in candidates):
+        if not checkpoint.exists():
+            continue
+
+        checkpoint_progress = progress(checkpoint)
+        if checkpoint_progress is None:
+            logger.warning(f"Ignoring incomplete checkpoint '{checkpoint}'.")
+            continue
+
+        if checkpoint_progress > latest_progress:
+            latest, latest_progress = checkpoint, checkpoint_progress
+
+    if latest:
+        logger.info(f"Resuming from '{latest}' (iteration {latest_progress}).")
+
+    return latest
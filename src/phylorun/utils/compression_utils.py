@@ -0,0 +1,227 @@
+import gzip
+import io
+import os
+import select
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator
+
+from loguru import logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+COMPRESSION_METHODS = list(COMPRESSION_SUFFIXES)
+CHUNK_SIZE = 2**20
+
+# seconds after which written data is flushed into the compressed file, such that
+# running outputs can be followed (e.g. by `phylorun dashboard`)
+FLUSH_INTERVAL = 1.0
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise Exception(
+            "zstd compression requires the zstandard package "
+            "(`pip install phylorun[zstd]`)."
+        )
+    return zstandard
+
+
+def open_compressed(path: Path, method: str) -> IO[bytes]:
+    """Opens a file for writing binary data which is compressed using gzip or zstd."""
+    if method == "gzip":
+        # a low level keeps up with engines writing large tree files
+        return gzip.open(path, "wb", compresslevel=3)  # type: ignore
+
+    if method == "zstd":
+        return _require_zstandard().ZstdCompressor().stream_writer(open(path, "wb"))
+
+    raise Exception(f"Unknown compression method '{method}'.")
+
+
+def open_output(output_file: Path) -> IO[str]:
+    """Opens an engine output (like a trace log or a tree file) for reading as text.
+    Outputs compressed by `compressed_outputs` are decompressed transparently, and if
+    `output_file` does not exist, its compressed version is used."""
+    if not output_file.exists():
+        for suffix in COMPRESSION_SUFFIXES.values():
+            if (compressed := Path(str(output_file) + suffix)).exists():
+                output_file = compressed
+                break
+
+    if output_file.suffix == ".gz":
+        return gzip.open(output_file, "rt")
+
+    if output_file.suffix == ".zst":
+        reader = (
+            _require_zstandard()
+            .ZstdDecompressor()
+            .stream_reader(open(output_file, "rb"), read_across_frames=True)
+        )
+        return io.TextIOWrapper(io.BufferedReader(reader))
+
+    return open(output_file)
+
+
+class IncrementalDecompressor:
+    """Decompresses an output chunk by chunk while it is still being written. Outputs
+    consist of several compressed members (or frames) if the engine reopened them."""
+
+    def __init__(self, output_file: Path):
+        self.method = next(
+            (
+                method
+                for method, suffix in COMPRESSION_SUFFIXES.items()
+                if output_file.suffix == suffix
+            ),
+            None,
+        )
+        self._decompressor = None
+
+    def decompress(self, data: bytes) -> bytes:
+        """Returns the decompressed content of the next chunk of the file. Data which
+        cannot be decompressed yet is kept until the next chunk arrives."""
+        if self.method is None:
+            return data
+
+        decompressed = b""
+        while data:
+            if self._decompressor is None:
+                self._decompressor = (
+                    # the gzip header is parsed by zlib with this window size
+                    zlib.decompressobj(wbits=31)
+                    if self.method == "gzip"
+                    else _require_zstandard().ZstdDecompressor().decompressobj()
+                )
+
+            decompressed += self._decompressor.decompress(data)
+
+            if self._decompressor.eof:
+                data = self._decompressor.unused_data
+                self._decompressor = None
+            else:
+                data = b""
+
+        return decompressed
+
+
+@contextmanager
+def compressed_outputs(
+    output_files: list[Path], method: str = "gzip"
+) -> Iterator[list[Path]]:
+    """Replaces the given output files by named pipes while the context is active.
+    Everything the engine writes into them is compressed on the fly into
+    `<output file>.gz` (or `.zst`), such that the uncompressed outputs never reach
+    the disk. The engine can open and close an output several times.
+
+    Args:
+        output_files (list[Path]): The files the engine writes to.
+        method (str): The compression method, 'gzip' or 'zstd'.
+
+    Yields:
+        list[Path]: The compressed files.
+    """
+    if method == "zstd":
+        _require_zstandard()
+
+    for output_file in output_files:
+        if output_file.exists():
+            raise Exception(
+                f"The output '{output_file}' already exists, remove it to compress it."
+            )
+
+    stop = threading.Event()
+    pipes: list[tuple[Path, threading.Thread]] = []
+    errors: list[Exception] = []
+    written: dict[Path, int] = {}
+
+    def compress(pipe: Path, target: Path):
+        try:
+            with open_compressed(target, method) as compressed:
+                written[target] = 0
+                while not stop.is_set():
+                    # blocks until the engine (or `stop_compression`) opens the pipe.
+                    # Unbuffered reads return whatever the engine wrote so far.
+                    with open(pipe, "rb", buffering=0) as uncompressed:
+                        compress_stream(uncompressed, compressed, target)
+        except Exception as exception:
+            errors.append(exception)
+
+    def compress_stream(uncompressed: IO[bytes], compressed: IO[bytes], target: Path):
+        flushed = time.monotonic()
+        pending = False
+
+        while True:
+            if not select.select([uncompressed], [], [], FLUSH_INTERVAL)[0]:
+                # the engine is idle, so the lines written last are made readable
+                if pending:
+                    compressed.flush()
+                    flushed, pending = time.monotonic(), False
+                continue
+
+            if not (chunk := uncompressed.read(CHUNK_SIZE)):
+                return
+
+            compressed.write(chunk)
+            written[target] += len(chunk)
+            pending = True
+
+            # a sync flush ends the current block, such that everything written so
+            # far can be decompressed
+            if time.monotonic() - flushed > FLUSH_INTERVAL:
+                compressed.flush()
+                flushed, pending = time.monotonic(), False
+
+    def stop_compression(pipe: Path, thread: threading.Thread):
+        while thread.is_alive():
+            try:
+                # lets a thread waiting for a writer see the end of the stream
+                os.close(os.open(pipe, os.O_WRONLY | os.O_NONBLOCK))
+            except OSError:
+                # the thread is not waiting for a writer at the moment
+                pass
+            thread.join(0.05)
+
+        pipe.unlink()
+
+    targets = []
+    try:
+        for output_file in output_files:
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            os.mkfifo(output_file)
+
+            target = Path(str(output_file) + COMPRESSION_SUFFIXES[method])
+            thread = threading.Thread(
+                target=compress, args=(output_file, target), daemon=True
+            )
+            thread.start()
+
+            pipes.append((output_file, thread))
+            targets.append(target)
+
+        yield targets
+    finally:
+        stop.set()
+        for pipe, thread in pipes:
+            stop_compression(pipe, thread)
+
+    if errors:
+        raise errors[0]
+
+    for target in targets:
+        if not written.get(target):
+            logger.warning(f"Nothing was written to '{target}'.")
+            target.unlink(missing_ok=True)
+        else:
+            logger.info(
+                f"Compressed {written[target] / 2**20:.1f} MB into '{target}' "
+                f"({target.stat().st_size / 2**20:.1f} MB)."
+            )
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+def autocorrelation(samples: np.ndarray) -> np.ndarray:
+    """Returns the autocorrelation of a chain at all lags, computed with an FFT."""
+    n = len(samples)
+    centered = samples - samples.mean()
+
+    # zero padding to a power of two avoids the circular wrap-around of the FFT
+    size = 1 << (2 * n - 1).bit_length()
+    spectrum = np.fft.rfft(centered, size)
+    autocovariance = np.fft.irfft(spectrum * np.conjugate(spectrum), size)[:n]
+
+    return autocovariance / autocovariance[0]
+
+
+def effective_sample_size(samples: np.ndarray) -> float:
+    """Returns the effective sample size of a chain. The integrated autocorrelation
+    time is summed up using Geyer's initial positive sequence, i.e. until the sum of
+    two consecutive autocorrelations becomes negative. Returns NaN for chains which
+    are too short or constant."""
+    samples = np.asarray(samples, dtype=float)
+    n = len(samples)
+    if n < 4 or np.ptp(samples) == 0:
+        return float("nan")
+
+    rho = autocorrelation(samples)
+
+    pairs = rho[: n - n % 2].reshape(-1, 2).sum(axis=1)
+    negative = np.flatnonzero(pairs <= 0)
+    positive_pairs = pairs[: negative[0] if len(negative) else len(pairs)]
+
+    # anti-correlated chains are capped at an ESS of n * log10(n), as done by ArviZ
+    autocorrelation_time = max(-1 + 2 * positive_pairs.sum(), 1 / np.log10(n))
+    return float(n / autocorrelation_time)
+
+
+def split_r_hat(chains: list[np.ndarray]) -> float:
+    """Returns the potential scale reduction factor of several chains. Every chain is
+    split in half, such that trends within a chain are detected as well, and all
+    chains are truncated to the length of the shortest one. Returns NaN if there are
+    too few samples."""
+    length = min((len(chain) for chain in chains), default=0) // 2
+    if length < 2:
+        return float("nan")
+
+    halves = np.array(
+        [
+            half
+            for chain in chains
+            for half in (chain[:length], chain[len(chain) - length :])
+        ],
+        dtype=float,
+    )
+
+    within = halves.var(axis=1, ddof=1).mean()
+    if within == 0:
+        return float("nan")
+
+    between = length * halves.mean(axis=1).var(ddof=1)
+    pooled = (length - 1) / length * within + between / length
+
+    return float(np.sqrt(pooled / within))
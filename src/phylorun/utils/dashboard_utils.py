@@ -0,0 +1,195 @@
+import math
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+import click
+import numpy as np
+
+from phylorun.utils.convergence_utils import effective_sample_size, split_r_hat
+from phylorun.utils.log_utils import LogTail
+
+
+DEFAULT_PARAMETERS = ("posterior", "likelihood", "prior")
+
+# thresholds below (or above) which a value is highlighted
+MIN_ESS = 200
+MAX_R_HAT = 1.01
+
+# number of refreshes the sampling speed is averaged over
+SPEED_WINDOW = 10
+
+
+class RunMonitor:
+    """Follows the trace log of a single run. The samples are kept in a growing
+    array, such that every refresh only parses the newly written lines."""
+
+    def __init__(self, log_file: Path):
+        self.log_file = log_file
+        self._tail = LogTail(log_file)
+        self._samples = np.empty((0, 0))
+        self._count = 0
+        self._observations: deque[tuple[float, float]] = deque(maxlen=SPEED_WINDOW)
+        self._ess_cache: dict[tuple[str, float], tuple[int, float]] = {}
+
+    def refresh(self):
+        """Reads the samples appended to the log since the last refresh."""
+        restarts = self._tail.restarts
+        rows = self._tail.read()
+
+        if self._tail.restarts != restarts:
+            # the log was replaced by a new run
+            self._count = 0
+            self._observations.clear()
+            self._ess_cache.clear()
+
+        if rows:
+            if len(rows[0]) != self._samples.shape[1]:
+                # the first samples of a (new) log
+                self._samples = np.empty((len(rows), len(rows[0])))
+            elif self._count + len(rows) > len(self._samples):
+                # doubling keeps the amortized cost of appending constant
+                grown = np.empty(
+                    (max(2 * len(self._samples), self._count + len(rows)), len(rows[0]))
+                )
+                grown[: self._count] = self._samples[: self._count]
+                self._samples = grown
+
+            self._samples[self._count : self._count + len(rows)] = rows
+            self._count += len(rows)
+
+        if self._count:
+            self._observations.append((time.monotonic(), self.state))
+
+    @property
+    def header(self) -> list[str]:
+        return self._tail.header
+
+    @property
+    def state(self) -> float:
+        """The state (or generation) of the last logged sample."""
+        return float(self._samples[self._count - 1, 0]) if self._count else 0.0
+
+    def states_per_second(self) -> Optional[float]:
+        """Returns the sampling speed over the last refreshes, or None if it is not
+        known yet."""
+        if len(self._observations) < 2:
+            return None
+
+        (first_time, first_state), (last_time, last_state) = (
+            self._observations[0],
+            self._observations[-1],
+        )
+        if last_time <= first_time:
+            return None
+
+        return (last_state - first_state) / (last_time - first_time)
+
+    def column_index(self, parameter: str) -> Optional[int]:
+        """Returns the index of a column, ignoring case, or None if the log does not
+        contain it."""
+        columns = [column.lower() for column in self.header]
+        return (
+            columns.index(parameter.lower()) if parameter.lower() in columns else None
+        )
+
+    def samples(self, parameter: str, burnin: float = 0.0) -> Optional[np.ndarray]:
+        """Returns the samples of a parameter after discarding the first `burnin`
+        fraction, or None if the log does not contain it."""
+        if (index := self.column_index(parameter)) is None:
+            return None
+
+        return self._samples[int(self._count * burnin) : self._count, index]
+
+    def ess(self, parameter: str, burnin: float = 0.0) -> Optional[float]:
+        """Returns the effective sample size of a parameter. It is only computed again
+        once new samples arrived."""
+        if (samples := self.samples(parameter, burnin)) is None:
+            return None
+
+        key = (parameter.lower(), burnin)
+        if key not in self._ess_cache or self._ess_cache[key][0] != self._count:
+            self._ess_cache[key] = (self._count, effective_sample_size(samples))
+
+        return self._ess_cache[key][1]
+
+
+def _format_number(value: Optional[float], digits: int = 0) -> str:
+    if value is None or math.isnan(value):
+        return "-"
+    return f"{value:,.{digits}f}"
+
+
+def _cell(text: str, width: int, highlight: bool = False) -> str:
+    """Pads a cell before styling it, as the escape codes would break the alignment."""
+    text = text.rjust(width)
+    return click.style(text, fg="red") if highlight else text
+
+
+def render_dashboard(
+    monitors: list[RunMonitor], parameters: list[str], burnin: float = 0.0
+) -> str:
+    """Returns a table with the progress of every run and the ESS of the given
+    parameters, followed by the R-hat of every parameter across all runs logging it.
+
+    Args:
+        monitors (list[RunMonitor]): The refreshed monitors of all runs.
+        parameters (list[str]): The log columns to show, matched ignoring case.
+        burnin (float): The fraction of samples discarded as burn-in.
+
+    Returns:
+        str: The rendered table.
+    """
+    name_width = max([len("run"), *(len(str(m.log_file)) for m in monitors)])
+    widths = [max(12, len(parameter) + 4) for parameter in parameters]
+
+    lines = [
+        "run".ljust(name_width)
+        + _cell("state", 14)
+        + _cell("states/s", 12)
+        + "".join(
+            _cell(f"ESS {parameter}", width)
+            for parameter, width in zip(parameters, widths)
+        )
+    ]
+
+    for monitor in monitors:
+        cells = []
+        for parameter, width in zip(parameters, widths):
+            ess = monitor.ess(parameter, burnin)
+            cells.append(
+                _cell(
+                    _format_number(ess),
+                    width,
+                    highlight=ess is not None and not ess >= MIN_ESS,
+                )
+            )
+
+        lines.append(
+            str(monitor.log_file).ljust(name_width)
+            + _cell(_format_number(monitor.state) if monitor.header else "waiting", 14)
+            + _cell(_format_number(monitor.states_per_second(), 1), 12)
+            + "".join(cells)
+        )
+
+    if len(monitors) > 1:
+        cells = []
+        for parameter, width in zip(parameters, widths):
+            chains = [
+                samples
+                for monitor in monitors
+                if (samples := monitor.samples(parameter, burnin)) is not None
+            ]
+            r_hat = split_r_hat(chains) if len(chains) > 1 else float("nan")
+            cells.append(
+                _cell(
+                    _format_number(r_hat, 3),
+                    width,
+                    highlight=not math.isnan(r_hat) and r_hat > MAX_R_HAT,
+                )
+            )
+
+        lines.append("R-hat".ljust(name_width) + " " * 26 + "".join(cells))
+
+    return "\n".join(lines)
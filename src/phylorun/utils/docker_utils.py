@@ -1,11 +1,39 @@
 import io
+import os
+import shlex
 import sys
-from typing import Optional
+import tarfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from typing import Iterator, Optional
 import docker
 from docker.models.containers import Container
 from docker.errors import DockerException, ImageNotFound
 from loguru import logger
 
+from phylorun.utils.placement_utils import (
+    format_cpu_list,
+    nodes_of,
+    reserved_cpu_set,
+)
+
+
+BASE_IMAGE_NAME = "phylorun-base:24.04"
+BASE_DOCKER_FILE = """FROM ubuntu:24.04
+RUN apt-get update \\
+    && apt-get install -y wget tar ca-certificates \\
+    && rm -rf /var/lib/apt/lists/*
+"""
+PLATFORM = "linux/x86_64"
+
+SCRATCH_DIR = "/scratch"
+SCRATCH_MODES = ["tmpfs", "disk"]
+
+_SYNC_MARKER = "/tmp/.phylorun_synced"
+_NEXT_SYNC_MARKER = "/tmp/.phylorun_sync_next"
+
 
 def get_docker_client() -> docker.DockerClient:
     """Instantiate and return a Docker client."""
@@ -21,34 +49,171 @@ def get_docker_client() -> docker.DockerClient:
 def create_image_if_needed(
     client: docker.DockerClient, image_name: str, docker_file: str
 ):
-    """Ensure a Docker image exists, building it from a Dockerfile string if necessary."""
-    try:
-        client.images.get(image_name)
-        # image already created
+    """Ensure a Docker image exists, building it from a Dockerfile string if necessary.
+    The phylorun base image is built first if the Dockerfile is based on it."""
+    if image_exists(client, image_name):
         return
-    except ImageNotFound:
-        # we still need to create the image
-        ...
+
+    if image_name != BASE_IMAGE_NAME and _parent_image(docker_file) == BASE_IMAGE_NAME:
+        create_image_if_needed(client, BASE_IMAGE_NAME, BASE_DOCKER_FILE)
 
     logger.info(
         "Setting up docker container. This might take a while, but only has to be done once."
     )
+    logger.info("Run `phylorun images build` to set up all containers ahead of time.")
+
+    build_image(client, image_name, docker_file)
+
+
+def create_images_if_needed(client: docker.DockerClient, images: list[tuple[str, str]]):
+    """Ensure the given images exist, building them in the given order if necessary."""
+    for image_name, docker_file in images:
+        create_image_if_needed(client, image_name, docker_file)
+
+
+def image_exists(client: docker.DockerClient, image_name: str) -> bool:
+    """Checks if an image with the given name exists locally."""
+    try:
+        client.images.get(image_name)
+        return True
+    except ImageNotFound:
+        return False
 
+
+def build_image(client: docker.DockerClient, image_name: str, docker_file: str):
+    """Build a Docker image from a Dockerfile string."""
     docker_file_bytes = io.BytesIO(docker_file.encode("utf-8"))
 
     client.images.build(
         fileobj=docker_file_bytes,
         tag=image_name,
         rm=True,
-        platform="linux/x86_64",
+        platform=PLATFORM,
     )
 
 
+def build_images(
+    images: list[tuple[str, str]],
+    force: bool = False,
+    max_workers: Optional[int] = None,
+) -> list[str]:
+    """Build the given images and the phylorun base image concurrently. An image is
+    built as soon as the image it is based on is available. Existing images are only
+    rebuilt if `force` is set. Returns the names of the built images.
+
+    Args:
+        images (list[tuple[str, str]]): The names and Dockerfiles of the images.
+        force (bool): Rebuild images which already exist.
+        max_workers (Optional[int]): Maximum number of images built concurrently.
+    """
+    pending = {BASE_IMAGE_NAME: BASE_DOCKER_FILE}
+    pending.update(images)
+
+    client = get_docker_client()
+    if not force:
+        pending = {
+            name: file
+            for name, file in pending.items()
+            if not image_exists(client, name)
+        }
+
+    built = []
+
+    def build(image_name: str):
+        logger.info(f"Building image {image_name}.")
+        build_image(get_docker_client(), image_name, pending[image_name])
+        return image_name
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running: dict[Future, str] = {}
+
+        while pending.keys() - set(built):
+            waiting = pending.keys() - set(built) - set(running.values())
+            for image_name in sorted(waiting):
+                if _parent_image(pending[image_name]) not in waiting | set(
+                    running.values()
+                ):
+                    running[executor.submit(build, image_name)] = image_name
+
+            if not running:
+                raise Exception("The images have circular dependencies.")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                built.append(future.result())
+
+    return built
+
+
+def pull_images(
+    image_names: list[str], registry: str, max_workers: Optional[int] = None
+):
+    """Pull the given images concurrently from a registry and tag them with their
+    local names, such that no image has to be built.
+
+    Args:
+        image_names (list[str]): The local names of the images.
+        registry (str): The registry prefix, e.g. `ghcr.io/my-lab`.
+        max_workers (Optional[int]): Maximum number of images pulled concurrently.
+    """
+
+    def pull(image_name: str):
+        logger.info(f"Pulling image {registry}/{image_name}.")
+        client = get_docker_client()
+        image = client.images.pull(f"{registry}/{image_name}", platform=PLATFORM)
+        image.tag(image_name)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(pull, image_names))
+
+
+def export_images(client: docker.DockerClient, image_names: list[str], path: Path):
+    """Export the given images into a single tarball. Layers shared by several images
+    are only stored once."""
+    # `APIClient.get_image` only exports a single image, while the endpoint accepts
+    # several names. The API client is a requests session.
+    response = client.api.get(
+        f"{client.api.base_url}/v{client.api.api_version}/images/get",
+        params={"names": image_names},
+        stream=True,
+    )
+    response.raise_for_status()
+
+    with open(path, "wb") as file:
+        for chunk in response.iter_content(chunk_size=2**20):
+            file.write(chunk)
+
+
+def load_images(client: docker.DockerClient, path: Path) -> list[str]:
+    """Load all images from a tarball created by `export_images` and return their
+    names."""
+    with open(path, "rb") as file:
+        images = client.images.load(file)
+
+    return [tag for image in images for tag in image.tags]
+
+
+def _parent_image(docker_file: str) -> Optional[str]:
+    """Returns the image referenced in the FROM instruction of the Dockerfile."""
+    for line in docker_file.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].upper() == "FROM":
+            return parts[1]
+
+    return None
+
+
 def start_container(
     client: docker.DockerClient, image_name: str, **kwargs
 ) -> Container:
     """Start a Docker container from a specified image.
 
+    If the current thread reserved CPUs (e.g. using `--cpus`), the container is
+    restricted to the same CPUs and NUMA nodes and may use all of them. Other CPU
+    affinities, like those set by SLURM or `taskset`, only apply to phylorun itself and
+    are not passed on.
+
     Args:
         client (docker.DockerClient): The Docker client.
         image_name (str): Name of the Docker image.
@@ -57,8 +222,14 @@ def start_container(
     Returns:
         Container: The started Docker container.
     """
+    if cpus := reserved_cpu_set():
+        kwargs.setdefault("cpuset_cpus", format_cpu_list(cpus))
+        kwargs.setdefault("cpuset_mems", format_cpu_list(nodes_of(cpus)))
+        # the CPU quota estimated from the analysis would leave reserved CPUs idle
+        kwargs["nano_cpus"] = len(cpus) * 10**9
+
     return client.containers.run(
-        image_name, "sleep infinity", detach=True, platform="linux/x86_64", **kwargs
+        image_name, "sleep infinity", detach=True, platform=PLATFORM, **kwargs
     )
 
 
@@ -67,7 +238,7 @@ def run_and_print_command(
     command: str,
     user: Optional[str] = None,
     working_dir: Optional[str] = None,
-):
+) -> int:
     """Run a command inside a Docker container and print its output to stdout and stderr.
 
     Args:
@@ -75,13 +246,258 @@ def run_and_print_command(
         command (str): The command to execute.
         user (Optional[str]): User to run the command as (if specified).
         working_dir (Optional[str]): The working directory inside the container (if specified).
+
+    Returns:
+        int: The exit code of the command.
     """
-    result = container.exec_run(
-        command, stream=True, demux=True, user=user or "root", workdir=working_dir
-    )
+    # the low-level API is used as `exec_run` does not report the exit code of
+    # streamed commands
+    api = _container_api(container)
+    exec_id = api.exec_create(
+        container.id, command, user=user or "root", workdir=working_dir
+    )["Id"]
 
-    for stdout, stderr in result.output:
+    for stdout, stderr in api.exec_start(exec_id, stream=True, demux=True):
         if stdout:
             print(stdout.decode(), end="")
         if stderr:
             print(stderr.decode(), end="", file=sys.stderr)
+
+    return api.exec_inspect(exec_id)["ExitCode"]
+
+
+def run_analysis_in_container(
+    client: docker.DockerClient,
+    image_name: str,
+    analysis_file: Path,
+    command: str,
+    working_dir: Optional[str] = None,
+    scratch: Optional[str] = None,
+    sync_interval: float = 300,
+    volumes: Optional[dict] = None,
+    outputs: Optional[list[Path]] = None,
+    **kwargs,
+) -> int:
+    """Run an analysis command in a new container and remove the container afterwards.
+
+    The directory of the analysis file is mounted at /data. If the current working
+    directory is a different directory, it is mounted at /working and used as the
+    working directory of the command.
+
+    Args:
+        client (docker.DockerClient): The Docker client.
+        image_name (str): Name of the Docker image.
+        analysis_file (Path): The analysis file, available at /data/<file name>.
+        command (str): The command to execute.
+        working_dir (Optional[str]): Overrides the working directory of the command.
+        scratch (Optional[str]): If set to 'tmpfs' or 'disk', the command runs in a
+            container-local scratch directory instead of the mounted working directory.
+            Outputs are copied back in one tar transfer at the end and every
+            `sync_interval` seconds.
+        sync_interval (float): Seconds between two copy-backs of the scratch outputs.
+        volumes (Optional[dict]): Additional volumes to mount.
+        outputs (Optional[list[Path]]): The files the command writes, relative to the
+            current working directory. With `scratch`, existing files whose path
+            starts with one of these are copied into the scratch directory, such that
+            they are not modified through the links to the mounted directory.
+        **kwargs: Additional keyword arguments passed to container run.
+
+    Returns:
+        int: The exit code of the command.
+    """
+    host_dirs = {"/data": analysis_file.parent.resolve()}
+    if Path() != analysis_file.parent:
+        host_dirs["/working"] = Path().resolve()
+
+    working_dir = working_dir or ("/working" if "/working" in host_dirs else "/data")
+
+    all_volumes = {
+        str(host_dir): {"bind": bind, "mode": "rw"}
+        for bind, host_dir in host_dirs.items()
+    }
+    all_volumes.update(volumes or {})
+
+    if scratch == "tmpfs":
+        kwargs["tmpfs"] = {SCRATCH_DIR: "exec"}
+    elif scratch is not None and scratch not in SCRATCH_MODES:
+        raise Exception(f"Unknown scratch mode '{scratch}'.")
+
+    container = start_container(client, image_name, volumes=all_volumes, **kwargs)
+
+    try:
+        if scratch is None:
+            return run_and_print_command(container, command, working_dir=working_dir)
+
+        host_dir = host_dirs[working_dir]
+        scratch_copies = [
+            relative
+            for output in outputs or []
+            if not (relative := os.path.relpath(output.resolve(), host_dir)).startswith(
+                ".."
+            )
+        ]
+
+        with scratch_outputs(
+            container, working_dir, host_dir, sync_interval, scratch_copies
+        ):
+            return run_and_print_command(container, command, working_dir=SCRATCH_DIR)
+    finally:
+        container.stop()
+        container.remove()
+
+
+@contextmanager
+def scratch_outputs(
+    container: Container,
+    source_dir: str,
+    host_dir: Path,
+    sync_interval: float = 300,
+    copies: Optional[list[str]] = None,
+) -> Iterator[str]:
+    """Prepare a scratch directory mirroring `source_dir` and copy the files written to
+    it back to `host_dir`, periodically and once more when the context exits.
+
+    The scratch directory is populated with symlinks to the files in `source_dir` such
+    that relative input paths keep working without copying the inputs. Existing
+    outputs are copied instead, as the engine would otherwise write through the links
+    into `source_dir`. Only regular files created or modified in the scratch directory
+    are copied back. If the copy-back at the end fails while an exception is raised,
+    the failure is logged and the original exception is kept.
+
+    Args:
+        container (Container): The running Docker container.
+        source_dir (str): The directory inside the container to mirror.
+        host_dir (Path): The directory on the host the outputs are copied to.
+        sync_interval (float): Seconds between two periodic copy-backs.
+        copies (Optional[list[str]]): Paths relative to `source_dir`. Files whose path
+            starts with one of these are copied instead of linked.
+
+    Yields:
+        str: The path of the scratch directory inside the container.
+    """
+    commands = [f"mkdir -p {SCRATCH_DIR}", f"cp -as {source_dir}/. {SCRATCH_DIR}/"]
+    for copy in copies or []:
+        # the copies keep the modification time of the original, such that they are
+        # only copied back once the engine writes to them
+        commands.append(
+            f"for f in {SCRATCH_DIR}/{shlex.quote(copy)}*; do "
+            'if [ -L "$f" ] && [ -f "$f" ]; then '
+            'target="$(readlink "$f")" && rm "$f" && cp -p "$target" "$f"; fi; done'
+        )
+    commands.append(f"touch {_SYNC_MARKER}")
+
+    container.exec_run(["sh", "-c", " && ".join(commands)])
+
+    lock = threading.Lock()
+    stopped = threading.Event()
+
+    def sync():
+        with lock:
+            copy_back_scratch_outputs(container, host_dir)
+
+    def sync_periodically():
+        while not stopped.wait(sync_interval):
+            try:
+                sync()
+            except Exception as e:
+                logger.warning(f"Periodic copy-back of the outputs failed: {e}")
+
+    sync_thread = threading.Thread(target=sync_periodically, daemon=True)
+    sync_thread.start()
+
+    failed = True
+    try:
+        yield SCRATCH_DIR
+        failed = False
+    finally:
+        stopped.set()
+        sync_thread.join()
+        try:
+            sync()
+        except Exception as e:
+            if not failed:
+                raise
+            logger.error(f"Copying back the outputs failed: {e}")
+
+
+def _container_api(container: Container) -> docker.APIClient:
+    """Returns the low-level API client of a container."""
+    if container.client is None:
+        raise Exception(f"The container {container.id} has no Docker client.")
+
+    return container.client.api
+
+
+def copy_back_scratch_outputs(container: Container, host_dir: Path) -> list[str]:
+    """Stream the files in the scratch directory which changed since the last copy-back
+    to the host as a single tar archive. Returns the relative paths of the copied files.
+    """
+    # the marker for the next copy-back is created before listing the files, such that
+    # files modified while the archive is created are copied again the next time
+    script = (
+        f"cd {SCRATCH_DIR} && touch {_NEXT_SYNC_MARKER} "
+        f"&& find . -type f -newer {_SYNC_MARKER} -print0 | tar --null -cf - -T - "
+        f"&& mv {_NEXT_SYNC_MARKER} {_SYNC_MARKER}"
+    )
+
+    api = _container_api(container)
+    exec_id = api.exec_create(container.id, ["sh", "-c", script])["Id"]
+    output = api.exec_start(exec_id, stream=True, demux=True)
+
+    archive = _ChunkReader(stdout for stdout, _ in output if stdout)
+    return extract_tar_stream(archive, host_dir)
+
+
+def extract_tar_stream(archive: io.RawIOBase, target_dir: Path) -> list[str]:
+    """Extract the regular files of an uncompressed tar stream into the target directory.
+    Members with absolute paths or paths outside the target directory are skipped."""
+    extracted = []
+
+    try:
+        tar = tarfile.open(fileobj=archive, mode="r|")
+    except tarfile.ReadError:
+        # the stream is empty, no files were archived
+        return extracted
+
+    with tar:
+        for member in tar:
+            path = PurePosixPath(member.name)
+            if not member.isfile() or path.is_absolute() or ".." in path.parts:
+                continue
+
+            source = tar.extractfile(member)
+            if source is None:
+                continue
+
+            target = target_dir.joinpath(*path.parts)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with source, open(target, "wb") as target_file:
+                while chunk := source.read(1 << 20):
+                    target_file.write(chunk)
+
+            extracted.append(str(path))
+
+    return extracted
+
+
+class _ChunkReader(io.RawIOBase):
+    """A read-only file object reading from an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
@@ -0,0 +1,119 @@
+from pathlib import Path
+from typing import Optional
+
+from phylorun.utils.compression_utils import (
+    COMPRESSION_SUFFIXES,
+    IncrementalDecompressor,
+    open_output,
+)
+
+
+def read_log_columns(log_file: Path) -> tuple[list[str], list[list[float]]]:
+    """Reads a tab-separated trace log as written by BEAST 2, BEAST X and RevBayes.
+    Comment lines starting with '#' are skipped, and the first remaining line is the
+    header. Compressed logs are read transparently. Returns the column names and the
+    rows."""
+    header: list[str] = []
+    rows = []
+
+    with open_output(log_file) as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            values = line.split("\t")
+            if not header:
+                header = values
+                continue
+
+            try:
+                rows.append([float(value) for value in values])
+            except ValueError:
+                # incomplete line of a log which is still being written
+                continue
+
+    return header, rows
+
+
+def read_log_column(log_file: Path, column: str, burnin: float = 0.0) -> list[float]:
+    """Returns the values of one column of a trace log, discarding the first `burnin`
+    fraction of the samples."""
+    header, rows = read_log_columns(log_file)
+
+    if column not in header:
+        raise Exception(f"Column '{column}' not found in '{log_file}'.")
+
+    index = header.index(column)
+    values = [row[index] for row in rows if len(row) == len(header)]
+
+    return values[int(len(values) * burnin) :]
+
+
+class LogTail:
+    """Follows a trace log while an engine is writing it. Every call of `read` only
+    parses the lines appended since the previous call, and an incomplete last line is
+    kept until it is complete. Compressed logs are decompressed incrementally."""
+
+    def __init__(self, log_file: Path):
+        self.log_file = log_file
+        # the number of times the log was replaced and read from the start again
+        self.restarts = 0
+        self._reset(None)
+
+    def _reset(self, followed_file: Optional[Path]):
+        self.header: list[str] = []
+        self._followed_file = followed_file
+        self._offset = 0
+        self._partial_line = b""
+        self._decompressor = IncrementalDecompressor(followed_file or self.log_file)
+
+    def read(self) -> list[list[float]]:
+        """Returns the rows appended to the log since the last call."""
+        log_file = self._existing_log_file()
+        if log_file is None:
+            return []
+
+        if log_file != self._followed_file or log_file.stat().st_size < self._offset:
+            if self._followed_file is not None:
+                # the log was replaced, e.g. by a new run
+                self.restarts += 1
+            self._reset(log_file)
+
+        with open(log_file, "rb") as file:
+            file.seek(self._offset)
+            data = file.read()
+        self._offset += len(data)
+
+        lines = (self._partial_line + self._decompressor.decompress(data)).split(b"\n")
+        self._partial_line = lines.pop()
+
+        rows = []
+        for line in lines:
+            values = line.decode(errors="replace").strip().split("\t")
+            if not values[0] or values[0].startswith("#"):
+                continue
+
+            if not self.header:
+                self.header = values
+                continue
+
+            try:
+                row = [float(value) for value in values]
+            except ValueError:
+                continue
+
+            if len(row) == len(self.header):
+                rows.append(row)
+
+        return rows
+
+    def _existing_log_file(self) -> Optional[Path]:
+        """Returns the log file, or its compressed version if only that exists. While
+        `compressed_outputs` is active, the log file is a named pipe which must not be
+        read, and the compressed file is followed instead."""
+        for suffix in ["", *COMPRESSION_SUFFIXES.values()]:
+            if (log_file := Path(str(self.log_file) + suffix)).is_file():
+                return log_file
+
+        return None
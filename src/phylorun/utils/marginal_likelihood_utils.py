@@ -0,0 +1,112 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Callable, Optional
+
+from loguru import logger
+
+from phylorun.engines.engine import Engine
+from phylorun.utils.placement_utils import reserved_cpus
+
+
+def beta_schedule(steps: int, alpha: float = 0.3) -> list[float]:
+    """Returns the `steps + 1` powers from 0 to 1, spaced according to the quantiles
+    of a Beta(alpha, 1) distribution. Small values of alpha put more powers close to
+    0, where the power posterior changes most."""
+    return [(k / steps) ** (1 / alpha) for k in range(steps + 1)]
+
+
+def stepping_stone_estimate(
+    betas: list[float], log_likelihoods: list[list[float]]
+) -> tuple[float, list[float]]:
+    """Combines the log likelihoods sampled at each power into the stepping-stone
+    estimate of the log marginal likelihood.
+
+    Args:
+        betas (list[float]): The increasing powers from 0 to 1.
+        log_likelihoods (list[list[float]]): The log likelihoods sampled from the power
+            posterior at every power except the last one.
+
+    Returns:
+        tuple[float, list[float]]: The log marginal likelihood and the contributions of
+            the individual steps.
+    """
+    if len(log_likelihoods) != len(betas) - 1:
+        raise Exception("Expected samples for every power except the last one.")
+
+    contributions = []
+    for k, samples in enumerate(log_likelihoods):
+        if not samples:
+            raise Exception(f"No samples for power {betas[k]}.")
+
+        delta = betas[k + 1] - betas[k]
+        contributions.append(
+            _log_sum_exp([delta * sample for sample in samples])
+            - math.log(len(samples))
+        )
+
+    return sum(contributions), contributions
+
+
+def _log_sum_exp(values: list[float]) -> float:
+    maximum = max(values)
+    return maximum + math.log(sum(math.exp(value - maximum) for value in values))
+
+
+def estimate_marginal_likelihood(
+    engine: Engine,
+    analysis_file: Path,
+    output_dir: Path,
+    run_step: Callable[[Path, list[str]], object],
+    steps: int = 32,
+    alpha: float = 0.3,
+    burnin: float = 0.1,
+    max_workers: Optional[int] = None,
+    cpus_per_step: Optional[int] = None,
+    chain_length: Optional[int] = None,
+) -> tuple[float, list[float]]:
+    """Estimates the log marginal likelihood of an analysis using stepping-stone
+    sampling. Every power posterior step is written into its own directory and run as
+    an independent job, and the results are combined afterwards.
+
+    Args:
+        engine (Engine): The engine running the analysis.
+        analysis_file (Path): The analysis file.
+        output_dir (Path): The directory the step directories are created in.
+        run_step (Callable[[Path, list[str]], object]): Runs the analysis file of a
+            step with the given CLI arguments.
+        steps (int): The number of stepping stones.
+        alpha (float): The shape of the power schedule.
+        burnin (float): The fraction of the samples of each step to discard.
+        max_workers (Optional[int]): Maximum number of steps run in parallel.
+        cpus_per_step (Optional[int]): Pin each step to this many reserved CPUs.
+        chain_length (Optional[int]): The iterations of every step. By default, each
+            step runs the chain length of the analysis.
+
+    Returns:
+        tuple[float, list[float]]: The log marginal likelihood and the contributions of
+            the individual steps.
+    """
+    betas = beta_schedule(steps, alpha)
+
+    step_dirs = [output_dir / f"step_{k}" for k in range(steps)]
+    step_runs = []
+    for beta, step_dir in zip(betas, step_dirs):
+        step_dir.mkdir(parents=True, exist_ok=True)
+        step_runs.append(
+            engine.power_posterior_step(analysis_file, beta, step_dir, chain_length)
+        )
+
+    def run(k: int) -> list[float]:
+        with reserved_cpus(cpus_per_step) if cpus_per_step else nullcontext():
+            logger.info(f"Running step {k + 1}/{steps} (power {betas[k]:.5f}).")
+            run_step(*step_runs[k])
+
+        samples = engine.read_power_posterior_log_likelihoods(step_dirs[k])
+        return samples[int(len(samples) * burnin) :]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        log_likelihoods = list(executor.map(run, range(steps)))
+
+    return stepping_stone_estimate(betas, log_likelihoods)
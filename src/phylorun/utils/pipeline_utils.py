@@ -0,0 +1,138 @@
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Optional
+
+from loguru import logger
+
+
+FINGERPRINT_DIR = ".phylorun"
+
+
+class Stage:
+    """A single step of a pipeline, like converting a PhyloSpec file or generating a
+    BEAST 2 XML file. A stage creates its output file from its input files.
+
+    Stages without an output (like running the engine) are always executed. Stages
+    with an output are skipped if the output exists and was created from the same
+    inputs and parameters."""
+
+    def __init__(
+        self,
+        name: str,
+        inputs: list[Path],
+        output: Optional[Path],
+        action: Callable[[], object],
+        parameters: Optional[list[str]] = None,
+    ):
+        self.name = name
+        self.inputs = inputs
+        self.output = output
+        self.action = action
+        self.parameters = parameters or []
+
+    def fingerprint(self) -> str:
+        """Returns a hash of the stage name, its parameters, and the content of all
+        its inputs."""
+        digest = hashlib.sha256()
+        digest.update(self.name.encode())
+
+        for parameter in self.parameters:
+            digest.update(b"\0" + parameter.encode())
+
+        for input_file in sorted(self.inputs):
+            digest.update(b"\0" + str(input_file).encode() + b"\0")
+            if input_file.exists():
+                digest.update(hashlib.sha256(input_file.read_bytes()).digest())
+
+        return digest.hexdigest()
+
+    def is_up_to_date(self) -> bool:
+        """Checks if the output exists and was created from the current inputs."""
+        if self.output is None or not self.output.exists():
+            return False
+
+        fingerprint_file = self._fingerprint_file()
+        if fingerprint_file is None or not fingerprint_file.exists():
+            return False
+
+        return fingerprint_file.read_text() == self.fingerprint()
+
+    def run(self) -> object:
+        """Runs the stage if it is not up to date and records the new fingerprint.
+        Returns the result of the action, or None if the stage was skipped."""
+        if self.is_up_to_date():
+            logger.info(f"Skipping '{self.name}': {self.output} is up to date.")
+            return None
+
+        logger.debug(f"Running '{self.name}'.")
+
+        # the fingerprint is computed before running the action such that inputs
+        # modified in the meantime trigger another run the next time
+        fingerprint = self.fingerprint()
+        result = self.action()
+
+        if fingerprint_file := self._fingerprint_file():
+            fingerprint_file.parent.mkdir(exist_ok=True)
+            fingerprint_file.write_text(fingerprint)
+
+        return result
+
+    def _fingerprint_file(self) -> Optional[Path]:
+        if self.output is None:
+            return None
+
+        return (
+            self.output.parent / FINGERPRINT_DIR / (self.output.name + ".fingerprint")
+        )
+
+
+class Pipeline:
+    """A graph of stages. A stage depends on another stage if it uses its output as an
+    input. Independent stages are run in parallel."""
+
+    def __init__(self, stages: list[Stage]):
+        self.stages = stages
+
+    def dependencies(self, stage: Stage) -> list[Stage]:
+        """Returns the stages producing the inputs of the given stage."""
+        return [
+            other
+            for other in self.stages
+            if other is not stage and other.output is not None
+            if other.output in stage.inputs
+        ]
+
+    def run(self, max_workers: Optional[int] = None) -> dict[Stage, object]:
+        """Runs all stages in dependency order and returns the results of their
+        actions. If a stage fails, no new stages are started and the exception is
+        raised once the running stages have finished."""
+        remaining = list(self.stages)
+        finished: list[Stage] = []
+        results: dict[Stage, object] = {}
+        running: dict[Future, Stage] = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while remaining or running:
+                for stage in list(remaining):
+                    if all(d in finished for d in self.dependencies(stage)):
+                        remaining.remove(stage)
+                        running[executor.submit(stage.run)] = stage
+
+                if not running:
+                    raise Exception(
+                        "The pipeline contains stages with circular dependencies."
+                    )
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+
+                    if exception := future.exception():
+                        wait(running)
+                        raise exception
+
+                    finished.append(stage)
+                    results[stage] = future.result()
+
+        return results
@@ -0,0 +1,264 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from loguru import logger
+
+
+NUMA_NODES_DIR = Path("/sys/devices/system/node")
+
+PLACEMENT_FILE_VARIABLE = "PHYLORUN_PLACEMENT_FILE"
+
+# the CPUs reserved by the current thread
+_reservation = threading.local()
+
+
+def default_placement_file() -> Path:
+    """Returns the file the reservations are recorded in. It is shared by all users of
+    the machine, unless `PHYLORUN_PLACEMENT_FILE` points somewhere else (e.g. into a
+    directory of a group)."""
+    if path := os.environ.get(PLACEMENT_FILE_VARIABLE):
+        return Path(path)
+
+    return Path(tempfile.gettempdir()) / "phylorun-placements.json"
+
+
+def parse_cpu_list(cpu_list: str) -> list[int]:
+    """Parses a CPU list like `0-3,8,10-11` into the list of CPU ids."""
+    cpus = []
+
+    for part in cpu_list.strip().split(","):
+        if not part:
+            continue
+
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+
+    return cpus
+
+
+def format_cpu_list(cpus: list[int]) -> str:
+    """Formats CPU ids as a CPU list like `0-3,8,10-11`."""
+    ranges = []
+
+    for cpu in sorted(set(cpus)):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+
+    return ",".join(
+        str(start) if start == end else f"{start}-{end}" for start, end in ranges
+    )
+
+
+def available_cpu_set() -> set[int]:
+    """Returns the CPUs the current thread may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return set(os.sched_getaffinity(0))
+
+    return set(range(os.cpu_count() or 1))
+
+
+# the CPUs phylorun was started with, before any thread was pinned
+PROCESS_CPUS = available_cpu_set()
+
+
+def numa_nodes() -> dict[int, list[int]]:
+    """Returns the CPUs of every NUMA node phylorun may use. Machines without NUMA
+    information are treated as a single node."""
+    available = PROCESS_CPUS
+    nodes = {}
+
+    for node_dir in sorted(NUMA_NODES_DIR.glob("node[0-9]*")):
+        try:
+            cpus = parse_cpu_list((node_dir / "cpulist").read_text())
+        except (OSError, ValueError):
+            continue
+
+        if node_cpus := sorted(available.intersection(cpus)):
+            nodes[int(node_dir.name.removeprefix("node"))] = node_cpus
+
+    return nodes or {0: sorted(available)}
+
+
+def reserved_cpu_set() -> Optional[list[int]]:
+    """Returns the CPUs reserved by the current thread using `reserved_cpus`, or None
+    if it did not reserve any."""
+    return getattr(_reservation, "cpus", None)
+
+
+def nodes_of(cpus: list[int]) -> list[int]:
+    """Returns the NUMA nodes the given CPUs belong to."""
+    return [
+        node
+        for node, node_cpus in numa_nodes().items()
+        if set(node_cpus).intersection(cpus)
+    ]
+
+
+def select_cpus(
+    nodes: dict[int, list[int]], reserved: set[int], count: int
+) -> Optional[list[int]]:
+    """Selects `count` unreserved CPUs, preferring a single NUMA node. Runs are spread
+    over the nodes by using the node with the most free CPUs. Returns None if not
+    enough CPUs are free."""
+    free = {
+        node: [cpu for cpu in cpus if cpu not in reserved]
+        for node, cpus in nodes.items()
+    }
+    by_free_cpus = sorted(free.values(), key=len, reverse=True)
+
+    if sum(len(cpus) for cpus in by_free_cpus) < count:
+        return None
+
+    if len(by_free_cpus[0]) >= count:
+        return by_free_cpus[0][:count]
+
+    # no node has enough free CPUs, so the run has to span several nodes
+    selected = []
+    for cpus in by_free_cpus:
+        selected.extend(cpus[: count - len(selected)])
+    return selected
+
+
+@contextmanager
+def reserved_cpus(
+    count: int,
+    placement_file: Optional[Path] = None,
+    poll_interval: float = 5,
+) -> Iterator[list[int]]:
+    """Reserves `count` CPUs for this process and pins the current thread to them.
+    Processes started from this thread (local engines) inherit the CPU set, and
+    containers started from it are restricted to it as well.
+
+    Reservations of all phylorun processes of the user are recorded in a shared
+    placement file, such that concurrent invocations do not overlap. If not enough
+    CPUs are free, this waits until other runs finish.
+
+    Args:
+        count (int): The number of CPUs to reserve.
+        placement_file (Optional[Path]): The file recording the reservations, by
+            default `default_placement_file()`.
+        poll_interval (float): Seconds between two attempts to reserve CPUs.
+
+    Yields:
+        list[int]: The reserved CPUs.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        raise Exception("Pinning runs to CPUs is only supported on Linux.")
+
+    nodes = numa_nodes()
+    total = sum(len(cpus) for cpus in nodes.values())
+    if count > total:
+        raise Exception(f"Cannot reserve {count} CPUs, only {total} are available.")
+
+    placement_file = placement_file or default_placement_file()
+    key = str(os.getpid())
+    previous_affinity = available_cpu_set()
+
+    while True:
+        with _locked_placements(placement_file) as placements:
+            reserved = {cpu for cpus in placements.values() for cpu in cpus}
+            if cpus := select_cpus(nodes, reserved, count):
+                placements[key] = placements.get(key, []) + cpus
+                break
+
+        logger.info(f"Waiting for {count} free CPUs.")
+        time.sleep(poll_interval)
+
+    logger.info(
+        f"Running on CPUs {format_cpu_list(cpus)} (NUMA node(s) "
+        f"{', '.join(str(node) for node in nodes_of(cpus))})."
+    )
+    os.sched_setaffinity(0, cpus)
+    previous_reservation = reserved_cpu_set()
+    _reservation.cpus = cpus
+
+    try:
+        yield cpus
+    finally:
+        os.sched_setaffinity(0, previous_affinity)
+        _reservation.cpus = previous_reservation
+
+        with _locked_placements(placement_file) as placements:
+            remaining = [cpu for cpu in placements.get(key, []) if cpu not in cpus]
+            if remaining:
+                placements[key] = remaining
+            else:
+                placements.pop(key, None)
+
+
+@contextmanager
+def _locked_placements(placement_file: Path) -> Iterator[dict[str, list[int]]]:
+    """Yields the reservations of all running phylorun processes while holding an
+    exclusive lock. Reservations of processes which no longer exist are dropped, and
+    changes are written back when the context exits."""
+    placement_file.parent.mkdir(parents=True, exist_ok=True)
+
+    with os.fdopen(
+        _open_shared(placement_file.with_suffix(".lock"), os.O_WRONLY)
+    ) as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        try:
+            placements = json.loads(placement_file.read_text())
+        except (OSError, ValueError):
+            placements = {}
+
+        placements = {
+            pid: cpus for pid, cpus in placements.items() if _is_running(int(pid))
+        }
+
+        yield placements
+
+        with os.fdopen(
+            _open_shared(placement_file, os.O_WRONLY | os.O_TRUNC), "w"
+        ) as file:
+            file.write(json.dumps(placements))
+
+
+def _open_shared(path: Path, flags: int) -> int:
+    """Opens a file every user may write to, creating it if needed. Existing files
+    are opened without `O_CREAT`, which the kernel refuses for files of other users
+    in sticky directories like /tmp."""
+    try:
+        try:
+            return os.open(path, flags)
+        except FileNotFoundError:
+            pass
+
+        try:
+            fd = os.open(path, flags | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            return os.open(path, flags)
+
+        # the mode passed to `open` is restricted by the umask
+        os.fchmod(fd, 0o666)
+        return fd
+    except PermissionError as e:
+        raise Exception(
+            f"Cannot write the CPU reservations to '{path}' ({e.strerror}). Set "
+            f"{PLACEMENT_FILE_VARIABLE} to a file all phylorun users may write to."
+        ) from e
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # the process exists, but belongs to another user
+        return True
+
+    return True
@@ -0,0 +1,265 @@
+import json
+import math
+import os
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+from xml.etree import ElementTree
+
+from loguru import logger
+
+from phylorun.utils.resource_utils import (
+    NON_HEAP_MB,
+    AnalysisSummary,
+    Partition,
+    maximum_heap_mb,
+    summarize_analysis,
+)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+HISTORY_FILE = "runs.jsonl"
+
+# set to a non-empty value to stop recording runs
+NO_HISTORY_VARIABLE = "PHYLORUN_NO_HISTORY"
+
+# engines whose analyses embed their alignments in an XML file
+PREFLIGHT_ENGINES = ("beast2", "beastx")
+
+# number of recent runs of an engine the cost model is calibrated on
+CALIBRATION_RUNS = 50
+
+# seconds per likelihood operation before any run was recorded, a rough value for
+# BEAGLE on the CPU of a current machine
+DEFAULT_SECONDS_PER_OPERATION = 5e-10
+
+MEMORY_UNITS = {"k": 2**-10, "m": 1, "g": 2**10, "t": 2**20}
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def history_file() -> Path:
+    """Returns the file past runs are recorded in, in the user's cache directory."""
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_dir) / "phylorun" / HISTORY_FILE
+
+
+def records_runs() -> bool:
+    """Checks if finished runs are recorded, which the user can turn off."""
+    return not os.environ.get(NO_HISTORY_VARIABLE)
+
+
+def likelihood_operations(partitions: list[Partition], categories: int) -> int:
+    """Returns the cost of a full likelihood evaluation: every internal node combines
+    the partials of its children for every site pattern, rate category and pair of
+    states."""
+    return sum(
+        max(p.taxa - 1, 1) * p.patterns * categories * p.states**2 for p in partitions
+    )
+
+
+class RunPrediction:
+    """The predicted memory and run time of a BEAST 2 or BEAST X analysis."""
+
+    def __init__(
+        self,
+        engine: str,
+        summary: AnalysisSummary,
+        operations_per_state: int,
+        baseline_memory_mb: int,
+        memory_mb: int,
+        seconds: Optional[float],
+        calibration_runs: int,
+    ):
+        self.engine = engine
+        self.summary = summary
+        self.operations_per_state = operations_per_state
+        self.baseline_memory_mb = baseline_memory_mb
+        self.memory_mb = memory_mb
+        self.seconds = seconds
+        self.calibration_runs = calibration_runs
+
+
+def read_history(engine: str) -> list[dict]:
+    """Returns the most recent recorded runs of an engine."""
+    try:
+        lines = history_file().read_text().splitlines()
+    except FileNotFoundError:
+        return []
+
+    runs = []
+    for line in lines:
+        try:
+            run = json.loads(line)
+        except json.JSONDecodeError:
+            # a line written by a run which was interrupted
+            continue
+
+        if isinstance(run, dict) and run.get("engine") == engine:
+            runs.append(run)
+
+    return runs[-CALIBRATION_RUNS:]
+
+
+def predict_run(engine: str, xml_file: Path) -> Optional[RunPrediction]:
+    """Predicts the peak memory and the run time of an analysis. The cost model
+    scales with the number of likelihood operations per state and the size of the
+    partials, and is calibrated on the past runs of the same engine. Returns None if
+    the file is no BEAST XML file or contains no alignments.
+
+    Args:
+        engine (str): The name of the engine running the analysis.
+        xml_file (Path): The BEAST 2 or BEAST X XML file.
+
+    Returns:
+        Optional[RunPrediction]: The prediction.
+    """
+    try:
+        summary = summarize_analysis(xml_file)
+    except (ElementTree.ParseError, OSError):
+        return None
+
+    if not summary.partitions:
+        return None
+
+    operations_per_state = likelihood_operations(summary.partitions, summary.categories)
+
+    # the most the JVM may use, as `estimate_resources` sets the maximum heap size
+    baseline_memory_mb = (
+        maximum_heap_mb(summary.partitions, summary.categories) + NON_HEAP_MB
+    )
+
+    history = read_history(engine)
+
+    seconds_per_operation = DEFAULT_SECONDS_PER_OPERATION
+    if timed_runs := [
+        run["seconds"] / (run["chain_length"] * run["operations_per_state"])
+        for run in history
+        if run.get("chain_length") and run.get("operations_per_state")
+    ]:
+        seconds_per_operation = statistics.median(timed_runs)
+
+    memory_ratio = 1.0
+    if measured_runs := [
+        run["peak_memory_mb"] / run["baseline_memory_mb"]
+        for run in history
+        if run.get("peak_memory_mb") and run.get("baseline_memory_mb")
+    ]:
+        memory_ratio = statistics.median(measured_runs)
+
+    return RunPrediction(
+        engine,
+        summary,
+        operations_per_state,
+        baseline_memory_mb,
+        math.ceil(memory_ratio * baseline_memory_mb),
+        summary.chain_length * operations_per_state * seconds_per_operation
+        if summary.chain_length
+        else None,
+        len(history),
+    )
+
+
+def record_run(
+    prediction: RunPrediction, seconds: float, peak_memory_mb: Optional[int]
+):
+    """Records a finished run, such that later predictions are calibrated on it.
+    Every run appends a single line, which keeps concurrent runs from overwriting
+    each other."""
+    run = {
+        "engine": prediction.engine,
+        "time": int(time.time()),
+        "chain_length": prediction.summary.chain_length,
+        "operations_per_state": prediction.operations_per_state,
+        "baseline_memory_mb": prediction.baseline_memory_mb,
+        "seconds": round(seconds, 3),
+        "peak_memory_mb": peak_memory_mb,
+    }
+
+    try:
+        history_file().parent.mkdir(parents=True, exist_ok=True)
+        with open(history_file(), "a") as file:
+            file.write(json.dumps(run) + "\n")
+    except OSError as exception:
+        logger.debug(f"Could not record the run: {exception}")
+
+
+def peak_child_memory_mb() -> Optional[int]:
+    """Returns the peak resident memory of the largest child process which finished
+    so far, if the platform reports it."""
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if not max_rss:
+        return None
+
+    # macOS reports bytes, Linux kilobytes
+    return max_rss // 2**20 if sys.platform == "darwin" else max_rss // 2**10
+
+
+def check_limits(
+    prediction: RunPrediction,
+    max_memory_mb: Optional[int] = None,
+    max_seconds: Optional[float] = None,
+) -> list[str]:
+    """Returns the reasons why the predicted run exceeds the given limits."""
+    problems = []
+
+    if max_memory_mb and prediction.memory_mb > max_memory_mb:
+        problems.append(
+            f"The run needs an estimated {prediction.memory_mb} MB of memory, but "
+            f"the limit is {max_memory_mb} MB."
+        )
+
+    if max_seconds and prediction.seconds and prediction.seconds > max_seconds:
+        problems.append(
+            f"The run takes an estimated {format_duration(prediction.seconds)}, but "
+            f"the limit is {format_duration(max_seconds)}."
+        )
+
+    return problems
+
+
+def parse_memory_mb(value: str) -> int:
+    """Parses a memory size like '16G', '512M' or '2048' (in MB) into MB."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmgt])?b?\s*", value.lower())
+    if not match:
+        raise Exception(f"Expected a memory size like '16G' or '512M', got '{value}'.")
+
+    return int(float(match.group(1)) * MEMORY_UNITS[match.group(2) or "m"])
+
+
+def parse_duration(value: str) -> float:
+    """Parses a duration like '48h', '90m', '2d' or a SLURM time like '1-12:00:00'
+    into seconds."""
+    value = value.strip().lower()
+
+    if match := re.fullmatch(r"(\d+(?:\.\d+)?)([smhd])?", value):
+        return float(match.group(1)) * DURATION_UNITS[match.group(2) or "s"]
+
+    if match := re.fullmatch(r"(?:(\d+)-)?(?:(\d+):)?(\d+):(\d+)", value):
+        days, hours, minutes, seconds = (int(part or 0) for part in match.groups())
+        return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+    raise Exception(f"Expected a duration like '48h' or '1-12:00:00', got '{value}'.")
+
+
+def format_duration(seconds: float) -> str:
+    """Formats a duration like '2d 3h', '4h 12m' or '35s'."""
+    seconds = round(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+
+    parts = [(days, "d"), (hours, "h"), (minutes, "m"), (seconds, "s")]
+    while len(parts) > 1 and not parts[0][0]:
+        parts.pop(0)
+
+    return " ".join(f"{value}{unit}" for value, unit in parts[:2])
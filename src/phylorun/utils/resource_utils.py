@@ -0,0 +1,305 @@
+import math
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+from xml.etree import ElementTree
+
+import numpy as np
+from loguru import logger
+
+
+STATE_COUNTS = {"nucleotide": 4, "binary": 2, "aminoacid": 20, "codon": 61}
+
+# memory used by BEAST itself, independent of the alignment size
+BASE_HEAP_MB = 512
+MIN_HEAP_MB = 1024
+# room for additional partial buffers, scaling, and the garbage collector
+HEAP_SAFETY_FACTOR = 2
+# memory used by the JVM outside of the heap
+NON_HEAP_MB = 256
+
+# site patterns are hashed with 64-bit FNV-1a
+FNV_OFFSET = 0xCBF29CE484222325
+FNV_PRIME = 0x100000001B3
+GAP = ord("-")
+
+
+class Partition:
+    """Summary of an alignment embedded in an analysis file."""
+
+    def __init__(self, name: str, taxa: int, sites: int, patterns: int, states: int):
+        self.name = name
+        self.taxa = taxa
+        self.sites = sites
+        self.patterns = patterns
+        self.states = states
+
+    def __repr__(self) -> str:
+        return (
+            f"Partition({self.name!r}, taxa={self.taxa}, sites={self.sites}, "
+            f"patterns={self.patterns}, states={self.states})"
+        )
+
+
+class Resources:
+    """The memory and threads assigned to an analysis. `native_mb` is the memory
+    BEAGLE allocates for the partial likelihoods outside of the Java heap."""
+
+    def __init__(
+        self, max_heap_mb: int, initial_heap_mb: int, threads: int, native_mb: int = 0
+    ):
+        self.max_heap_mb = max_heap_mb
+        self.initial_heap_mb = initial_heap_mb
+        self.threads = threads
+        self.native_mb = native_mb
+
+    def jvm_args(self) -> list[str]:
+        """Returns the JVM arguments setting the heap size."""
+        return [f"-Xms{self.initial_heap_mb}m", f"-Xmx{self.max_heap_mb}m"]
+
+    def container_kwargs(self, scratch: Optional[str] = None) -> dict:
+        """Returns the container run arguments limiting memory and CPUs. With a tmpfs
+        scratch directory, the memory is not limited, as the outputs written to it
+        count against the limit and their size is not known in advance."""
+        kwargs: dict = {"nano_cpus": self.threads * 10**9}
+        if scratch != "tmpfs":
+            kwargs["mem_limit"] = f"{self.max_heap_mb + NON_HEAP_MB + self.native_mb}m"
+
+        return kwargs
+
+
+class SitePatternHasher:
+    """Hashes the site patterns (alignment columns) of an alignment while its
+    sequences are read one by one, such that the sequences need not be kept. Every
+    site has a 64-bit FNV-1a hash, which is updated for all sites of a sequence at
+    once. Shorter sequences are padded with gaps."""
+
+    def __init__(self):
+        self.taxa = 0
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        # the hash of a site at which all sequences so far are gaps
+        self._gap_hash = np.full(1, FNV_OFFSET, dtype=np.uint64)
+
+    @property
+    def sites(self) -> int:
+        return len(self._hashes)
+
+    def add(self, sequence: str):
+        """Adds the next sequence of the alignment."""
+        values = np.frombuffer(
+            sequence.encode("ascii", errors="replace"), dtype=np.uint8
+        ).astype(np.uint64)
+
+        if len(values) > self.sites:
+            self._hashes = np.concatenate(
+                [self._hashes, np.repeat(self._gap_hash, len(values) - self.sites)]
+            )
+
+        self._hashes[: len(values)] ^= values
+        self._hashes[len(values) :] ^= GAP
+        self._hashes *= FNV_PRIME
+
+        self._gap_hash ^= GAP
+        self._gap_hash *= FNV_PRIME
+        self.taxa += 1
+
+    def count_patterns(self) -> int:
+        """Returns the number of unique site patterns."""
+        return len(np.unique(self._hashes))
+
+
+class AnalysisSummary:
+    """Summary of a BEAST 2 or BEAST X analysis: its alignments, the number of rate
+    categories and filtered partitions, and the chain length (if it is given)."""
+
+    def __init__(
+        self,
+        partitions: list[Partition],
+        categories: int,
+        filtered_partitions: int,
+        chain_length: Optional[int],
+    ):
+        self.partitions = partitions
+        self.categories = categories
+        self.filtered_partitions = filtered_partitions
+        self.chain_length = chain_length
+
+
+def summarize_analysis(xml_file: Path) -> AnalysisSummary:
+    """Streams through a BEAST 2 or BEAST X XML file and summarizes it. Every sequence
+    is discarded as soon as its sites are hashed. The summary is kept until the file
+    changes, such that predicting and running an analysis only parse it once."""
+    stat = xml_file.stat()
+    return _summarize_analysis(xml_file.resolve(), stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=16)
+def _summarize_analysis(xml_file: Path, mtime_ns: int, size: int) -> AnalysisSummary:
+    partitions = []
+    categories = 1
+    filtered_partitions = 0
+    chain_length = None
+
+    alignment_stack: list[tuple[ElementTree.Element, SitePatternHasher]] = []
+
+    for event, element in ElementTree.iterparse(xml_file, events=("start", "end")):
+        tag = element.tag.lower()
+
+        if event == "start":
+            if tag in ("data", "alignment"):
+                alignment_stack.append((element, SitePatternHasher()))
+            elif tag in ("run", "mcmc") and chain_length is None:
+                try:
+                    chain_length = int(float(element.get("chainLength", "")))
+                except ValueError:
+                    pass
+            continue
+
+        for attribute in ("gammaCategoryCount", "gammaCategories"):
+            if value := element.get(attribute):
+                try:
+                    categories = max(categories, int(value))
+                except ValueError:
+                    pass
+
+        if "FilteredAlignment" in element.get("spec", ""):
+            filtered_partitions += 1
+
+        if tag == "sequence" and alignment_stack:
+            sequence = element.get("value")
+            if sequence is None:
+                sequence = "".join(element.itertext())
+            alignment_stack[-1][1].add("".join(sequence.split()).upper())
+            element.clear()
+
+        elif tag in ("data", "alignment") and alignment_stack:
+            alignment, hasher = alignment_stack.pop()
+            if hasher.taxa:
+                partitions.append(_summarize_alignment(alignment, hasher))
+
+    return AnalysisSummary(partitions, categories, filtered_partitions, chain_length)
+
+
+def _summarize_alignment(alignment: ElementTree.Element, hasher: SitePatternHasher):
+    data_type = alignment.get("dataType", "nucleotide").lower()
+    states = STATE_COUNTS.get(data_type, 4)
+
+    return Partition(
+        name=alignment.get("id", "alignment"),
+        taxa=hasher.taxa,
+        sites=hasher.sites,
+        patterns=hasher.count_patterns(),
+        states=states,
+    )
+
+
+def estimate_resources(xml_file: Path) -> Optional[Resources]:
+    """Estimates the heap size and the number of threads for a BEAST 2 or BEAST X
+    analysis from the size of its alignments. Returns None if the file contains no
+    alignments."""
+    try:
+        summary = summarize_analysis(xml_file)
+    except (ElementTree.ParseError, OSError):
+        return None
+
+    partitions, categories = summary.partitions, summary.categories
+
+    if not partitions:
+        return None
+
+    estimate_mb = estimate_heap_mb(partitions, categories)
+
+    max_heap_mb = maximum_heap_mb(partitions, categories)
+    if (memory_mb := physical_memory_mb()) and max_heap_mb > 0.9 * memory_mb:
+        logger.warning(
+            f"The analysis needs an estimated {max_heap_mb} MB of memory, but only "
+            f"{memory_mb} MB are available."
+        )
+        max_heap_mb = int(0.9 * memory_mb)
+
+    initial_heap_mb = min(max_heap_mb, _round_up(estimate_mb))
+
+    threads = min(max(len(partitions), summary.filtered_partitions), available_cpus())
+
+    logger.debug(
+        f"Estimated resources for {len(partitions)} partition(s) with "
+        f"{categories} rate categories: {max_heap_mb} MB heap, {threads} thread(s)."
+    )
+
+    return Resources(
+        max_heap_mb,
+        initial_heap_mb,
+        max(threads, 1),
+        _round_up(partials_mb(partitions, categories)),
+    )
+
+
+def partials_mb(partitions: list[Partition], categories: int) -> int:
+    """Returns the memory of the partial likelihoods of the given alignments."""
+    # BEAGLE stores partials for the tips and two buffers for every internal node
+    partials_bytes = sum(
+        3 * p.taxa * p.patterns * p.states * categories * 8 for p in partitions
+    )
+    return math.ceil(partials_bytes / 2**20)
+
+
+def estimate_heap_mb(partitions: list[Partition], categories: int) -> int:
+    """Returns the heap BEAST needs for the partial likelihoods of the given
+    alignments, without any safety margin."""
+    return BASE_HEAP_MB + partials_mb(partitions, categories)
+
+
+def maximum_heap_mb(partitions: list[Partition], categories: int) -> int:
+    """Returns the maximum heap size for the given alignments including a safety
+    margin, before it is limited to the physical memory."""
+    return max(
+        MIN_HEAP_MB,
+        _round_up(HEAP_SAFETY_FACTOR * estimate_heap_mb(partitions, categories)),
+    )
+
+
+def available_cpus() -> int:
+    """Returns the number of CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+
+def physical_memory_mb() -> Optional[int]:
+    """Returns the physical memory of the machine in MB, if it can be determined."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2**20
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _round_up(memory_mb: float, step_mb: int = 256) -> int:
+    return int(math.ceil(memory_mb / step_mb) * step_mb)
+
+
+def java_library_path(lib_dirs: list[Path]) -> str:
+    """Returns the `-Djava.library.path` argument the `beast` scripts of BEAST 2 and
+    BEAST X pass to Java, such that BEAGLE is found: the given directories of the
+    installation, `$LD_LIBRARY_PATH`, `$BEAST_EXTRA_LIBS`, `$BEAGLE_LIB` and
+    /usr/local/lib."""
+    paths = [
+        *(str(lib_dir) for lib_dir in lib_dirs),
+        *(
+            path
+            for variable in ("LD_LIBRARY_PATH", "BEAST_EXTRA_LIBS", "BEAGLE_LIB")
+            for path in os.environ.get(variable, "").split(os.pathsep)
+            if path
+        ),
+        "/usr/local/lib",
+    ]
+    return f"-Djava.library.path={os.pathsep.join(dict.fromkeys(paths))}"
+
+
+def with_threads_arg(cli_args: list[str], resources: Resources) -> list[str]:
+    """Adds the BEAST `-threads` argument, unless it is already given."""
+    if "-threads" in cli_args or resources.threads <= 1:
+        return cli_args
+
+    return ["-threads", str(resources.threads), *cli_args]
@@ -0,0 +1,231 @@
+import itertools
+import json
+import math
+import os
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from loguru import logger
+
+from phylorun.engines.engine import Engine
+from phylorun.utils.placement_utils import reserved_cpus
+
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+STATE_FILE = "sweep.json"
+
+# placeholders filled in by phylorun for every variant
+BUILTIN_PARAMETERS = ("variant", "template_dir")
+
+
+def parse_parameter(option: str) -> tuple[str, list[str]]:
+    """Parses a `name=value1,value2,...` option into the parameter name and its
+    values."""
+    name, separator, values = option.partition("=")
+    name = name.strip()
+
+    if not separator or not PLACEHOLDER_PATTERN.fullmatch(f"{{{{{name}}}}}"):
+        raise Exception(f"Expected 'name=value1,value2,...', got '{option}'.")
+
+    return name, [value.strip() for value in values.split(",")]
+
+
+def read_grid_file(grid_file: Path) -> dict[str, list[str]]:
+    """Reads a parameter grid from a JSON file mapping every parameter name to a list
+    of values (or to a single value)."""
+    grid = json.loads(grid_file.read_text())
+    if not isinstance(grid, dict):
+        raise Exception(f"The grid file '{grid_file}' must contain a JSON object.")
+
+    return {
+        name: [str(value) for value in values]
+        if isinstance(values, list)
+        else [str(values)]
+        for name, values in grid.items()
+    }
+
+
+def template_parameters(template: str) -> set[str]:
+    """Returns the names of the `{{name}}` placeholders used in a template."""
+    return set(PLACEHOLDER_PATTERN.findall(template))
+
+
+def render_template(template: str, values: dict[str, str]) -> str:
+    """Replaces all `{{name}}` placeholders of a template with the given values."""
+
+    def replace(match: re.Match) -> str:
+        if match.group(1) not in values:
+            raise Exception(f"No value for placeholder '{match.group(0)}'.")
+        return values[match.group(1)]
+
+    return PLACEHOLDER_PATTERN.sub(replace, template)
+
+
+def grid_size(grid: dict[str, list[str]]) -> int:
+    """Returns the number of parameter combinations of a grid."""
+    return math.prod(len(values) for values in grid.values())
+
+
+def grid_variants(grid: dict[str, list[str]]) -> Iterator[dict[str, str]]:
+    """Yields the parameter combinations of a grid one by one, varying the last
+    parameter fastest."""
+    names = list(grid)
+    for combination in itertools.product(*grid.values()):
+        yield dict(zip(names, combination))
+
+
+class SweepState:
+    """The progress of a sweep. Finished variants are recorded in `sweep.json` in the
+    output directory, such that an interrupted sweep can be resumed."""
+
+    def __init__(self, output_dir: Path):
+        self.state_file = output_dir / STATE_FILE
+        self._lock = threading.Lock()
+
+        try:
+            self.variants: dict[str, dict] = json.loads(self.state_file.read_text())
+        except FileNotFoundError:
+            self.variants = {}
+
+    def status(self, name: str, values: dict[str, str]) -> Optional[str]:
+        """Returns 'completed' or 'failed' if the variant ran before, or None."""
+        if name not in self.variants:
+            return None
+
+        if self.variants[name]["values"] != values:
+            raise Exception(
+                f"The parameter grid changed since the sweep in "
+                f"'{self.state_file.parent}' was started. Use another output directory."
+            )
+
+        return self.variants[name]["status"]
+
+    def record(self, name: str, values: dict[str, str], status: str):
+        """Records the status of a variant. The state file is replaced atomically,
+        such that it stays intact if phylorun is interrupted."""
+        with self._lock:
+            self.variants[name] = {"values": values, "status": status}
+
+            temporary_file = self.state_file.with_suffix(".tmp")
+            temporary_file.write_text(json.dumps(self.variants, indent=2))
+            os.replace(temporary_file, self.state_file)
+
+
+def run_sweep(
+    template_file: Path,
+    grid: dict[str, list[str]],
+    output_dir: Path,
+    detect_engine: Callable[[Path], Engine],
+    run_variant: Callable[[Engine, Path], int],
+    max_workers: int = 1,
+    cpus_per_variant: Optional[int] = None,
+) -> dict[str, str]:
+    """Runs a templated analysis for every combination of the parameter grid. Every
+    variant is rendered into its own directory right before it runs, and at most
+    `max_workers` variants run at the same time. Variants which completed in an
+    earlier invocation with the same output directory are skipped.
+
+    Args:
+        template_file (Path): The analysis file containing `{{name}}` placeholders.
+        grid (dict[str, list[str]]): The values of every parameter.
+        output_dir (Path): The directory the variant directories are created in.
+        detect_engine (Callable[[Path], Engine]): Returns the engine running an
+            analysis file. This is only called for the first variant.
+        run_variant (Callable[[Engine, Path], int]): Runs the analysis file of a
+            variant and returns the exit code of the engine.
+        max_workers (int): Maximum number of variants run in parallel.
+        cpus_per_variant (Optional[int]): Pin each variant to this many reserved CPUs.
+
+    Returns:
+        dict[str, str]: The status of every variant in the output directory.
+    """
+    template = template_file.read_text()
+
+    for name in grid:
+        if name in BUILTIN_PARAMETERS:
+            raise Exception(f"The parameter name '{name}' is reserved.")
+        if name not in template_parameters(template):
+            logger.warning(f"The template does not use the parameter '{name}'.")
+
+    if missing := template_parameters(template) - set(grid) - set(BUILTIN_PARAMETERS):
+        raise Exception(
+            f"No values given for the placeholder(s) {', '.join(sorted(missing))}."
+        )
+
+    total = grid_size(grid)
+    width = len(str(total - 1))
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    state = SweepState(output_dir)
+
+    def render(index: int, values: dict[str, str]) -> tuple[str, Path]:
+        name = f"{index:0{width}d}"
+        analysis_file = output_dir / name / template_file.name
+        analysis_file.parent.mkdir(exist_ok=True)
+        analysis_file.write_text(
+            render_template(
+                template,
+                {
+                    **values,
+                    "variant": name,
+                    "template_dir": str(template_file.parent.resolve()),
+                },
+            )
+        )
+        return name, analysis_file
+
+    variants = enumerate(grid_variants(grid))
+
+    # the engine is detected once, on the first rendered variant, as the template
+    # itself may not be a valid analysis file
+    try:
+        first_index, first_values = next(variants)
+    except StopIteration:
+        return {}
+    engine = detect_engine(render(first_index, first_values)[1])
+    logger.info(
+        f"Running {total} variant(s) of '{template_file}' with {engine.name()}."
+    )
+
+    def run(index: int, values: dict[str, str]):
+        name, analysis_file = render(index, values)
+
+        with reserved_cpus(cpus_per_variant) if cpus_per_variant else nullcontext():
+            logger.info(f"Running variant {name} ({index + 1}/{total}): {values}.")
+            try:
+                exit_code = run_variant(engine, analysis_file)
+            except Exception as exception:
+                logger.error(f"Variant {name} failed: {exception}")
+                state.record(name, values, "failed")
+                return
+
+        if exit_code:
+            logger.error(f"Variant {name} failed with exit code {exit_code}.")
+            state.record(name, values, "failed")
+        else:
+            state.record(name, values, "completed")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running: set[Future] = set()
+
+        # variants are submitted lazily, such that large grids are never rendered
+        # or queued up front
+        for index, values in itertools.chain([(first_index, first_values)], variants):
+            if state.status(f"{index:0{width}d}", values) == "completed":
+                continue
+
+            if len(running) >= max_workers:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+
+            running.add(executor.submit(run, index, values))
+
+        for future in running:
+            future.result()
+
+    return {name: variant["status"] for name, variant in state.variants.items()}
@@ -0,0 +1,166 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+from phylorun.engines.revBayes import RevBayes
+from phylorun.main import cli
+from phylorun.schedulers.scheduler import COMPLETED, FAILED, PENDING, RUNNING
+from phylorun.schedulers.slurm import Slurm
+from phylorun.utils.batch_utils import BatchJob, shared_outputs, submit_batch
+
+
+# stand-in for sbatch which runs all tasks of the array one after another and
+# records their exit codes for the sacct stand-in
+SBATCH = """#!{python}
+import json, os, re, subprocess, sys
+from pathlib import Path
+
+script = Path(sys.argv[-1])
+content = script.read_text()
+tasks = int(re.search(r"--array=0-(\\d+)", content).group(1)) + 1
+output = re.search(r"--output=(.*)", content).group(1)
+working_dir = re.search(r"--chdir=(.*)", content).group(1)
+
+exit_codes = []
+for task in range(tasks):
+    with open(output.replace("%a", str(task)), "w") as out:
+        exit_codes.append(subprocess.run(
+            ["bash", str(script)],
+            cwd=working_dir,
+            stdout=out,
+            stderr=subprocess.STDOUT,
+            env={{**os.environ, "SLURM_ARRAY_TASK_ID": str(task)}},
+        ).returncode)
+
+Path("{state_file}").write_text(json.dumps(exit_codes))
+print("4242;cluster")
+"""
+
+SACCT = """#!{python}
+import json
+from pathlib import Path
+
+for task, exit_code in enumerate(json.loads(Path("{state_file}").read_text())):
+    print(f"4242_{{task}}|{{'COMPLETED' if exit_code == 0 else 'FAILED'}}")
+"""
+
+
+def to_executable(path: Path, content: str) -> str:
+    path.write_text(content)
+    path.chmod(0o755)
+    return str(path)
+
+
+def stand_in_slurm(directory: Path) -> Slurm:
+    state_file = directory / "exit_codes.json"
+    return Slurm(
+        sbatch=to_executable(
+            directory / "sbatch",
+            SBATCH.format(python=sys.executable, state_file=state_file),
+        ),
+        sacct=to_executable(
+            directory / "sacct",
+            SACCT.format(python=sys.executable, state_file=state_file),
+        ),
+    )
+
+
+def test_sacct_states_are_mapped_to_task_states(tmp_path: Path):
+    slurm = Slurm(
+        sacct=to_executable(
+            tmp_path / "sacct",
+            "#!/bin/sh\n"
+            "echo '7_0|COMPLETED'\n"
+            "echo '7_1|CANCELLED by 1000'\n"
+            "echo '7_2|RUNNING'\n"
+            "echo '7_[4-5%2]|PENDING'\n",
+        )
+    )
+
+    assert slurm.task_states("7", 6) == [
+        COMPLETED,
+        FAILED,
+        RUNNING,
+        PENDING,
+        PENDING,
+        PENDING,
+    ]
+
+
+def test_job_script_selects_command_by_task_id(tmp_path: Path):
+    script = Slurm()._job_script(["echo 'a b'", "echo c"], tmp_path, "job", 4)
+
+    assert "#SBATCH --array=0-1%4" in script
+    assert 'eval "${COMMANDS[$SLURM_ARRAY_TASK_ID]}"' in script
+    assert "'echo '\"'\"'a b'\"'\"''" in script
+
+
+def test_batch_runs_analyses_as_job_array(tmp_path: Path):
+    engine_binary = to_executable(
+        tmp_path / "rb", '#!/bin/sh\ncase "$@" in *fail*) exit 3;; esac\necho ok\n'
+    )
+    analysis_files = []
+    for name in ["first.rev", "fail.rev"]:
+        analysis_files.append(tmp_path / name)
+        analysis_files[-1].write_text("")
+
+    job = submit_batch(
+        stand_in_slurm(tmp_path),
+        [(RevBayes(), analysis_file) for analysis_file in analysis_files],
+        tmp_path / "batch",
+        engine_path=engine_binary,
+    )
+
+    assert job.job_id == "4242"
+    assert job.wait(poll_interval=0) == [COMPLETED, FAILED]
+    assert "ok" in job.task_output(0).read_text()
+
+    loaded = BatchJob.load(tmp_path / "batch")
+    assert loaded.analysis_files == [str(f.resolve()) for f in analysis_files]
+    assert (
+        json.loads((tmp_path / "batch" / "batch.json").read_text())["scheduler"]
+        == "slurm"
+    )
+
+
+def test_rev_scripts_writing_the_same_outputs_are_not_submitted(tmp_path: Path):
+    analyses = []
+    for name, log in [("a.rev", "out.log"), ("b.rev", "out.log"), ("c.rev", "c.log")]:
+        (tmp_path / name).write_text(f'mnModel(filename="{log}", printgen=10)\n')
+        analyses.append((RevBayes(), tmp_path / name))
+
+    assert shared_outputs(analyses) == [Path("out.log").resolve()]
+    assert shared_outputs(analyses[1:]) == []
+
+    with pytest.raises(Exception, match="distinct file names"):
+        submit_batch(stand_in_slurm(tmp_path), analyses, tmp_path / "batch")
+
+
+def test_batch_status_command_reports_failures(tmp_path: Path, monkeypatch):
+    slurm = stand_in_slurm(tmp_path)
+    monkeypatch.setenv("SBATCH", slurm.sbatch)
+    monkeypatch.setenv("SACCT", slurm.sacct)
+
+    analysis_file = tmp_path / "fail.rev"
+    analysis_file.write_text("")
+    engine_binary = to_executable(tmp_path / "rb", "#!/bin/sh\nexit 3\n")
+
+    cli.main(
+        [
+            "batch",
+            "submit",
+            "--bin",
+            engine_binary,
+            "--job-dir",
+            str(tmp_path / "batch"),
+            str(analysis_file),
+        ],
+        standalone_mode=False,
+    )
+    exit_code = cli.main(
+        ["batch", "status", str(tmp_path / "batch")], standalone_mode=False
+    )
+
+    assert exit_code == 1
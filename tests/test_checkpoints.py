@@ -0,0 +1,115 @@
+from pathlib import Path
+from xml.etree import ElementTree
+
+import pytest
+
+from phylorun.engines.beast2 import BEAST2
+from phylorun.engines.beastX import BEASTX
+from phylorun.engines.revBayes import RevBayes
+
+
+BEAST2_STATE = """<itsabeastystatewerein version='2.0' sample='{sample}'>
+</itsabeastystatewerein>
+{{"operators": []}}
+"""
+
+REV_SCRIPT = """data <- readDiscreteCharacterData("data/primates.nex")
+mymodel = model(phylogeny)
+mymcmc = mcmc(mymodel, monitors, moves)
+    mymcmc.run(generations=10000, tuningInterval=200)
+"""
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def to_file(path: Path, content: str) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    return path
+
+
+def test_beast2_resumes_from_latest_complete_state(tmp_path: Path):
+    analysis_file = to_file(
+        tmp_path / "runs" / "analysis.xml",
+        '<beast version="2.7"><run id="mcmc" spec="MCMC"/></beast>',
+    )
+    to_file(tmp_path / "runs" / "analysis.xml.state", BEAST2_STATE.format(sample=5000))
+    to_file(tmp_path / "analysis.xml.state", BEAST2_STATE.format(sample=9000)[:40])
+
+    run_file, args = BEAST2().checkpointed_analysis(analysis_file, resume=True)
+
+    assert run_file == analysis_file
+    assert args == ["-statefile", "runs/analysis.xml.state", "-resume"]
+
+
+def test_beast2_writes_checkpoints_without_resuming(tmp_path: Path):
+    analysis_file = to_file(
+        tmp_path / "analysis.xml",
+        '<beast version="2.7"><run id="mcmc" spec="MCMC"/></beast>',
+    )
+
+    run_file, args = BEAST2().checkpointed_analysis(
+        analysis_file, resume=True, checkpoint_every=1000
+    )
+
+    assert args == ["-statefile", "analysis.xml.state"]
+    assert run_file.name == analysis_file.name
+    assert ElementTree.parse(run_file).find("run").get("storeEvery") == "1000"  # type: ignore
+
+
+def test_beastx_loads_most_advanced_checkpoint(tmp_path: Path):
+    analysis_file = to_file(tmp_path / "analysis.xml", "<beast/>")
+    to_file(tmp_path / "analysis.checkpoint_1000", "state\t1000\nlnL\t-10\n")
+    to_file(tmp_path / "analysis.checkpoint_2000", "state\t2000\nlnL\t-9\n")
+    # killed while writing
+    to_file(tmp_path / "analysis.checkpoint_3000", "state\t3000\nln")
+
+    _, args = BEASTX().checkpointed_analysis(
+        analysis_file, resume=True, checkpoint_every=1000
+    )
+
+    assert args == [
+        "-save_every",
+        "1000",
+        "-save_state",
+        "analysis.checkpoint",
+        "-load_state",
+        "analysis.checkpoint_2000",
+    ]
+
+
+def test_revbayes_script_writes_and_loads_checkpoints(tmp_path: Path):
+    analysis_file = to_file(tmp_path / "analysis.rev", REV_SCRIPT)
+    for name in ["analysis.state", "analysis_mcmc.state", "analysis_moves.state"]:
+        to_file(tmp_path / name, "checkpoint")
+
+    run_file, args = RevBayes().checkpointed_analysis(
+        analysis_file, resume=True, checkpoint_every=500
+    )
+
+    assert args == []
+    assert run_file != analysis_file
+    assert run_file.read_text().endswith(
+        '    mymcmc.initializeFromCheckpoint("analysis.state")\n'
+        "    mymcmc.run(generations=10000, tuningInterval=200, "
+        'checkpointFile="analysis.state", checkpointInterval=500)\n'
+    )
+
+
+def test_revbayes_ignores_incomplete_checkpoint(tmp_path: Path):
+    analysis_file = to_file(
+        tmp_path / "analysis.rev",
+        REV_SCRIPT.replace(
+            "tuningInterval=200", 'checkpointFile="out/run.state", checkpointInterval=5'
+        ),
+    )
+    to_file(tmp_path / "out" / "run.state", "checkpoint")
+
+    run_file, _ = RevBayes().checkpointed_analysis(analysis_file, resume=True)
+
+    script = run_file.read_text()
+    assert "initializeFromCheckpoint" not in script
+    assert 'checkpointFile="out/run.state", checkpointInterval=5)' in script
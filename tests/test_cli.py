@@ -0,0 +1,21 @@
+from pathlib import Path
+
+import click
+import pytest
+
+from phylorun.main import cli
+
+
+def test_analysis_file_runs_default_command(tmp_path: Path):
+    analysis_file = tmp_path / "analysis.rev"
+    analysis_file.write_text("")
+
+    with pytest.raises(click.ClickException, match="cannot run"):
+        cli.main(["--engine", "beast2", str(analysis_file)], standalone_mode=False)
+
+
+def test_prepare_without_stages_succeeds(tmp_path: Path):
+    analysis_file = tmp_path / "analysis.rev"
+    analysis_file.write_text("")
+
+    cli.main(["prepare", str(analysis_file)], standalone_mode=False)
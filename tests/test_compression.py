@@ -0,0 +1,170 @@
+import gzip
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from phylorun.engines.beast2 import BEAST2
+from phylorun.engines.revBayes import RevBayes
+from phylorun.main import cli
+from phylorun.utils.compression_utils import (
+    IncrementalDecompressor,
+    compressed_outputs,
+    open_output,
+)
+from phylorun.utils.log_utils import read_log_column
+
+
+LOG = "Sample\tposterior\n0\t-10.5\n1000\t-9.5\n"
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def write_like_engine(path: Path, parts: list[str]):
+    # engines may close and reopen their outputs, e.g. between two runs
+    for part in parts:
+        with open(path, "a") as output:
+            output.write(part)
+
+
+@pytest.mark.parametrize("method", ["gzip", "zstd"])
+def test_outputs_are_compressed_while_written(tmp_path: Path, method: str):
+    if method == "zstd":
+        pytest.importorskip("zstandard")
+
+    log_file = tmp_path / "output" / "run.log"
+    tree_file = tmp_path / "output" / "run.trees"
+
+    with compressed_outputs([log_file, tree_file], method) as compressed:
+        writers = [
+            threading.Thread(target=write_like_engine, args=(log_file, [LOG])),
+            threading.Thread(
+                target=write_like_engine, args=(tree_file, ["tree 1;\n", "tree 2;\n"])
+            ),
+        ]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+
+    assert not log_file.exists() and not tree_file.exists()
+    assert [path.name for path in compressed] == [
+        f"run.log{compressed[0].suffix}",
+        f"run.trees{compressed[1].suffix}",
+    ]
+
+    with open_output(tree_file) as trees:
+        assert trees.read() == "tree 1;\ntree 2;\n"
+    assert read_log_column(log_file, "posterior") == [-10.5, -9.5]
+
+
+@pytest.mark.parametrize("method", ["gzip", "zstd"])
+def test_outputs_of_running_engines_can_be_followed(tmp_path: Path, method: str):
+    if method == "zstd":
+        pytest.importorskip("zstandard")
+
+    log_file = tmp_path / "run.log"
+
+    with compressed_outputs([log_file], method) as (compressed,):
+        with open(log_file, "w") as output:
+            output.write(LOG)
+            output.flush()
+
+            # the engine keeps the log open while the dashboard reads it
+            deadline = time.monotonic() + 10
+            decompressed = b""
+            while LOG.encode() not in decompressed and time.monotonic() < deadline:
+                time.sleep(0.2)
+                decompressed = IncrementalDecompressor(compressed).decompress(
+                    compressed.read_bytes()
+                )
+
+            assert decompressed == LOG.encode()
+
+
+def test_unused_outputs_are_removed(tmp_path: Path):
+    with compressed_outputs([tmp_path / "unused.log"]):
+        pass
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_existing_outputs_are_not_replaced(tmp_path: Path):
+    (tmp_path / "run.log").write_text(LOG)
+
+    with pytest.raises(Exception, match="already exists"):
+        with compressed_outputs([tmp_path / "run.log"]):
+            pass
+
+
+def test_beast2_output_files_are_read_from_loggers(tmp_path: Path):
+    analysis_file = tmp_path / "analysis.xml"
+    analysis_file.write_text(
+        """<beast version="2.7"><run spec="MCMC">
+            <logger id="tracelog" fileName="$(filebase).log"/>
+            <logger id="treelog" fileName="$(filebase)-$(seed).trees"/>
+            <logger id="screenlog"/>
+        </run></beast>"""
+    )
+
+    assert BEAST2().output_files(analysis_file) == [Path("analysis.log")]
+    assert BEAST2().output_files(analysis_file, ["-working"]) == [
+        tmp_path / "analysis.log"
+    ]
+
+
+def test_beast2_tree_logger_names_are_resolved(tmp_path: Path):
+    analysis_file = tmp_path / "analysis.xml"
+    analysis_file.write_text(
+        """<beast version="2.7"><run spec="MCMC">
+            <logger id="treelog.t:first" fileName="$(filebase)-$(tree).trees">
+                <log id="TreeWithMetaDataLogger.t:first"
+                    spec="beast.base.evolution.TreeWithMetaDataLogger"
+                    tree="@Tree.t:first"/>
+            </logger>
+            <logger id="treelog.t:second" fileName="$(tree).trees">
+                <log idref="Tree.t:second"/>
+            </logger>
+        </run></beast>"""
+    )
+
+    assert BEAST2().output_files(analysis_file) == [
+        Path("analysis-Tree.t:first.trees"),
+        Path("Tree.t:second.trees"),
+    ]
+
+
+def test_compressed_local_rev_run(tmp_path: Path):
+    analysis_file = tmp_path / "analysis.rev"
+    analysis_file.write_text(
+        'monitors.append( mnModel(filename="output/run.log", printgen=10) )\n'
+        'monitors.append( mnFile(tree, filename="output/run.trees") )\n'
+        "mymcmc.run(generations=100)\n"
+    )
+    assert RevBayes().output_files(analysis_file) == [
+        Path("output/run.log"),
+        Path("output/run.trees"),
+    ]
+
+    engine_binary = tmp_path / "rb"
+    engine_binary.write_text(
+        f"#!/bin/sh\nprintf '{LOG}' > output/run.log\necho 'tree 1;' > output/run.trees\n"
+    )
+    engine_binary.chmod(0o755)
+
+    cli.main(
+        ["--compress", "gzip", "--bin", str(engine_binary), str(analysis_file)],
+        standalone_mode=False,
+    )
+
+    assert gzip.decompress((tmp_path / "output" / "run.log.gz").read_bytes()) == (
+        LOG.encode()
+    )
+    assert read_log_column(tmp_path / "output" / "run.log", "posterior") == [
+        -10.5,
+        -9.5,
+    ]
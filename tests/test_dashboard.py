@@ -0,0 +1,153 @@
+import gzip
+import math
+from pathlib import Path
+
+import click
+import numpy as np
+
+from phylorun.main import cli
+from phylorun.utils.convergence_utils import effective_sample_size, split_r_hat
+from phylorun.utils.dashboard_utils import RunMonitor, render_dashboard
+from phylorun.utils.log_utils import LogTail
+
+
+HEADER = "# a comment\nSample\tposterior\tlikelihood\n"
+
+
+def log_lines(start: int, count: int, rng: np.random.Generator) -> str:
+    return "".join(
+        f"{state}\t{rng.normal(-100, 1):.4f}\t{rng.normal(-90, 1):.4f}\n"
+        for state in range(start * 1000, (start + count) * 1000, 1000)
+    )
+
+
+def test_log_tail_keeps_incomplete_lines(tmp_path: Path):
+    log_file = tmp_path / "run.log"
+    log_file.write_text(HEADER + "0\t-1.5\t-1.0\n1000\t-1.")
+
+    tail = LogTail(log_file)
+    assert tail.read() == [[0, -1.5, -1.0]]
+    assert tail.header == ["Sample", "posterior", "likelihood"]
+
+    with open(log_file, "a") as file:
+        file.write("25\t-1.2\n2000\t-1.1\t-0.9\n")
+
+    assert tail.read() == [[1000, -1.25, -1.2], [2000, -1.1, -0.9]]
+    assert tail.read() == []
+
+
+def test_log_tail_decompresses_members_split_across_reads(tmp_path: Path):
+    log_file = tmp_path / "run.log"
+    compressed_log = tmp_path / "run.log.gz"
+
+    # the engine reopened the log once, which created a second gzip member
+    first_member = gzip.compress(HEADER.encode() + b"0\t-1.5\t-1.0\n")
+    data = first_member + gzip.compress(b"1000\t-1.4\t-0.9\n")
+    tail = LogTail(log_file)
+
+    compressed_log.write_bytes(data[:15])
+    assert tail.read() == []
+
+    compressed_log.write_bytes(data[: len(first_member) + 5])
+    assert tail.read() == [[0, -1.5, -1.0]]
+
+    compressed_log.write_bytes(data)
+    assert tail.read() == [[1000, -1.4, -0.9]]
+
+
+def test_log_tail_restarts_for_replaced_logs(tmp_path: Path):
+    log_file = tmp_path / "run.log"
+    log_file.write_text(HEADER + "0\t-1.5\t-1.0\n1000\t-1.4\t-0.9\n")
+
+    tail = LogTail(log_file)
+    assert len(tail.read()) == 2
+
+    log_file.write_text(HEADER + "0\t-2.5\t-2.0\n")
+    assert tail.read() == [[0, -2.5, -2.0]]
+    assert tail.restarts == 1
+
+
+def test_effective_sample_size_of_autocorrelated_chain():
+    noise = np.random.default_rng(2).normal(size=20000)
+    samples = np.zeros(len(noise))
+    for i in range(1, len(samples)):
+        samples[i] = 0.9 * samples[i - 1] + noise[i]
+
+    # the ESS of an AR(1) process is n * (1 - phi) / (1 + phi)
+    expected = len(samples) * 0.1 / 1.9
+    assert abs(effective_sample_size(samples) - expected) < 0.25 * expected
+
+    assert math.isnan(effective_sample_size(np.ones(100)))
+
+
+def test_split_r_hat_detects_chains_which_did_not_mix():
+    rng = np.random.default_rng(42)
+
+    mixed = [rng.normal(size=1000) for _ in range(4)]
+    assert abs(split_r_hat(mixed) - 1) < 0.01
+
+    unmixed = [rng.normal(size=1000) + shift for shift in range(4)]
+    assert split_r_hat(unmixed) > 1.1
+
+
+def test_run_monitor_reads_incrementally(tmp_path: Path):
+    rng = np.random.default_rng(42)
+    log_file = tmp_path / "run.log"
+    log_file.write_text(HEADER + log_lines(0, 300, rng))
+
+    monitor = RunMonitor(log_file)
+    monitor.refresh()
+    assert monitor.state == 299000
+    ess = monitor.ess("Posterior")
+
+    with open(log_file, "a") as file:
+        file.write(log_lines(300, 300, rng))
+
+    monitor.refresh()
+    assert monitor.state == 599000
+    assert len(monitor.samples("likelihood", burnin=0.5)) == 300
+    assert monitor.ess("posterior") != ess
+    assert monitor.ess("unknown") is None
+    assert monitor.states_per_second() is not None
+
+
+def test_render_dashboard_highlights_low_ess(tmp_path: Path):
+    rng = np.random.default_rng(42)
+    monitors = []
+    for run, count in (("a", 500), ("b", 50)):
+        (tmp_path / f"{run}.log").write_text(HEADER + log_lines(0, count, rng))
+        monitors.append(RunMonitor(tmp_path / f"{run}.log"))
+        monitors[-1].refresh()
+    monitors.append(RunMonitor(tmp_path / "missing.log"))
+    monitors[-1].refresh()
+
+    table = render_dashboard(monitors, ["posterior"])
+    lines = table.splitlines()
+
+    red = "\x1b[31m"
+    assert red in lines[2]
+    assert red not in lines[1]
+    assert "waiting" in lines[3]
+    assert lines[4].startswith("R-hat")
+
+
+def test_dashboard_command_prints_once(tmp_path: Path, capsys):
+    rng = np.random.default_rng(42)
+    log_files = []
+    for run in ("a", "b"):
+        log_file = tmp_path / run / "model.log"
+        log_file.parent.mkdir()
+        with gzip.open(str(log_file) + ".gz", "wt") as file:
+            file.write(HEADER + log_lines(0, 400, rng))
+        log_files.append(str(log_file))
+
+    exit_code = cli.main(
+        ["dashboard", "--once", "-p", "likelihood", *log_files],
+        standalone_mode=False,
+    )
+
+    output = click.unstyle(capsys.readouterr().out)
+    assert not exit_code
+    assert "ESS likelihood" in output
+    assert "399,000" in output
+    assert "R-hat" in output
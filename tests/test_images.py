@@ -0,0 +1,87 @@
+from pathlib import Path
+
+from docker.errors import ImageNotFound
+
+from phylorun import main
+from phylorun.engines import ENGINES
+from phylorun.main import cli, engine_images
+from phylorun.utils import docker_utils
+from phylorun.utils.docker_utils import BASE_IMAGE_NAME, _parent_image, build_images
+
+
+def test_engine_images_share_base_image():
+    images = dict(engine_images())
+
+    assert len(images) == len(ENGINES)
+    for image_name, docker_file in images.items():
+        parent = _parent_image(docker_file)
+        assert parent == BASE_IMAGE_NAME or parent in images
+
+
+def test_images_are_built_after_their_parent(monkeypatch):
+    built = []
+
+    monkeypatch.setattr(docker_utils, "get_docker_client", lambda: None)
+    monkeypatch.setattr(docker_utils, "image_exists", lambda client, name: False)
+    monkeypatch.setattr(
+        docker_utils,
+        "build_image",
+        lambda client, image_name, docker_file: built.append(image_name),
+    )
+
+    result = build_images(engine_images())
+
+    assert sorted(result) == sorted(built)
+    assert built[0] == BASE_IMAGE_NAME
+    assert built.index("beast2:2.7.7") < built.index("lphybeast:2.7.7")
+
+
+def test_existing_images_are_not_rebuilt(monkeypatch):
+    built = []
+
+    monkeypatch.setattr(docker_utils, "get_docker_client", lambda: None)
+    monkeypatch.setattr(
+        docker_utils, "image_exists", lambda client, name: name != "revbayes:1.3.1"
+    )
+    monkeypatch.setattr(
+        docker_utils,
+        "build_image",
+        lambda client, image_name, docker_file: built.append(image_name),
+    )
+
+    assert build_images(engine_images()) == ["revbayes:1.3.1"]
+
+
+def test_pulled_images_are_exported_without_base_image(tmp_path: Path, monkeypatch):
+    local_images = set()
+    exported = []
+
+    class FakeImage:
+        def __init__(self, name: str):
+            self.name = name
+
+        def tag(self, image_name: str):
+            local_images.add(image_name)
+
+    class FakeImages:
+        def pull(self, name: str, platform: str):
+            return FakeImage(name)
+
+        def get(self, name: str):
+            if name not in local_images:
+                raise ImageNotFound(name)
+
+    class FakeClient:
+        images = FakeImages()
+
+    monkeypatch.setattr(docker_utils, "get_docker_client", FakeClient)
+    monkeypatch.setattr(main, "get_docker_client", FakeClient)
+    monkeypatch.setattr(
+        main, "export_images", lambda client, names, path: exported.extend(names)
+    )
+
+    cli.main(["images", "pull", "--registry", "ghcr.io/lab"], standalone_mode=False)
+    cli.main(["images", "export", str(tmp_path / "images.tar")], standalone_mode=False)
+
+    assert sorted(exported) == sorted(name for name, _ in engine_images())
+    assert BASE_IMAGE_NAME not in exported
@@ -0,0 +1,21 @@
+from pathlib import Path
+
+from phylorun.engines.lphy import LPhy
+
+
+def test_lphy_pipeline_keeps_xml_in_container(tmp_path: Path):
+    script = LPhy()._containerized_pipeline(tmp_path / "model.lphy", [], ["-resume"])
+
+    assert "-o /tmp/phylorun/model.xml /data/model.lphy" in script
+    assert "/opt/beast/bin/beast -resume /tmp/phylorun/model.xml" in script
+    assert "ConvertToLPhy" not in script
+
+
+def test_phylospec_pipeline_converts_inside_container(tmp_path: Path):
+    script = LPhy()._containerized_pipeline(tmp_path / "model.phylospec", [], [])
+
+    assert (
+        "ConvertToLPhy /data/model.phylospec > /tmp/phylorun/model_converted.lphy"
+        in script
+    )
+    assert "/opt/beast/bin/beast /tmp/phylorun/model_converted.xml" in script
@@ -0,0 +1,177 @@
+import math
+import random
+from pathlib import Path
+from xml.etree import ElementTree
+
+from phylorun.engines.beast2 import BEAST2
+from phylorun.engines.revBayes import RevBayes
+from phylorun.utils.log_utils import read_log_column
+from phylorun.utils.marginal_likelihood_utils import (
+    beta_schedule,
+    estimate_marginal_likelihood,
+    stepping_stone_estimate,
+)
+
+
+def test_beta_schedule_spans_prior_to_posterior():
+    betas = beta_schedule(4, alpha=0.3)
+
+    assert betas[0] == 0 and betas[-1] == 1
+    assert betas == sorted(betas)
+    assert betas[1] < 0.25
+
+
+def test_stepping_stone_matches_analytic_marginal_likelihood():
+    # prior theta ~ N(0, 1), likelihood y ~ N(theta, 1), such that the power
+    # posteriors are normal and the marginal likelihood is N(y | 0, 2)
+    rng = random.Random(1)
+    y = 1.5
+    betas = beta_schedule(32)
+
+    def log_likelihood(theta: float) -> float:
+        return -0.5 * math.log(2 * math.pi) - 0.5 * (y - theta) ** 2
+
+    samples = []
+    for beta in betas[:-1]:
+        mean = beta * y / (1 + beta)
+        sd = math.sqrt(1 / (1 + beta))
+        samples.append([log_likelihood(rng.gauss(mean, sd)) for _ in range(2000)])
+
+    estimate, contributions = stepping_stone_estimate(betas, samples)
+
+    expected = -0.5 * math.log(2 * math.pi * 2) - y**2 / 4
+    assert abs(estimate - expected) < 0.05
+    assert len(contributions) == 32
+
+
+def test_beast2_step_runs_path_sampling_step(tmp_path: Path):
+    analysis_file = tmp_path / "analysis.xml"
+    analysis_file.write_text(
+        """<beast version="2.7">
+            <data id="alignment"></data>
+            <run id="mcmc" spec="MCMC" chainLength="1000000">
+                <distribution id="posterior" spec="CompoundDistribution">
+                    <distribution id="likelihood" spec="CompoundDistribution"/>
+                </distribution>
+            </run>
+        </beast>"""
+    )
+    step_dir = tmp_path / "step_1"
+    step_dir.mkdir()
+
+    step_file, args = BEAST2().power_posterior_step(analysis_file, 0.125, step_dir)
+
+    run = ElementTree.parse(step_file).getroot().find("run")
+    assert run is not None
+    assert run.get("spec") == "modelselection.inference.PathSamplingStep"
+    assert float(run.get("beta", "")) == 0.125
+    assert run.find("logger/log").get("idref") == "likelihood"
+    assert "-working" in args
+
+    step_file, _ = BEAST2().power_posterior_step(
+        analysis_file, 0.125, step_dir, chain_length=50000
+    )
+    run = ElementTree.parse(step_file).getroot().find("run")
+    assert run is not None and run.get("chainLength") == "50000"
+
+
+def test_rev_step_runs_single_stone(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analysis_file = tmp_path / "analysis.rev"
+    analysis_file.write_text(
+        'pow_p = powerPosterior(mymodel, moves, monitors, "output/ml.out", '
+        "cats=50, sampleFreq=c(10)[1])\n"
+        "pow_p.run(generations=1000)\n"
+    )
+    step_dir = Path("ml") / "step_2"
+    step_dir.mkdir(parents=True)
+
+    step_file, _ = RevBayes().power_posterior_step(analysis_file, 0.5, step_dir)
+
+    assert step_file.read_text() == (
+        'pow_p = powerPosterior(mymodel, moves, monitors, "ml/step_2/power_posterior.out", '
+        "sampleFreq=c(10)[1], powers=[0.5000000000])\n"
+        "pow_p.run(generations=1000)\n"
+    )
+
+
+def test_rev_step_drops_samplers_and_sets_generations(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analysis_file = tmp_path / "analysis.rev"
+    analysis_file.write_text(
+        'pow_p = powerPosterior(mymodel, moves, monitors, "output/ml.out", cats=50)\n'
+        "pow_p.burnin(generations=1000, tuningInterval=100)\n"
+        "pow_p.run(1000, tuning=2)\n"
+        'ss = steppingStoneSampler(file="output/ml.out", powerColumnName="power",\n'
+        '    likelihoodColumnName="likelihood")\n'
+        "print(ss.marginal())\n"
+        'pathSampler(file="output/ml.out").marginal()\n'
+        "q()\n"
+    )
+    step_dir = Path("step_0")
+    step_dir.mkdir()
+
+    step_file, _ = RevBayes().power_posterior_step(
+        analysis_file, 0.0, step_dir, chain_length=200
+    )
+
+    assert step_file.read_text() == (
+        'pow_p = powerPosterior(mymodel, moves, monitors, "step_0/power_posterior.out", '
+        "powers=[0.0000000000])\n"
+        "pow_p.burnin(generations=1000, tuningInterval=100)\n"
+        "pow_p.run(generations=200, tuning=2)\n"
+        "q()\n"
+    )
+
+
+def test_rev_power_posterior_output_is_read(tmp_path: Path):
+    (tmp_path / "power_posterior.out").write_text(
+        "state\tpower\tlikelihood\n0\t0.5\t-10.5\n10\t0.5\t-9.5\n"
+    )
+
+    assert RevBayes().read_power_posterior_log_likelihoods(tmp_path) == [-10.5, -9.5]
+
+
+def test_log_column_skips_comments_and_burnin(tmp_path: Path):
+    log_file = tmp_path / "trace.log"
+    log_file.write_text(
+        "# BEAST v2.7.7\nSample\tposterior\n0\t-20\n1\t-15\n2\t-12\n3\t-11\n4\t-1"
+    )
+
+    assert read_log_column(log_file, "posterior", burnin=0.5) == [-12, -11, -1]
+
+
+class ConstantLikelihoodEngine(RevBayes):
+    """Writes a constant log likelihood for every step instead of running RevBayes."""
+
+    def power_posterior_step(self, analysis_file, beta, step_dir, chain_length=None):
+        step_file = step_dir / "step.rev"
+        step_file.write_text("")
+        return step_file, ["--constant"]
+
+    def read_power_posterior_log_likelihoods(self, step_dir):
+        return read_log_column(step_dir / "likelihood.log", "likelihood")
+
+
+def test_steps_are_run_and_combined(tmp_path: Path):
+    runs = []
+
+    def run_step(step_file: Path, args: list[str]):
+        runs.append(args)
+        # the first sample is discarded as burnin
+        (step_file.parent / "likelihood.log").write_text(
+            "likelihood\n-1000\n" + "-7\n" * 9
+        )
+
+    estimate, _ = estimate_marginal_likelihood(
+        ConstantLikelihoodEngine(),
+        tmp_path / "analysis.rev",
+        tmp_path / "ml",
+        run_step,
+        steps=8,
+        burnin=0.1,
+        max_workers=4,
+    )
+
+    assert runs == [["--constant"]] * 8
+    assert abs(estimate - (-7)) < 1e-9
@@ -0,0 +1,127 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from phylorun.main import cli
+from phylorun.utils.pipeline_utils import Pipeline, Stage
+
+
+def copy_stage(name: str, source: Path, target: Path, calls: list[str]) -> Stage:
+    def action():
+        calls.append(name)
+        target.write_text(source.read_text())
+
+    return Stage(name, inputs=[source], output=target, action=action)
+
+
+def test_up_to_date_stages_are_skipped(tmp_path: Path):
+    source = tmp_path / "model.phylospec"
+    source.write_text("model")
+    calls = []
+
+    stages = [
+        copy_stage("convert", source, tmp_path / "model.lphy", calls),
+        copy_stage("generate", tmp_path / "model.lphy", tmp_path / "model.xml", calls),
+    ]
+
+    Pipeline(stages).run()
+    Pipeline(stages).run()
+
+    assert calls == ["convert", "generate"]
+
+
+def test_changed_inputs_rerun_dependent_stages(tmp_path: Path):
+    source = tmp_path / "model.phylospec"
+    source.write_text("model")
+    calls = []
+
+    stages = [
+        copy_stage("convert", source, tmp_path / "model.lphy", calls),
+        copy_stage("generate", tmp_path / "model.lphy", tmp_path / "model.xml", calls),
+    ]
+
+    Pipeline(stages).run()
+    source.write_text("changed model")
+    Pipeline(stages).run()
+
+    assert calls == ["convert", "generate", "convert", "generate"]
+    assert (tmp_path / "model.xml").read_text() == "changed model"
+
+
+def test_stages_without_output_always_run(tmp_path: Path):
+    calls = []
+    stage = Stage("run", inputs=[], output=None, action=lambda: calls.append("run"))
+
+    Pipeline([stage]).run()
+    Pipeline([stage]).run()
+
+    assert calls == ["run", "run"]
+
+
+def test_independent_stages_run_in_parallel(tmp_path: Path):
+    source = tmp_path / "model.phylospec"
+    source.write_text("model")
+    barrier = threading.Barrier(2, timeout=5)
+
+    def action(target: Path):
+        barrier.wait()
+        target.write_text("")
+
+    stages = [
+        Stage(
+            "convert to " + suffix,
+            inputs=[source],
+            output=tmp_path / f"model.{suffix}",
+            action=lambda suffix=suffix: action(tmp_path / f"model.{suffix}"),
+        )
+        for suffix in ["lphy", "rev"]
+    ]
+
+    Pipeline(stages).run()
+
+
+def test_failing_stage_stops_pipeline(tmp_path: Path):
+    calls = []
+
+    def fail():
+        raise Exception("conversion failed")
+
+    stages = [
+        Stage("convert", inputs=[], output=tmp_path / "model.lphy", action=fail),
+        Stage(
+            "run",
+            inputs=[tmp_path / "model.lphy"],
+            output=None,
+            action=lambda: calls.append("run"),
+        ),
+    ]
+
+    with pytest.raises(Exception, match="conversion failed"):
+        Pipeline(stages).run()
+
+    assert calls == []
+
+
+def test_prepared_lphy_xml_is_reused_by_run(tmp_path: Path, monkeypatch):
+    lphy_file = tmp_path / "model.lphy"
+    lphy_file.write_text("model")
+    calls = tmp_path / "calls"
+
+    # stands in for lphybeast when given an LPhy file, and for BEAST 2 otherwise
+    engine_binary = tmp_path / "engine"
+    engine_binary.write_text(
+        "#!/bin/sh\n"
+        "for last; do :; done\n"
+        'case "$last" in\n'
+        f'  *.lphy) echo lphybeast >> {calls}; echo "<beast/>" > "${{last%.lphy}}.xml" ;;\n'
+        f"  *) echo beast >> {calls} ;;\n"
+        "esac\n"
+    )
+    engine_binary.chmod(0o755)
+    monkeypatch.setenv("BEAST", str(engine_binary))
+
+    cli.main(["prepare", str(lphy_file)], standalone_mode=False)
+    cli.main([str(lphy_file)], standalone_mode=False)
+
+    assert calls.read_text().split() == ["lphybeast", "beast"]
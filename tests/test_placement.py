@@ -0,0 +1,103 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from phylorun.utils import placement_utils
+from phylorun.utils.docker_utils import start_container
+from phylorun.utils.placement_utils import (
+    default_placement_file,
+    format_cpu_list,
+    parse_cpu_list,
+    reserved_cpus,
+    select_cpus,
+)
+
+
+def test_cpu_lists_are_parsed_and_formatted():
+    assert parse_cpu_list("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+    assert format_cpu_list([11, 0, 1, 2, 3, 8, 10]) == "0-3,8,10-11"
+
+
+def test_runs_are_spread_over_numa_nodes():
+    nodes = {0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}
+
+    assert select_cpus(nodes, reserved=set(), count=2) == [0, 1]
+    assert select_cpus(nodes, reserved={0, 1}, count=2) == [4, 5]
+    assert select_cpus(nodes, reserved={0, 1, 4, 5}, count=2) == [2, 3]
+
+
+def test_runs_span_nodes_only_if_needed():
+    nodes = {0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}
+
+    assert select_cpus(nodes, reserved={0, 1, 4}, count=4) == [5, 6, 7, 2]
+    assert select_cpus(nodes, reserved={0, 1, 4, 5}, count=5) is None
+
+
+def test_reservations_do_not_overlap(tmp_path: Path, monkeypatch):
+    placement_file = tmp_path / "placements.json"
+    affinity = []
+
+    monkeypatch.setattr(placement_utils, "PROCESS_CPUS", {0, 1, 2, 3})
+    monkeypatch.setattr(placement_utils, "NUMA_NODES_DIR", tmp_path / "no-numa")
+    monkeypatch.setattr(
+        os, "sched_setaffinity", lambda pid, cpus: affinity.append(cpus)
+    )
+
+    with reserved_cpus(2, placement_file) as first:
+        with reserved_cpus(2, placement_file) as second:
+            assert sorted(first + second) == [0, 1, 2, 3]
+            assert affinity == [first, second]
+
+            with pytest.raises(Exception, match="only 4 are available"):
+                with reserved_cpus(5, placement_file):
+                    pass
+
+    assert json.loads(placement_file.read_text()) == {}
+
+
+def test_placement_file_is_shared_by_all_users(tmp_path: Path, monkeypatch):
+    monkeypatch.delenv("PHYLORUN_PLACEMENT_FILE", raising=False)
+    assert default_placement_file().name == "phylorun-placements.json"
+
+    placement_file = tmp_path / "shared" / "placements.json"
+    monkeypatch.setenv("PHYLORUN_PLACEMENT_FILE", str(placement_file))
+    assert default_placement_file() == placement_file
+
+    monkeypatch.setattr(placement_utils, "PROCESS_CPUS", {0, 1})
+    monkeypatch.setattr(placement_utils, "NUMA_NODES_DIR", tmp_path / "no-numa")
+    monkeypatch.setattr(os, "sched_setaffinity", lambda pid, cpus: None)
+    old_umask = os.umask(0o022)
+    try:
+        with reserved_cpus(1):
+            pass
+    finally:
+        os.umask(old_umask)
+
+    assert placement_file.stat().st_mode & 0o777 == 0o666
+    assert placement_file.with_suffix(".lock").stat().st_mode & 0o777 == 0o666
+
+
+def test_containers_are_only_pinned_to_reserved_cpus(tmp_path: Path, monkeypatch):
+    class FakeContainers:
+        def run(self, image_name, command, **kwargs):
+            return kwargs
+
+    class FakeClient:
+        containers = FakeContainers()
+
+    monkeypatch.setattr(placement_utils, "PROCESS_CPUS", {0, 1, 2, 3})
+    monkeypatch.setattr(placement_utils, "NUMA_NODES_DIR", tmp_path / "no-numa")
+    monkeypatch.setattr(os, "sched_setaffinity", lambda pid, cpus: None)
+    # the affinity of the process, as set by SLURM or taskset
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: {0, 1})
+
+    assert "cpuset_cpus" not in start_container(FakeClient(), "image")  # type: ignore
+
+    with reserved_cpus(2, tmp_path / "placements.json"):
+        # the quota estimated for a single partition does not apply
+        kwargs = start_container(FakeClient(), "image", nano_cpus=10**9)  # type: ignore
+    assert kwargs["cpuset_cpus"] == "0-1"
+    assert kwargs["cpuset_mems"] == "0"
+    assert kwargs["nano_cpus"] == 2 * 10**9
@@ -0,0 +1,224 @@
+import json
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import click
+import pytest
+
+from phylorun import main
+from phylorun.main import cli
+from phylorun.utils import preflight_utils, resource_utils
+from phylorun.utils.preflight_utils import (
+    history_file,
+    parse_duration,
+    parse_memory_mb,
+    predict_run,
+    record_run,
+)
+from phylorun.utils.resource_utils import SitePatternHasher, summarize_analysis
+
+
+BEAST2_ANALYSIS = """<beast version="2.7">
+    <data id="first" dataType="nucleotide">
+        <sequence taxon="A" value="ACGTAACGTA"/>
+        <sequence taxon="B" value="ACGTTACGTT"/>
+        <sequence taxon="C" value="ACGAAACGAA"/>
+    </data>
+    <run id="mcmc" spec="MCMC" chainLength="5000000">
+        <siteModel gammaCategoryCount="4"/>
+    </run>
+</beast>"""
+
+
+def to_file(text: str, path: Path) -> Path:
+    path.write_text(text)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path: Path, monkeypatch) -> Path:
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+def count_site_patterns(sequences: list[str]) -> int:
+    hasher = SitePatternHasher()
+    for sequence in sequences:
+        hasher.add(sequence)
+
+    return hasher.count_patterns()
+
+
+def test_site_patterns_are_counted_with_padding():
+    assert count_site_patterns(["ACGT", "ACGA", "ACGT"]) == 4
+    assert count_site_patterns(["AAAA", "AA", "AAAAAA"]) == 3
+    assert count_site_patterns(["A-", "A"]) == 2
+
+
+def test_chain_length_is_read(tmp_path: Path):
+    beast2 = to_file(BEAST2_ANALYSIS, tmp_path / "beast2.xml")
+    beastx = to_file(
+        """<beast version="10.5.0">
+            <alignment id="alignment"><sequence><taxon idref="A"/>ACGT</sequence>
+            <sequence><taxon idref="B"/>ACCT</sequence></alignment>
+            <mcmc id="mcmc" chainLength="1E7" autoOptimize="true"></mcmc>
+        </beast>""",
+        tmp_path / "beastx.xml",
+    )
+
+    summary = summarize_analysis(beast2)
+    assert summary.chain_length == 5000000
+    assert [(p.taxa, p.sites, p.patterns) for p in summary.partitions] == [(3, 10, 5)]
+    assert summarize_analysis(beastx).chain_length == 10**7
+
+
+def test_predictions_are_calibrated_on_past_runs(tmp_path: Path):
+    analysis_file = to_file(BEAST2_ANALYSIS, tmp_path / "analysis.xml")
+
+    uncalibrated = predict_run("beast2", analysis_file)
+    assert uncalibrated and uncalibrated.seconds
+    assert uncalibrated.calibration_runs == 0
+    assert uncalibrated.operations_per_state == 2 * 5 * 4 * 16
+
+    record_run(uncalibrated, seconds=3 * uncalibrated.seconds, peak_memory_mb=300)
+    record_run(uncalibrated, seconds=4 * uncalibrated.seconds, peak_memory_mb=400)
+    record_run(uncalibrated, seconds=5 * uncalibrated.seconds, peak_memory_mb=500)
+    history_file().write_text(history_file().read_text() + '{"engine": "beast2", ')
+
+    calibrated = predict_run("beast2", analysis_file)
+    assert calibrated and calibrated.seconds
+    assert calibrated.calibration_runs == 3
+    assert calibrated.seconds == pytest.approx(4 * uncalibrated.seconds, rel=1e-3)
+    assert calibrated.memory_mb == 400
+
+    # runs of other engines are not used
+    other = predict_run("beastx", analysis_file)
+    assert other and other.calibration_runs == 0
+
+
+def test_limits_are_parsed():
+    assert parse_memory_mb("16G") == 16 * 1024
+    assert parse_memory_mb("512mb") == 512
+    assert parse_memory_mb("2048") == 2048
+    assert parse_duration("48h") == 48 * 3600
+    assert parse_duration("90m") == 5400
+    assert parse_duration("1-12:00:00") == 36 * 3600
+    assert parse_duration("30:00") == 1800
+
+    with pytest.raises(Exception):
+        parse_memory_mb("lots")
+
+
+def test_preflight_command_checks_limits(tmp_path: Path, capsys):
+    analysis_file = to_file(BEAST2_ANALYSIS, tmp_path / "analysis.xml")
+
+    assert not cli.main(
+        ["preflight", "--max-memory", "64G", str(analysis_file)],
+        standalone_mode=False,
+    )
+    output = capsys.readouterr().out
+    assert "first\t3\t10\t5\t4" in output
+    assert "chain length: 5000000" in output
+
+    assert (
+        cli.main(
+            ["preflight", "--max-memory", "1G", "--max-time", "1s", str(analysis_file)],
+            standalone_mode=False,
+        )
+        == 1
+    )
+    output = click.unstyle(capsys.readouterr().out)
+    assert "limit is 1024 MB" in output
+    assert "limit is 1s" in output
+
+
+def test_run_fails_before_exceeding_limits(tmp_path: Path):
+    analysis_file = to_file(BEAST2_ANALYSIS, tmp_path / "analysis.xml")
+    marker = tmp_path / "ran"
+    engine_binary = tmp_path / "beast"
+    engine_binary.write_text(f"#!/bin/sh\ntouch {marker}\n")
+    engine_binary.chmod(0o755)
+
+    with pytest.raises(click.ClickException, match="memory"):
+        cli.main(
+            ["--max-memory", "100M", "--bin", str(engine_binary), str(analysis_file)],
+            standalone_mode=False,
+        )
+    assert not marker.exists()
+    assert not history_file().exists()
+
+    cli.main(["--bin", str(engine_binary), str(analysis_file)], standalone_mode=False)
+
+    assert marker.exists()
+    (run,) = [json.loads(line) for line in history_file().read_text().splitlines()]
+    assert run["engine"] == "beast2"
+    assert run["chain_length"] == 5000000
+
+
+def test_history_is_limited_to_recent_runs(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(preflight_utils, "CALIBRATION_RUNS", 2)
+    analysis_file = to_file(BEAST2_ANALYSIS, tmp_path / "analysis.xml")
+    prediction = predict_run("beast2", analysis_file)
+    assert prediction
+
+    for seconds in (100, 1, 1):
+        record_run(prediction, seconds=seconds, peak_memory_mb=None)
+
+    calibrated = predict_run("beast2", analysis_file)
+    assert calibrated and calibrated.seconds == pytest.approx(1)
+
+
+def test_runs_are_not_recorded_when_turned_off(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("PHYLORUN_NO_HISTORY", "1")
+    analysis_file = to_file(BEAST2_ANALYSIS, tmp_path / "analysis.xml")
+    engine_binary = tmp_path / "beast"
+    engine_binary.write_text("#!/bin/sh\n")
+    engine_binary.chmod(0o755)
+
+    cli.main(["--bin", str(engine_binary), str(analysis_file)], standalone_mode=False)
+
+    assert not history_file().exists()
+
+
+def test_analysis_is_parsed_once_per_run(tmp_path: Path, monkeypatch):
+    analysis_file = to_file(BEAST2_ANALYSIS, tmp_path / "analysis.xml")
+    engine_binary = tmp_path / "beast"
+    engine_binary.write_text("#!/bin/sh\n")
+    engine_binary.chmod(0o755)
+
+    parsed = []
+    iterparse = resource_utils.ElementTree.iterparse
+    monkeypatch.setattr(
+        resource_utils.ElementTree,
+        "iterparse",
+        lambda source, *args, **kwargs: (
+            parsed.append(source) or iterparse(source, *args, **kwargs)
+        ),
+    )
+
+    cli.main(["--bin", str(engine_binary), str(analysis_file)], standalone_mode=False)
+
+    assert len(parsed) == 1
+
+
+def test_waiting_for_cpus_is_not_recorded_as_run_time(tmp_path: Path, monkeypatch):
+    analysis_file = to_file(BEAST2_ANALYSIS, tmp_path / "analysis.xml")
+    engine_binary = tmp_path / "beast"
+    engine_binary.write_text("#!/bin/sh\n")
+    engine_binary.chmod(0o755)
+
+    @contextmanager
+    def slow_reservation(count):
+        time.sleep(1)
+        yield list(range(count))
+
+    monkeypatch.setattr(main, "reserved_cpus", slow_reservation)
+
+    cli.main(
+        ["--cpus", "1", "--bin", str(engine_binary), str(analysis_file)],
+        standalone_mode=False,
+    )
+
+    (run,) = [json.loads(line) for line in history_file().read_text().splitlines()]
+    assert run["seconds"] < 1
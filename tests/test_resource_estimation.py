@@ -0,0 +1,147 @@
+import random
+from pathlib import Path
+
+from phylorun.engines.beast2 import BEAST2
+from phylorun.engines.beastX import BEASTX
+from phylorun.utils import resource_utils
+from phylorun.utils.resource_utils import (
+    Resources,
+    estimate_resources,
+    summarize_analysis,
+    with_threads_arg,
+)
+
+
+def to_file(text: str, path: Path):
+    path.write_text(text)
+    return path
+
+
+def test_beast2_alignments_are_summarized(tmp_path: Path):
+    path = to_file(
+        """<beast version="2.7">
+            <data id="first" dataType="nucleotide">
+                <sequence taxon="A" value="ACGTA"/>
+                <sequence taxon="B" value="ACGTT"/>
+                <sequence taxon="C" value="ACGAA"/>
+            </data>
+            <data id="second" dataType="aminoacid">
+                <sequence taxon="A" value="MK"/>
+                <sequence taxon="B" value="MK"/>
+            </data>
+            <run><siteModel gammaCategoryCount="4"/></run>
+        </beast>""",
+        tmp_path / "analysis.xml",
+    )
+
+    summary = summarize_analysis(path)
+    partitions, categories = summary.partitions, summary.categories
+
+    assert [(p.name, p.taxa, p.sites, p.patterns, p.states) for p in partitions] == [
+        ("first", 3, 5, 5, 4),
+        ("second", 2, 2, 2, 20),
+    ]
+    assert categories == 4
+
+
+def test_beastx_alignments_are_summarized(tmp_path: Path):
+    path = to_file(
+        """<beast version="10.5.0">
+            <alignment id="alignment" dataType="nucleotide">
+                <sequence><taxon idref="A"/>
+                    ACGT
+                </sequence>
+                <sequence><taxon idref="B"/>
+                    ACCT
+                </sequence>
+            </alignment>
+            <gammaShape gammaCategories="8"/>
+            <mcmc></mcmc>
+        </beast>""",
+        tmp_path / "analysis.xml",
+    )
+
+    summary = summarize_analysis(path)
+    partitions, categories = summary.partitions, summary.categories
+
+    assert [(p.taxa, p.sites, p.patterns) for p in partitions] == [(2, 4, 4)]
+    assert categories == 8
+
+
+def test_large_alignments_get_more_memory(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(resource_utils, "available_cpus", lambda: 8)
+    monkeypatch.setattr(resource_utils, "physical_memory_mb", lambda: None)
+
+    rng = random.Random(1)
+
+    def alignment(name: str, taxa: int, sites: int) -> str:
+        sequences = "".join(
+            f'<sequence taxon="t{i}" value="{"".join(rng.choices("ACGT", k=sites))}"/>'
+            for i in range(taxa)
+        )
+        return f'<data id="{name}">{sequences}</data>'
+
+    small = to_file(
+        f"<beast>{alignment('a', 4, 10)}<run/></beast>", tmp_path / "small.xml"
+    )
+    large = to_file(
+        f"<beast>{alignment('a', 300, 3000)}{alignment('b', 300, 3000)}"
+        '<run><siteModel gammaCategoryCount="4"/></run></beast>',
+        tmp_path / "large.xml",
+    )
+
+    small_resources = estimate_resources(small)
+    large_resources = estimate_resources(large)
+
+    assert small_resources and large_resources
+    assert small_resources.max_heap_mb >= resource_utils.MIN_HEAP_MB
+    assert small_resources.threads == 1
+    assert large_resources.max_heap_mb > small_resources.max_heap_mb
+    assert large_resources.initial_heap_mb <= large_resources.max_heap_mb
+    assert large_resources.threads == 2
+    assert with_threads_arg(["-seed", "1"], large_resources) == [
+        "-threads",
+        "2",
+        "-seed",
+        "1",
+    ]
+    assert with_threads_arg(["-threads", "4"], large_resources) == ["-threads", "4"]
+
+    # BEAGLE keeps the partials outside the heap, and tmpfs outputs count as memory
+    assert large_resources.native_mb > 0
+    assert large_resources.container_kwargs()["mem_limit"] == (
+        f"{large_resources.max_heap_mb + 256 + large_resources.native_mb}m"
+    )
+    assert "mem_limit" not in large_resources.container_kwargs(scratch="tmpfs")
+
+
+def test_files_without_alignments_are_not_sized(tmp_path: Path):
+    path = to_file("<beast><run/></beast>", tmp_path / "analysis.xml")
+
+    assert estimate_resources(path) is None
+
+
+def test_launchers_keep_the_library_path_of_the_beast_scripts(
+    tmp_path: Path, monkeypatch
+):
+    monkeypatch.delenv("LD_LIBRARY_PATH", raising=False)
+    monkeypatch.delenv("BEAST_EXTRA_LIBS", raising=False)
+    monkeypatch.setenv("BEAGLE_LIB", "/opt/beagle/lib")
+    for jar in ("launcher.jar", "beast.jar"):
+        (tmp_path / "lib").mkdir(exist_ok=True)
+        (tmp_path / "lib" / jar).touch()
+    resources = Resources(max_heap_mb=2048, initial_heap_mb=512, threads=1)
+    engine_path = str(tmp_path / "bin" / "beast")
+
+    beast2_command = BEAST2()._launcher_command(engine_path, resources)
+    assert beast2_command and beast2_command[1:5] == [
+        "-Xms512m",
+        "-Xmx2048m",
+        "-Djava.library.path=/opt/beagle/lib:/usr/local/lib",
+        "-Dlauncher.wait.for.exit=true",
+    ]
+
+    beastx_command = BEASTX()._launcher_command(engine_path, resources)
+    assert beastx_command and beastx_command[3] == (
+        f"-Djava.library.path={tmp_path / 'lib'}:/opt/beagle/lib:/usr/local/lib"
+    )
@@ -0,0 +1,112 @@
+import io
+import subprocess
+import tarfile
+from pathlib import Path
+
+import pytest
+
+from phylorun.utils import docker_utils
+from phylorun.utils.docker_utils import (
+    _ChunkReader,
+    extract_tar_stream,
+    scratch_outputs,
+)
+
+
+def tar_chunks(files: dict[str, bytes], chunk_size: int = 100) -> list[bytes]:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+    data = buffer.getvalue()
+    return [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+def test_outputs_are_extracted_from_chunked_stream(tmp_path: Path):
+    chunks = tar_chunks({"./run.log": b"state\t0\n" * 1000, "./out/run.trees": b"tree"})
+
+    extracted = extract_tar_stream(_ChunkReader(iter(chunks)), tmp_path)
+
+    assert sorted(extracted) == ["out/run.trees", "run.log"]
+    assert (tmp_path / "run.log").read_bytes() == b"state\t0\n" * 1000
+    assert (tmp_path / "out" / "run.trees").read_bytes() == b"tree"
+
+
+def test_members_outside_target_are_skipped(tmp_path: Path):
+    chunks = tar_chunks({"../escape.log": b"x", "/etc/passwd": b"x", "ok.log": b"x"})
+
+    extracted = extract_tar_stream(_ChunkReader(iter(chunks)), tmp_path / "target")
+
+    assert extracted == ["ok.log"]
+    assert not (tmp_path / "escape.log").exists()
+
+
+def test_empty_stream_extracts_nothing(tmp_path: Path):
+    assert extract_tar_stream(_ChunkReader(iter(tar_chunks({}))), tmp_path) == []
+
+
+def test_missing_archive_extracts_nothing(tmp_path: Path):
+    assert extract_tar_stream(_ChunkReader(iter([])), tmp_path) == []
+
+
+class LocalContainer:
+    """Runs the commands of `scratch_outputs` on the host."""
+
+    def exec_run(self, command):
+        subprocess.run(command, check=True)
+
+
+@pytest.fixture
+def local_scratch(tmp_path: Path, monkeypatch) -> Path:
+    scratch_dir = tmp_path / "scratch"
+    monkeypatch.setattr(docker_utils, "SCRATCH_DIR", str(scratch_dir))
+    monkeypatch.setattr(docker_utils, "_SYNC_MARKER", str(tmp_path / "synced"))
+    return scratch_dir
+
+
+def test_existing_outputs_are_copied_into_scratch(
+    tmp_path: Path, local_scratch: Path, monkeypatch
+):
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    (source_dir / "analysis.xml").write_text("<beast/>")
+    (source_dir / "run.log").write_text("state\t0\n")
+    (source_dir / "run.checkpoint_1000").write_text("state 1000\n")
+    monkeypatch.setattr(docker_utils, "copy_back_scratch_outputs", lambda *args: [])
+
+    with scratch_outputs(
+        LocalContainer(),
+        str(source_dir),
+        source_dir,
+        copies=["run.log", "run.checkpoint"],
+    ):
+        assert (local_scratch / "analysis.xml").is_symlink()
+        assert not (local_scratch / "run.log").is_symlink()
+        assert not (local_scratch / "run.checkpoint_1000").is_symlink()
+
+        with open(local_scratch / "run.log", "a") as file:
+            file.write("state\t1000\n")
+
+    assert (source_dir / "run.log").read_text() == "state\t0\n"
+
+
+def test_failed_copy_back_keeps_original_exception(
+    tmp_path: Path, local_scratch: Path, monkeypatch
+):
+    def copy_back(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(docker_utils, "copy_back_scratch_outputs", copy_back)
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+
+    with pytest.raises(ValueError, match="engine failed"):
+        with scratch_outputs(LocalContainer(), str(source_dir), source_dir):
+            raise ValueError("engine failed")
+
+    with pytest.raises(OSError, match="disk full"):
+        with scratch_outputs(LocalContainer(), str(source_dir), source_dir):
+            pass
@@ -0,0 +1,177 @@
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from phylorun.engines.revBayes import RevBayes
+from phylorun.main import cli
+from phylorun.utils.sweep_utils import (
+    STATE_FILE,
+    grid_variants,
+    parse_parameter,
+    render_template,
+    run_sweep,
+)
+
+
+TEMPLATE = """clock_model = "{{clock}}"
+seed({{seed}})
+mcmc.run(generations=10)
+writeOutput("{{variant}}.log")
+"""
+
+
+def to_file(directory: Path, content: str) -> Path:
+    template_file = directory / "analysis.rev"
+    template_file.write_text(content)
+    return template_file
+
+
+def test_parse_parameter():
+    assert parse_parameter("clock=strict, relaxed") == ("clock", ["strict", "relaxed"])
+
+    with pytest.raises(Exception):
+        parse_parameter("clock")
+
+
+def test_render_template_requires_all_placeholders():
+    assert render_template("a {{ x }} b {{y}}", {"x": "1", "y": "2"}) == "a 1 b 2"
+
+    with pytest.raises(Exception, match="y"):
+        render_template("{{x}} {{y}}", {"x": "1"})
+
+
+def test_grid_variants_are_generated_lazily():
+    variants = grid_variants({"a": ["1", "2"], "b": [str(i) for i in range(10**6)]})
+
+    assert next(variants) == {"a": "1", "b": "0"}
+    assert next(variants) == {"a": "1", "b": "1"}
+
+
+def test_sweep_runs_every_variant_in_own_directory(tmp_path: Path):
+    template_file = to_file(tmp_path, TEMPLATE)
+    output_dir = tmp_path / "sweep"
+    detected = []
+    ran = []
+    lock = threading.Lock()
+
+    def detect_engine(analysis_file: Path):
+        detected.append(analysis_file)
+        return RevBayes()
+
+    def run_variant(engine, analysis_file: Path) -> int:
+        with lock:
+            ran.append(analysis_file.read_text())
+        return 0
+
+    statuses = run_sweep(
+        template_file,
+        {"clock": ["strict", "relaxed"], "seed": ["1", "2", "3"]},
+        output_dir,
+        detect_engine,
+        run_variant,
+        max_workers=2,
+    )
+
+    assert statuses == {str(i): "completed" for i in range(6)}
+    assert len(detected) == 1
+    assert len(ran) == 6
+    assert (output_dir / "4" / "analysis.rev").read_text() == TEMPLATE.replace(
+        "{{clock}}", "relaxed"
+    ).replace("{{seed}}", "2").replace("{{variant}}", "4")
+
+
+def test_sweep_resumes_after_failures(tmp_path: Path):
+    template_file = to_file(tmp_path, TEMPLATE)
+    output_dir = tmp_path / "sweep"
+    grid = {"clock": ["strict", "relaxed"], "seed": ["1", "2"]}
+
+    def failing_run(engine, analysis_file: Path) -> int:
+        return 1 if "seed(2)" in analysis_file.read_text() else 0
+
+    statuses = run_sweep(
+        template_file, grid, output_dir, lambda _: RevBayes(), failing_run
+    )
+    assert statuses == {
+        "0": "completed",
+        "1": "failed",
+        "2": "completed",
+        "3": "failed",
+    }
+    assert json.loads((output_dir / STATE_FILE).read_text())["1"]["values"] == {
+        "clock": "strict",
+        "seed": "2",
+    }
+
+    rerun = []
+
+    def run(engine, analysis_file: Path) -> int:
+        rerun.append(analysis_file.parent.name)
+        return 0
+
+    statuses = run_sweep(template_file, grid, output_dir, lambda _: RevBayes(), run)
+
+    assert sorted(rerun) == ["1", "3"]
+    assert set(statuses.values()) == {"completed"}
+
+
+def test_sweep_rejects_changed_grid(tmp_path: Path):
+    template_file = to_file(tmp_path, TEMPLATE)
+    output_dir = tmp_path / "sweep"
+
+    run_sweep(
+        template_file,
+        {"clock": ["strict"], "seed": ["1"]},
+        output_dir,
+        lambda _: RevBayes(),
+        lambda engine, analysis_file: 1,
+    )
+
+    with pytest.raises(Exception, match="grid changed"):
+        run_sweep(
+            template_file,
+            {"clock": ["relaxed"], "seed": ["1"]},
+            output_dir,
+            lambda _: RevBayes(),
+            lambda engine, analysis_file: 0,
+        )
+
+
+def test_sweep_requires_values_for_all_placeholders(tmp_path: Path):
+    template_file = to_file(tmp_path, TEMPLATE)
+
+    with pytest.raises(Exception, match="seed"):
+        run_sweep(
+            template_file,
+            {"clock": ["strict"]},
+            tmp_path / "sweep",
+            lambda _: RevBayes(),
+            lambda engine, analysis_file: 0,
+        )
+
+
+def test_sweep_command_runs_local_engine(tmp_path: Path):
+    template_file = to_file(tmp_path, TEMPLATE)
+    engine_binary = tmp_path / "rb"
+    engine_binary.write_text("#!/bin/sh\nexit 0\n")
+    engine_binary.chmod(0o755)
+
+    exit_code = cli.main(
+        [
+            "sweep",
+            "-p",
+            "clock=strict,relaxed",
+            "-p",
+            "seed=1",
+            "--bin",
+            str(engine_binary),
+            "--output-dir",
+            str(tmp_path / "sweep"),
+            str(template_file),
+        ],
+        standalone_mode=False,
+    )
+
+    assert not exit_code
+    assert (tmp_path / "sweep" / "1" / "analysis.rev").exists()